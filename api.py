@@ -0,0 +1,208 @@
+import hmac
+import json
+import os
+import sys
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+from blobstore import CHUNK_SIZE
+from exporter import export_path
+from importer import ImportValidationError
+from kvp_core import OperationError, ProjectService, open_store, read_operations
+
+# Point d'entrée HTTP/JSON local pour les intégrations (MES, traitements de nuit) :
+#   GET  /projects[?status=en_cours]     liste des projets
+#   GET  /projects/<id>                  projet complet
+#   GET  /projects/<id>/summary          progrès, tâches par statut, retards
+#   POST /projects                       création (projet JSON)
+#   POST /batch                          lot d'opérations (tableau JSON ou NDJSON),
+#                                        appliqué en une transaction ; renvoie le bilan
+#   GET  /projects/<id>/attachments?section=plan[&task=...]   pièces jointes (métadonnées)
+#   POST /projects/<id>/attachments?section=plan&name=photo.jpg[&task=...]
+#                                        corps : le fichier, reçu par blocs
+#   GET  /attachments/<id>/content       fichier envoyé par blocs
+#   GET  /exports/<nom>.zip              archive du portefeuille préparée par l'application,
+#                                        envoyée par blocs
+# Écoute sur la boucle locale par défaut ; jeton facultatif (Authorization: Bearer).
+API_HOST = os.environ.get('KVP_API_HOST', '127.0.0.1')
+# Port du point d'entrée démarré par l'application Streamlit (0 : désactivé)
+API_PORT = int(os.environ.get('KVP_API_PORT', '0') or 0)
+API_TOKEN = os.environ.get('KVP_API_TOKEN', '')
+API_ORIGIN = 'api'
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'KVP/1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        token = self.server.token
+        if not token:
+            return True
+        given = self.headers.get('Authorization', '')
+        return hmac.compare_digest(given, f"Bearer {token}")
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise OperationError(f"requête trop volumineuse (> {MAX_BODY_BYTES // (1024 * 1024)} Mo)")
+        return self.rfile.read(length).decode('utf-8')
+
+    # Corps lu par blocs (fichiers joints), sans le charger en mémoire
+    def _body_chunks(self):
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining > 0:
+            chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def _send_file(self, attachment):
+        evidence = self.server.evidence
+        self.send_response(200)
+        self.send_header('Content-Type', attachment.mime or 'application/octet-stream')
+        self.send_header('Content-Length', str(evidence.blobs.size(attachment.blob)))
+        self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(attachment.name)}")
+        self.end_headers()
+        for chunk in evidence.blobs.iter_chunks(attachment.blob):
+            self.wfile.write(chunk)
+
+    def _send_export(self, name):
+        path = export_path(name)
+        if path is None:
+            return self._send(404, {'error': f"archive inconnue : {name}"})
+        with open(path, 'rb') as handle:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/zip')
+            self.send_header('Content-Length', str(os.fstat(handle.fileno()).st_size))
+            self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(name)}")
+            self.end_headers()
+            while True:
+                chunk = handle.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+    def _attachments(self, method, parts, query):
+        evidence = self.server.evidence
+        if evidence is None:
+            return self._send(404, {'error': "pièces jointes indisponibles"})
+        if parts[0] == 'attachments':
+            attachment = evidence.get(parts[1])
+            if attachment is None:
+                return self._send(404, {'error': f"pièce jointe inconnue : {parts[1]}"})
+            return self._send_file(attachment)
+        self.server.service.get(parts[1])
+        section, task = query.get('section', [''])[0], query.get('task', [''])[0]
+        if method == 'GET':
+            return self._send(200, [vars(a) for a in evidence.attachments(parts[1], section, task)])
+        name = query.get('name', [''])[0]
+        if not name:
+            raise OperationError("nom de fichier manquant (?name=)")
+        try:
+            attachment = evidence.attach(parts[1], section, self._body_chunks(), name,
+                                         self.headers.get('Content-Type'), API_ORIGIN, task)
+        except ValueError as exc:
+            raise OperationError(str(exc))
+        return self._send(201, vars(attachment))
+
+    def _route(self, method):
+        if not self._authorized():
+            return self._send(401, {'error': "jeton manquant ou invalide"})
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        service = self.server.service
+        try:
+            if method == 'GET' and parts == ['health']:
+                return self._send(200, {'ok': True})
+            if method == 'GET' and parts == ['projects']:
+                status = parse_qs(url.query).get('status', [None])[0]
+                return self._send(200, service.list(status))
+            if method == 'GET' and len(parts) == 2 and parts[0] == 'projects':
+                return self._send(200, service.get(parts[1]))
+            if method == 'GET' and len(parts) == 3 and parts[0] == 'projects' and parts[2] == 'summary':
+                return self._send(200, service.summary(parts[1]))
+            if method == 'POST' and parts == ['projects']:
+                return self._send(201, service.create(json.loads(self._body())))
+            if method == 'POST' and parts == ['batch']:
+                return self._send(200, service.apply(_operations(self._body())).to_dict())
+            if method == 'GET' and len(parts) == 3 and parts[0] == 'attachments' and parts[2] == 'content':
+                return self._attachments(method, parts, {})
+            if method == 'GET' and len(parts) == 2 and parts[0] == 'exports':
+                return self._send_export(parts[1])
+            if len(parts) == 3 and parts[0] == 'projects' and parts[2] == 'attachments':
+                return self._attachments(method, parts, parse_qs(url.query))
+        except KeyError as exc:
+            return self._send(404, {'error': f"projet inconnu : {exc.args[0]}"})
+        except (OperationError, ImportValidationError) as exc:
+            return self._send(400, {'error': str(exc)})
+        except json.JSONDecodeError as exc:
+            return self._send(400, {'error': f"JSON invalide ({exc.msg})"})
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti (téléchargement interrompu)
+            return
+        except Exception as exc:
+            traceback.print_exc()
+            return self._send(500, {'error': f"erreur interne ({exc.__class__.__name__})"})
+        return self._send(404, {'error': f"route inconnue : {method} {url.path}"})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+
+# Corps d'un lot : tableau JSON, ou une opération par ligne (NDJSON)
+def _operations(body):
+    if body.lstrip().startswith('['):
+        return json.loads(body)
+    return read_operations(body.splitlines())
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service, host=API_HOST, port=API_PORT, token=API_TOKEN, evidence=None):
+        super().__init__((host, port), _Handler)
+        self.service = service
+        self.token = token
+        self.evidence = evidence
+
+
+# Serveur en arrière-plan (démarré par l'application : même magasin, même journal)
+def start(service, host=API_HOST, port=API_PORT, token=API_TOKEN, evidence=None):
+    server = ApiServer(service, host, port, token, evidence)
+    threading.Thread(target=server.serve_forever, name='kvp-api', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    # Usage : python api.py [port]   (sans l'application Streamlit, qui détient sinon le journal)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else (API_PORT or 8765)
+    from evidence import EvidenceStore
+    store = open_store()
+    server = ApiServer(ProjectService(store, API_ORIGIN), API_HOST, port, evidence=EvidenceStore(store))
+    print(f"API KVP sur http://{API_HOST}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if store.journal is not None:
+            store.journal.close()
@@ -1,11 +1,58 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import inspect
 import json
+import os
+import sqlite3
+import time
 from typing import Dict, List, Any
 import uuid
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from storage import ProjectRepository, migrate_legacy
+from task_editor import (TASK_STATUSES, TASK_STATUS_LABELS, filter_task_indices, paginate, task_owners,
+                         page_rows, apply_grid_edits, bulk_set_status, bulk_delete)
+from task_stats import TaskStatsIndex
+from importer import ImportJob, PROJECT_STATUSES, error_report_csv
+from exporter import export_portfolio, available_formats
+from charts import FigureCache, status_pie, comparison_bar, build_kpi_series, build_timeline_heatmap, build_timeline_bars
+from search import search as search_projects
+from picker import RecentProjects, find_projects
+from instrumentation import recorder, span, timed
+from journal import EVENT_LABELS
+from kvp_core import (ProjectService, open_store, calculate_progress, check_metrics, new_project, new_task,
+                      add_task, set_task_status, delete_task)
+import api
+import rollups
+import theme
+
+# pandas, numpy et plotly.express ne sont importés qu'à la première utilisation
+# (grille des tâches, portefeuille, indicateurs suivis, panneau Performance) :
+# l'écran d'accueil et l'édition des textes n'en ont pas besoin
+
+# Onglets à exécution paresseuse (seul l'onglet ouvert s'exécute) si Streamlit le permet
+LAZY_TABS = 'on_change' in inspect.signature(st.tabs).parameters
+
+# Au-delà de ce nombre de tâches, l'onglet Faire s'ouvre en mode grille
+GRID_MODE_THRESHOLD = 50
+
+# Nombre maximal de résultats du sélecteur de projet
+PICKER_LIMIT = 20
+
+# Intervalle de consultation du flux de modifications des autres sessions
+SYNC_INTERVAL_SECONDS = 10
+
+SECTION_LABELS = {'meta': "En-tête", 'plan': "Planifier", 'do': "Faire", 'check': "Vérifier", 'act': "Agir"}
+FIELD_LABELS = {
+    'name': "Nom", 'description': "Description", 'created_date': "Date de création", 'status': "Statut",
+    'site': "Site", 'problem': "Problème", 'goal': "Objectif", 'root_cause': "Causes",
+    'measures': "Mesures", 'implementation_steps': "Tâches", 'metrics': "Métriques",
+    'results': "Résultats", 'standardization': "Standardisation", 'lessons_learned': "Enseignements",
+    'next_steps': "Prochaines étapes",
+}
+TASK_FIELD_LABELS = {
+    'task': "Tâche", 'responsible': "Responsable", 'due_date': "Échéance", 'status': "Statut",
+    'priority': "Priorité",
+}
 
 # Configuration de la page
 st.set_page_config(
@@ -15,59 +62,98 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS pour un meilleur design
-st.markdown("""
-<style>
-    .pdca-header {
-        background: linear-gradient(90deg, #FF6B6B, #4ECDC4, #45B7D1, #96CEB4);
-        padding: 20px;
-        border-radius: 10px;
-        text-align: center;
-        color: white;
-        font-size: 24px;
-        font-weight: bold;
-        margin-bottom: 20px;
-    }
-    
-    .phase-card {
-        padding: 15px;
-        border-radius: 10px;
-        margin: 10px 0;
-        border-left: 5px solid;
-    }
-    
-    .plan-card { border-left-color: #FF6B6B; background-color: #FFE5E5; }
-    .do-card { border-left-color: #4ECDC4; background-color: #E5F9F6; }
-    .check-card { border-left-color: #45B7D1; background-color: #E5F3FF; }
-    .act-card { border-left-color: #96CEB4; background-color: #E5F5E5; }
-    
-    .task-completed { text-decoration: line-through; opacity: 0.6; }
-    .priority-high { border-left: 3px solid #FF4444; }
-    .priority-medium { border-left: 3px solid #FFA500; }
-    .priority-low { border-left: 3px solid #4CAF50; }
-    
-    .metric-card {
-        background: white;
-        padding: 20px;
-        border-radius: 10px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        text-align: center;
-    }
-</style>
-""", unsafe_allow_html=True)
+# CSS pour un meilleur design (compacté une fois par processus, voir theme.py)
+st.markdown(theme.PAGE_CSS, unsafe_allow_html=True)
+
+# Stockage SQLite partagé par toutes les sessions du processus
+@st.cache_resource
+def get_store():
+    # Avec le journal des modifications : historique, annulation, reconstruction
+    return open_store()
+
+# Point d'entrée HTTP/JSON des traitements par lots (KVP_API_PORT), servi par
+# ce processus : même magasin, même journal que les sessions
+@st.cache_resource
+def get_api_server():
+    if not api.API_PORT:
+        return None
+    return api.start(ProjectService(get_store(), api.API_ORIGIN), evidence=get_evidence())
+
+# Agrégats du portefeuille et résumés des retards, calculés en arrière-plan
+@st.cache_resource
+def get_rollups():
+    if not rollups.ROLLUPS_ENABLED:
+        return None
+    return rollups.RollupWorker(get_store()).start()
+
+# Tables du portefeuille partagées, rafraîchies projet par projet
+@st.cache_resource
+def get_portfolio():
+    from portfolio import PortfolioFrames
+    return PortfolioFrames(get_store())
+
+# Planning multi-projets (index des tâches et tuiles d'agrégats communs à toutes les sessions)
+@st.cache_resource
+def get_timeline():
+    from timeline import Timeline
+    return Timeline(get_store())
+
+# Figures Plotly mémorisées (LRU borné, commun à toutes les sessions)
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+# Indicateurs suivis dans le temps (séries en fichiers, communes à toutes les sessions)
+@st.cache_resource
+def get_kpis():
+    from kpi_series import KpiStore
+    return KpiStore(get_store())
+
+# Pièces jointes et commentaires (fichiers dans le magasin de blobs, jamais en session)
+@st.cache_resource
+def get_evidence():
+    from evidence import EvidenceStore
+    evidence = EvidenceStore(get_store())
+    # Fichiers des projets supprimés depuis le dernier démarrage
+    evidence.collect()
+    return evidence
+
+# Imports en cours (lancés en arrière-plan, suivis par identifiant) ; une tâche
+# quitte le registre dès que sa session a affiché le résultat
+@st.cache_resource
+def get_import_jobs():
+    return {}
+
+# Tâches terminées depuis plus d'une heure sans avoir été affichées (session fermée)
+def prune_import_jobs(jobs, max_age=3600):
+    for job_id in [k for k, job in jobs.items() if job.done and time.time() - job.finished_at > max_age]:
+        jobs.pop(job_id, None)
+
+# Utilisateur connecté (si l'authentification Streamlit est configurée), sinon poste local
+def current_user():
+    user = getattr(st, 'user', None)
+    if user is not None and getattr(user, 'is_logged_in', False):
+        return getattr(user, 'email', None) or 'local'
+    return 'local'
 
 # Initialisation du Session State
 def init_session_state():
+    get_api_server()
+    get_rollups()
     if 'projects' not in st.session_state:
-        st.session_state.projects = {}
+        st.session_state.projects = ProjectRepository(get_store())
+    elif isinstance(st.session_state.projects, dict):
+        # Migration unique des projets encore gardés en mémoire (ancienne forme dict)
+        migrate_legacy(get_store(), st.session_state.projects)
+        st.session_state.projects = ProjectRepository(get_store())
     if 'current_project' not in st.session_state:
         st.session_state.current_project = None
+    if 'recent_projects' not in st.session_state:
+        st.session_state.recent_projects = RecentProjects(get_store(), current_user())
     if 'user_role' not in st.session_state:
         st.session_state.user_role = 'Administrateur'  # Simplifié pour la démo
     if 'tasks' not in st.session_state:
         st.session_state.tasks = {}
-    if 'comments' not in st.session_state:
-        st.session_state.comments = {}
 
 # Créer des données d'exemple
 def create_sample_project():
@@ -102,433 +188,1357 @@ def create_sample_project():
         }
     }
 
-# Calcul du progrès
-def calculate_progress(project_data):
-    phases = ['plan', 'do', 'check', 'act']
-    completed_phases = 0
-    
-    if project_data.get('plan', {}).get('problem'):
-        completed_phases += 0.25
-    if project_data.get('do', {}).get('implementation_steps'):
-        completed_phases += 0.25
-    if project_data.get('check', {}).get('results'):
-        completed_phases += 0.25
-    if project_data.get('act', {}).get('standardization'):
-        completed_phases += 0.25
-    
-    return min(completed_phases * 100, 100)
-
 # Affichage du progrès PDCA
 def show_pdca_progress(current_phase):
-    phases = ['Planifier', 'Faire', 'Vérifier', 'Agir']
-    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4']
-    phase_keys = ['plan', 'do', 'check', 'act']
-    
     cols = st.columns(4)
-    for i, (phase, color, key) in enumerate(zip(phases, colors, phase_keys)):
-        with cols[i]:
-            if key == current_phase:
-                st.markdown(f"""
-                <div style="background-color: {color}; color: white; padding: 10px; 
-                           border-radius: 5px; text-align: center; font-weight: bold;">
-                    {phase} ✓
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div style="background-color: #f0f0f0; color: #666; padding: 10px; 
-                           border-radius: 5px; text-align: center;">
-                    {phase}
-                </div>
-                """, unsafe_allow_html=True)
+    for col, step in zip(cols, theme.PHASE_PROGRESS[current_phase]):
+        with col:
+            st.markdown(step, unsafe_allow_html=True)
 
-# Application principale
-def main():
-    init_session_state()
+# Index statistique des tâches du projet, conservé en session et reconstruit
+# seulement si la liste de tâches a été remplacée (rechargement, import...)
+def get_task_stats(project):
+    tasks = project.get('do', {}).get('implementation_steps', [])
+    cache = st.session_state.setdefault('task_stats', {})
+    entry = cache.get(project['id'])
+    if entry is None or entry[0] is not tasks or entry[1].total != len(tasks):
+        entry = (tasks, TaskStatsIndex.from_tasks(tasks))
+        cache[project['id']] = entry
+    return entry[1]
+
+# Éditeur de tâches en grille : filtres, pagination et modifications groupées
+def show_task_grid(current_proj, tasks, task_stats):
+    can_edit = st.session_state.user_role in ['Administrateur', 'Éditeur']
+    can_delete = st.session_state.user_role == 'Administrateur'
+    pid = current_proj['id']
     
-    # En-tête
-    st.markdown('<div class="pdca-header">🔄 Outil KVP Numérique</div>', unsafe_allow_html=True)
+    # Filtres
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        statuses = st.multiselect("Statut :", TASK_STATUSES, format_func=lambda x: TASK_STATUS_LABELS[x],
+                                  key=f"grid_status_{pid}")
+    with col2:
+        owners = st.multiselect("Responsable :", task_owners(tasks), key=f"grid_owner_{pid}")
+    with col3:
+        due_range = st.date_input("Échéance entre :", value=(), key=f"grid_due_{pid}")
+    due_from = due_range[0] if len(due_range) > 0 else None
+    due_to = due_range[1] if len(due_range) > 1 else None
     
-    # Barre latérale pour la sélection de projet
-    with st.sidebar:
-        st.header("Sélection de Projet")
-        
-        # Créer un nouveau projet
-        if st.button("➕ Nouveau Projet"):
-            new_project = {
-                'id': str(uuid.uuid4()),
-                'name': 'Nouveau Projet KVP',
-                'description': '',
-                'created_date': datetime.now().strftime('%Y-%m-%d'),
-                'status': 'brouillon',
-                'plan': {}, 'do': {}, 'check': {}, 'act': {}
-            }
-            st.session_state.projects[new_project['id']] = new_project
-            st.session_state.current_project = new_project['id']
-            st.rerun()
-        
-        # Ajouter un projet d'exemple
-        if st.button("📝 Charger Projet d'Exemple"):
-            sample = create_sample_project()
-            st.session_state.projects[sample['id']] = sample
-            st.session_state.current_project = sample['id']
-            st.rerun()
-        
-        # Liste des projets
-        if st.session_state.projects:
-            project_names = {pid: proj['name'] for pid, proj in st.session_state.projects.items()}
-            selected_project = st.selectbox(
-                "Projet Actif :",
-                options=list(project_names.keys()),
-                format_func=lambda x: project_names[x],
-                index=0 if st.session_state.current_project is None else 
-                      list(project_names.keys()).index(st.session_state.current_project) 
-                      if st.session_state.current_project in project_names else 0
-            )
-            st.session_state.current_project = selected_project
-        
-        # Rôle utilisateur
-        st.selectbox("Rôle Utilisateur :", ['Administrateur', 'Éditeur', 'Lecteur'], 
-                    index=['Administrateur', 'Éditeur', 'Lecteur'].index(st.session_state.user_role),
-                    key='user_role')
+    indices = filter_task_indices(tasks, statuses, owners, due_from, due_to)
     
-    # Contenu principal
-    if not st.session_state.projects:
-        st.info("👋 Bienvenue ! Créez un nouveau projet ou chargez le projet d'exemple.")
+    # Pagination
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Tâches par page :", [25, 50, 100, 200], key=f"grid_page_size_{pid}")
+    with col2:
+        page = st.number_input("Page :", min_value=1, value=1, step=1, key=f"grid_page_{pid}")
+    page_indices, page, page_count = paginate(indices, int(page), page_size)
+    with col3:
+        st.caption(f"{len(indices)} tâche(s) sur {len(tasks)} — page {page}/{page_count}")
+    
+    if not page_indices:
+        st.info("Aucune tâche ne correspond aux filtres.")
+        return
+    
+    # La clé change après chaque validation pour repartir d'une grille propre
+    nonce = st.session_state.setdefault('grid_nonce', 0)
+    editor_key = f"grid_editor_{pid}_{page}_{nonce}"
+    import pandas as pd
+    df = pd.DataFrame(page_rows(tasks, page_indices))
+    
+    with st.form(key=f"grid_form_{pid}"):
+        st.data_editor(
+            df,
+            key=editor_key,
+            hide_index=True,
+            use_container_width=True,
+            disabled=not can_edit,
+            column_config={
+                'Sélection': st.column_config.CheckboxColumn("✔"),
+                'Échéance': st.column_config.DateColumn("Échéance", format="YYYY-MM-DD"),
+                'Statut': st.column_config.SelectboxColumn("Statut", options=TASK_STATUSES, required=True),
+            },
+        )
+        if not can_edit:
+            st.form_submit_button("🔄 Actualiser")
+            return
         
-        # Information d'intégration
-        with st.expander("🎯 Tour de l'Outil : Comment fonctionne l'Outil KVP"):
-            st.markdown("""
-            **1. Cycle PDCA :** Travaillez de manière structurée à travers les quatre phases
-            - **Planifier :** Définir le problème et planifier les mesures
-            - **Faire :** Mettre en œuvre et suivre les mesures
-            - **Vérifier :** Examiner et évaluer les résultats
-            - **Agir :** Standardiser et définir les prochaines étapes
-            
-            **2. Suivi des Tâches :** Gérer les tâches avec responsabilités et échéances
-            **3. Visualisation :** Tableaux de bord et suivi des progrès
-            **4. Travail d'Équipe :** Commentaires et collaboration
-            """)
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            save = st.form_submit_button("💾 Enregistrer les modifications")
+        with col2:
+            bulk_status = st.selectbox("Nouveau statut :", TASK_STATUSES, format_func=lambda x: TASK_STATUS_LABELS[x])
+        with col3:
+            apply_status = st.form_submit_button("🔁 Appliquer à la sélection")
+        with col4:
+            delete = st.form_submit_button("🗑️ Supprimer la sélection", disabled=not can_delete)
+    
+    if save or apply_status or delete:
+        edited_rows = st.session_state.get(editor_key, {}).get('edited_rows', {})
+        changed, selected = apply_grid_edits(tasks, page_indices, edited_rows, task_stats)
+        if apply_status and selected:
+            bulk_set_status(tasks, selected, bulk_status, task_stats)
+        if delete and selected and can_delete:
+            bulk_delete(tasks, selected, task_stats)
+        st.session_state.projects.save(pid)
+        st.session_state.grid_nonce = nonce + 1
+        st.rerun()
+
+# Import de projets (NDJSON, export JSON) ou de tâches (CSV)
+def show_import_panel():
+    with st.expander("📤 Importer des Données"):
+        uploaded = st.file_uploader("Fichier NDJSON, JSON ou CSV :", type=['ndjson', 'jsonl', 'json', 'csv'],
+                                    key='import_file')
+        st.caption("CSV : colonnes project_id, task, responsible, due_date (AAAA-MM-JJ), status, priority")
+        if uploaded is not None and st.button("Lancer l'Import"):
+            jobs = get_import_jobs()
+            prune_import_jobs(jobs)
+            job = ImportJob(get_store(), uploaded, uploaded.name, size=uploaded.size).start()
+            jobs[job.id] = job
+            st.session_state.import_job = job.id
+            st.session_state.pop('import_result', None)
+        job = get_import_jobs().get(st.session_state.get('import_job'))
+        if job is not None:
+            show_import_progress(job)
+        result = st.session_state.get('import_result')
+        if result is not None:
+            show_import_result(result)
+
+# Suivi de l'import : seul ce fragment se réexécute pendant le traitement.
+# Une fois terminé, le bilan passe en session, la tâche quitte le registre et
+# la relance complète qui suit n'affiche plus le fragment (fin du suivi périodique).
+@st.fragment(run_every=1)
+@timed('import')
+def show_import_progress(job):
+    st.progress(job.progress, text=f"{job.rows} ligne(s) lue(s), {job.imported} importée(s)")
+    if not job.done:
         return
+    st.session_state.import_result = {'failure': job.failure, 'imported': job.imported,
+                                      'error_count': job.error_count, 'errors': job.errors}
+    st.session_state.pop('import_job', None)
+    get_import_jobs().pop(job.id, None)
+    # Les copies de session des projets importés sont périmées
+    for project_id in job.touched:
+        st.session_state.projects.forget(project_id)
+    if st.session_state.current_project is None and job.touched:
+        st.session_state.current_project = next(iter(job.touched))
+    st.rerun(scope='app')
+
+def show_import_result(result):
+    if result['failure']:
+        st.error(f"Échec de l'import : {result['failure']}")
+    else:
+        st.success(f"Import terminé : {result['imported']} élément(s) importé(s), {result['error_count']} erreur(s).")
+    if result['errors']:
+        # Rapport construit au clic seulement
+        st.download_button("📄 Rapport d'Erreurs (CSV)", data=lambda: error_report_csv(result['errors']),
+                           file_name="rapport_import.csv", mime="text/csv", on_click='ignore')
+
+# Vue Portefeuille : indicateurs agrégés sur tous les projets
+@timed('portefeuille')
+def show_portfolio():
+    import plotly.express as px
+    from portfolio import (progress_distribution, status_breakdown, overdue_by_owner, overdue_by_site,
+                           average_improvement, improvement_by_status)
+    st.header("🗂️ Portefeuille de Projets")
+    frames = get_portfolio()
+    with span('portefeuille_rafraichissement'):
+        frames.refresh()
+    projects, tasks = frames.projects, frames.tasks
     
-    # Afficher le projet actuel
-    current_proj = st.session_state.projects[st.session_state.current_project]
+    col1, col2, col3, col4 = st.columns(4)
+    overdue_owner = overdue_by_owner(frames)
+    with col1:
+        st.metric("Projets", len(projects))
+    with col2:
+        st.metric("Tâches", len(tasks))
+    with col3:
+        st.metric("Tâches en Retard", int(overdue_owner.sum()))
+    with col4:
+        st.metric("Amélioration Moyenne", f"{average_improvement(frames):.1f}%")
     
-    # En-tête du projet avec progrès
-    col1, col2, col3 = st.columns([2, 1, 1])
+    if projects.empty:
+        return
+    
+    col1, col2 = st.columns(2)
     with col1:
-        st.header(current_proj['name'])
-        if st.session_state.user_role in ['Administrateur', 'Éditeur']:
-            new_name = st.text_input("Nom du Projet :", current_proj['name'], key="proj_name")
-            if new_name != current_proj['name']:
-                current_proj['name'] = new_name
+        distribution = progress_distribution(frames)
+        fig = px.bar(x=[f"{p}%" for p in distribution.index], y=distribution.values,
+                     title="Répartition du Progrès", labels={'x': 'Progrès', 'y': 'Projets'})
+        st.plotly_chart(recorder.chart('portefeuille_progres', fig), use_container_width=True)
+    with col2:
+        statuses = status_breakdown(frames)
+        fig = px.pie(values=statuses.values, names=statuses.index, title="Statut des Projets")
+        st.plotly_chart(recorder.chart('portefeuille_statuts', fig), use_container_width=True)
     
+    col1, col2 = st.columns(2)
+    with col1:
+        top_owners = overdue_owner.head(20)
+        fig = px.bar(x=top_owners.values, y=top_owners.index, orientation='h',
+                     title="Tâches en Retard par Responsable (top 20)",
+                     labels={'x': 'Tâches', 'y': 'Responsable'})
+        st.plotly_chart(recorder.chart('portefeuille_retards_responsable', fig), use_container_width=True)
     with col2:
-        progress = calculate_progress(current_proj)
-        st.metric("Progrès", f"{progress:.0f}%")
+        by_site = overdue_by_site(frames)
+        fig = px.bar(x=by_site.index, y=by_site.values, title="Tâches en Retard par Site",
+                     labels={'x': 'Site', 'y': 'Tâches'})
+        st.plotly_chart(recorder.chart('portefeuille_retards_site', fig), use_container_width=True)
+    
+    by_status = improvement_by_status(frames)
+    if not by_status.empty:
+        st.subheader("Amélioration Moyenne par Statut")
+        st.dataframe(by_status.rename('Amélioration (%)').round(1), use_container_width=True)
     
+    show_portfolio_watch()
+    show_portfolio_export()
+
+# Alerte de la barre latérale (dernier calcul d'arrière-plan)
+def show_alerts():
+    worker = get_rollups()
+    snapshot = worker.snapshot if worker is not None else None
+    if snapshot and (snapshot['overdue'] or snapshot['stalled']):
+        st.caption(f"🔔 {snapshot['overdue']} tâche(s) en retard · {len(snapshot['stalled'])} projet(s) bloqué(s) "
+                   f"sur le portefeuille")
+
+# Veille du portefeuille : lue dans le dernier calcul d'arrière-plan, sans balayage
+def show_portfolio_watch():
+    worker = get_rollups()
+    if worker is None:
+        return
+    st.subheader("🔔 Veille du Portefeuille")
+    snapshot = worker.snapshot
+    if snapshot is None:
+        st.caption("Premier calcul en cours…")
+        return
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Progrès Moyen", f"{snapshot['average_progress']:.0f}%")
+    with col2:
+        st.metric("Responsables avec Retards", len(snapshot['overdue_by_owner']))
     with col3:
-        status_options = ['brouillon', 'en_cours', 'terminé', 'en_attente']
-        status_labels = {'brouillon': '📝 Brouillon', 'en_cours': '🔄 En Cours', 
-                        'terminé': '✅ Terminé', 'en_attente': '⏸️ En Attente'}
-        if st.session_state.user_role in ['Administrateur', 'Éditeur']:
-            new_status = st.selectbox("Statut :", status_options, 
-                                    index=status_options.index(current_proj.get('status', 'brouillon')),
-                                    format_func=lambda x: status_labels[x])
-            current_proj['status'] = new_status
+        st.metric("Projets Bloqués", len(snapshot['stalled']))
+    if snapshot['stalled']:
+        st.caption(f"Projets en attente sans modification depuis {rollups.STALLED_DAYS} jours ou plus :")
+        st.dataframe([{'Projet': p['name'], 'Site': p['site'] or '—', 'Jours': p['days']}
+                      for p in snapshot['stalled']], use_container_width=True, hide_index=True)
+    st.caption(f"Calculé le {snapshot['computed_at'].replace('T', ' ')} en {snapshot['seconds']:.2f} s · "
+               f"boîte d'envoi : {worker.outbox}")
+    if worker.failure:
+        st.warning(f"Dernier calcul en échec : {worker.failure}")
+    if st.session_state.user_role == 'Administrateur' and st.button("📨 Déposer le résumé maintenant"):
+        path = worker.digest(force=True)
+        st.success(f"Résumé déposé : {os.path.basename(path)}")
+
+# Export du portefeuille complet (ou filtré) en archive zip de tables plates
+def show_portfolio_export():
+    st.subheader("📦 Export du Portefeuille")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        fmt = st.selectbox("Format :", available_formats(), key='export_format')
+    with col2:
+        statuses = st.multiselect("Statuts :", PROJECT_STATUSES, key='export_statuses')
+    with col3:
+        created = st.date_input("Créés entre :", value=(), key='export_created')
     
-    # Onglets pour les phases PDCA
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📋 Planifier", "🔨 Faire", "📊 Vérifier", "🎯 Agir", "📈 Tableau de Bord"])
+    if st.button("Préparer l'Archive"):
+        previous = st.session_state.pop('export_result', None)
+        if previous is not None and os.path.exists(previous.path):
+            os.remove(previous.path)
+        with span('export_portefeuille'):
+            st.session_state.export_result = export_portfolio(
+                get_store(), fmt, statuses=statuses or None,
+                created_from=created[0] if len(created) > 0 else None,
+                created_to=created[1] if len(created) > 1 else None)
     
-    with tab1:  # PLAN
-        st.markdown('<div class="phase-card plan-card"><h3>📋 Planifier - Planification</h3></div>', unsafe_allow_html=True)
-        show_pdca_progress('plan')
-        
-        if st.session_state.user_role in ['Administrateur', 'Éditeur']:
-            # Définition du problème
-            st.subheader("🎯 Définition du Problème")
-            problem = st.text_area("Quel est le problème ?", 
-                                 current_proj.get('plan', {}).get('problem', ''),
-                                 help="Décrivez le problème de manière concrète et mesurable")
-            
-            # Définition des objectifs
-            st.subheader("🎯 Définition des Objectifs")
-            goal = st.text_area("Quel est l'objectif ?", 
-                              current_proj.get('plan', {}).get('goal', ''),
-                              help="Objectifs SMART : Spécifiques, Mesurables, Atteignables, Pertinents, Temporels")
-            
-            # Analyse des causes
-            st.subheader("🔍 Analyse des Causes")
-            root_cause = st.text_area("Quelles sont les causes principales ?", 
-                                    current_proj.get('plan', {}).get('root_cause', ''),
-                                    help="Utilisez les 5 Pourquoi, le diagramme d'Ishikawa ou d'autres méthodes d'analyse")
-            
-            # Planification des mesures
-            st.subheader("📝 Planification des Mesures")
-            measures_text = st.text_area("Mesures prévues (une par ligne) :", 
-                                       '\n'.join(current_proj.get('plan', {}).get('measures', [])))
-            measures = [m.strip() for m in measures_text.split('\n') if m.strip()]
-            
-            # Sauvegarde automatique
-            if 'plan' not in current_proj:
-                current_proj['plan'] = {}
-            current_proj['plan'].update({
-                'problem': problem,
-                'goal': goal,
-                'root_cause': root_cause,
-                'measures': measures
-            })
+    result = st.session_state.get('export_result')
+    if result is not None and os.path.exists(result.path):
+        st.caption(f"Débit : {result.summary()} — " + ", ".join(f"{k} : {v}" for k, v in result.tables.items()))
+        from evidence import INLINE_DOWNLOAD_BYTES, human_size
+        name = os.path.basename(result.path)
+        server = get_api_server()
+        if result.size <= INLINE_DOWNLOAD_BYTES:
+            # L'archive n'est lue qu'au clic, pas à chaque relance
+            st.download_button("💾 Télécharger l'Archive", data=lambda path=result.path: read_file(path),
+                               file_name=name, mime="application/zip", on_click='ignore')
+        elif server is not None and not server.token:
+            host, port = server.server_address[:2]
+            st.link_button("💾 Télécharger l'Archive", f"http://{host}:{port}/exports/{name}",
+                           help="Téléchargement par blocs (API)")
         else:
-            # Affichage seul pour les lecteurs
-            plan_data = current_proj.get('plan', {})
-            if plan_data.get('problem'):
-                st.write("**Problème :**", plan_data['problem'])
-            if plan_data.get('goal'):
-                st.write("**Objectif :**", plan_data['goal'])
-            if plan_data.get('root_cause'):
-                st.write("**Causes :**", plan_data['root_cause'])
-            if plan_data.get('measures'):
-                st.write("**Mesures :**")
-                for measure in plan_data['measures']:
-                    st.write(f"• {measure}")
-    
-    with tab2:  # DO
-        st.markdown('<div class="phase-card do-card"><h3>🔨 Faire - Mise en Œuvre</h3></div>', unsafe_allow_html=True)
-        show_pdca_progress('do')
-        
-        # Gestion des tâches
-        st.subheader("📋 Suivi des Tâches")
-        
-        if st.session_state.user_role in ['Administrateur', 'Éditeur']:
-            # Ajouter une nouvelle tâche
-            with st.expander("➕ Ajouter une Nouvelle Tâche"):
-                col1, col2, col3 = st.columns(3)
+            st.caption(f"Archive volumineuse ({human_size(result.size)}) : GET /exports/{name} "
+                       "(API, KVP_API_PORT)")
+
+# Contenu d'un fichier, lu puis refermé (données différées d'un téléchargement)
+def read_file(path):
+    with open(path, 'rb') as handle:
+        return handle.read()
+
+# Recherche plein texte dans les leçons apprises, causes et résultats de tous les projets
+@st.fragment
+@timed('recherche')
+def show_search():
+    st.header("🔎 Recherche dans les Enseignements")
+    store = get_store()
+    if not store.search_enabled:
+        st.info("Recherche indisponible : cette version de SQLite ne fournit pas FTS5.")
+        return
+    query = st.text_input("Rechercher (leçons apprises, causes, résultats) :", key='search_query',
+                          placeholder="ex. goulot d'étranglement")
+    if not query.strip():
+        return
+    started = time.perf_counter()
+    hits = search_projects(store, query)
+    st.caption(f"{len(hits)} résultat(s) en {(time.perf_counter() - started) * 1000:.0f} ms")
+    for hit in hits:
+        with st.container(border=True):
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(f"**{hit.name}** · {hit.status} · *{hit.label}*")
+                st.markdown(hit.snippet)
+            with col2:
+                if st.button("Ouvrir", key=f"search_open_{hit.project_id}",
+                             on_click=open_project, args=(hit.project_id,)):
+                    st.rerun(scope='app')
+
+# Planning multi-projets : agrégé par jour/semaine côté serveur, tâches
+# individuelles seulement sur une fenêtre rapprochée. La fenêtre (curseur de
+# dates) se déplace et se zoome par boutons ; seul ce fragment est réexécuté.
+@st.fragment
+@timed('planning')
+def show_timeline():
+    from timeline import GROUP_BY, MAX_TASK_BARS
+    st.header("📅 Planning des Projets Actifs")
+    timeline = get_timeline()
+    with span('planning_index'):
+        index = timeline.refresh()
+    if not len(index):
+        st.info("Aucune tâche datée dans les projets actifs (brouillon, en cours, en attente).")
+        return
+    first, last = (datetime.fromordinal(o).date() for o in index.extent)
+    if first == last:
+        # Toutes les échéances le même jour : le curseur exige deux bornes distinctes
+        first, last = first - timedelta(days=3), last + timedelta(days=3)
+    window = st.session_state.get('timeline_window')
+    if window is None or window[0] > last or window[1] < first or window[0] >= window[1]:
+        st.session_state.timeline_window = (first, last)
+    else:
+        st.session_state.timeline_window = (max(window[0], first), min(window[1], last))
+    
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        group_by = st.radio("Regrouper par :", list(GROUP_BY), format_func=GROUP_BY.get, horizontal=True,
+                            key='timeline_group')
+    with col2:
+        buttons = st.columns(5)
+        moves = [("◀", -0.5, 1), ("▶", 0.5, 1), ("🔍+", 0, 0.5), ("🔍−", 0, 2), ("⟲", None, None)]
+        for column, (label, shift, scale) in zip(buttons, moves):
+            with column:
+                st.button(label, key=f"timeline_move_{label}", on_click=move_timeline_window,
+                          args=(shift, scale, first, last), use_container_width=True)
+    start, end = st.slider("Fenêtre :", min_value=first, max_value=last, key='timeline_window',
+                           format="DD/MM/YYYY")
+    
+    lo, hi = start.toordinal(), end.toordinal()
+    today = datetime.now().date()
+    with span('planning_agregation'):
+        view = timeline.view(group_by, lo, hi, today)
+    label = GROUP_BY[group_by]
+    build = build_timeline_bars if view['level'] == 'taches' else build_timeline_heatmap
+    fig = get_figure_cache().get_or_build((index.seq, 'planning', group_by, lo, hi, today),
+                                          lambda: build(view, label))
+    st.plotly_chart(recorder.chart('planning', fig), use_container_width=True, key='timeline_chart')
+    if view['level'] == 'taches':
+        detail = f"{len(view['tasks'])} tâche(s) dans la fenêtre"
+    else:
+        detail = (f"{view['tasks']} tâche(s) agrégées par {'jour' if view['width'] == 1 else 'semaine'} ; "
+                  f"zoomer jusqu'à {MAX_TASK_BARS} tâches pour les voir une à une")
+    st.caption(f"{detail} · {index.undated} tâche(s) sans échéance non affichée(s) · "
+               f"début d'une tâche : échéance de l'étape précédente du projet")
+
+# Rappel des boutons du planning : déplace (`shift`, en fraction de fenêtre) ou
+# zoome (`scale`) la fenêtre avant la réexécution ; sans paramètre, tout afficher
+def move_timeline_window(shift, scale, first, last):
+    if shift is None:
+        st.session_state.timeline_window = (first, last)
+        return
+    start, end = st.session_state.timeline_window
+    span_days = (end - start).days
+    center = start + timedelta(days=span_days / 2 + shift * span_days)
+    half = timedelta(days=max(span_days * scale / 2, 3))
+    start, end = max(center - half, first), min(center + half, last)
+    if start < end:
+        st.session_state.timeline_window = (start, end)
+
+# Rappel de bouton : exécuté avant le script, il peut encore modifier la vue choisie
+def open_project(project_id):
+    st.session_state.current_project = project_id
+    st.session_state.view = 'Projet'
+
+# Contrat des fragments : chaque onglet (et le sélecteur de projet) se réexécute seul.
+# Une relance complète n'est demandée que si le projet actif a changé ou disparu,
+# ou si une valeur affichée hors du fragment a été modifiée (voir shared_view_state).
+def shared_view_state(project):
+    stats = get_task_stats(project)
+    return (project.get('name'), project.get('status'), calculate_progress(project),
+            stats.total, tuple(sorted(stats.status_counts.items())),
+            tuple(sorted((project.get('check', {}).get('metrics') or {}).items())))
+
+def in_fragment_rerun():
+    ctx = get_script_run_ctx()
+    return bool(getattr(ctx, 'fragment_ids_this_run', None))
+
+def section_project(project_id):
+    if in_fragment_rerun() and sync_project(project_id):
+        st.rerun(scope='app')
+    if project_id != st.session_state.current_project or project_id not in st.session_state.projects:
+        st.rerun(scope='app')
+    return st.session_state.projects[project_id]
+
+def finish_section(project, before):
+    try:
+        result = st.session_state.projects.save(project['id'])
+    except KeyError:
+        # Projet supprimé par une autre session
+        st.rerun(scope='app')
+    if result.refreshed or result.conflicts:
+        # Valeurs fusionnées depuis une autre session : les widgets doivent les
+        # reprendre et le panneau des conflits (hors fragment) doit s'afficher
+        reset_section_widgets(project['id'], result.refreshed)
+        st.rerun(scope='app')
+    if in_fragment_rerun() and shared_view_state(project) != before:
+        st.rerun(scope='app')
+
+# Widgets à clé liés à une section du projet. Leur dernière valeur rendue permet
+# de repérer une saisie pas encore reportée dans le projet : la section concernée
+# n'est alors pas rechargée (la fusion a lieu à l'enregistrement).
+def tracked(project_id, section, key, value):
+    st.session_state.setdefault('tracked_widgets', {})[key] = (project_id, section, value)
+    return value
+
+def pending_sections(project_id):
+    pending = set()
+    for key, (pid, section, value) in st.session_state.get('tracked_widgets', {}).items():
+        if pid == project_id and key in st.session_state and st.session_state[key] != value:
+            pending.add(section)
+    prefix = f"grid_editor_{project_id}_"
+    for key in list(st.session_state):
+        if str(key).startswith(prefix) and (st.session_state[key] or {}).get('edited_rows'):
+            pending.add('do')
+    return pending
+
+# Un widget à clé garde son propre état : on l'oublie pour qu'il reprenne la valeur du projet
+def reset_section_widgets(project_id, sections):
+    widgets = st.session_state.get('tracked_widgets', {})
+    for key in [k for k, (pid, section, _) in widgets.items() if pid == project_id and section in sections]:
+        del widgets[key]
+        st.session_state.pop(key, None)
+    if 'do' in sections:
+        st.session_state.grid_nonce = st.session_state.get('grid_nonce', 0) + 1
+
+# Flux de modifications : recharge les sections modifiées par d'autres sessions
+def sync_project(project_id):
+    pending = {project_id: pending_sections(project_id)}
+    sections = st.session_state.projects.refresh(pending).get(project_id, set())
+    reset_section_widgets(project_id, sections)
+    return sections
+
+# Vérification périodique du flux de modifications pour le projet affiché
+@st.fragment(run_every=SYNC_INTERVAL_SECONDS)
+@timed('synchronisation')
+def show_sync_status(project_id):
+    if in_fragment_rerun() and sync_project(project_id):
+        st.toast("🔄 Projet mis à jour par un autre utilisateur")
+        st.rerun(scope='app')
+
+# Conflits d'édition : un même champ modifié ici et dans une autre session
+def show_conflicts(project_id):
+    conflicts = st.session_state.projects.conflicts.get(project_id)
+    if not conflicts:
+        return
+    st.warning(f"⚠️ {len(conflicts)} conflit(s) : ces champs ont été modifiés par un autre utilisateur "
+               "pendant votre saisie. Vos valeurs ne sont pas enregistrées tant que le conflit n'est pas résolu.")
+    for conflict in conflicts:
+        section, field = conflict['section'], conflict['field']
+        with st.expander(f"{SECTION_LABELS[section]} – {FIELD_LABELS.get(field, field)}", expanded=True):
+            for task in conflict.get('tasks', []):
+                # Tâches : seuls les champs modifiés des deux côtés sont en conflit
+                label = f"Tâche {task['task'] + 1} « {task['name']} »"
+                if task['field'] is None:
+                    st.caption(f"{label} – {'supprimée' if task['mine'] is None else 'modifiée'} ici, "
+                               f"{'supprimée' if task['theirs'] is None else 'modifiée'} par l'autre utilisateur")
+                else:
+                    st.caption(f"{label} – {TASK_FIELD_LABELS.get(task['field'], task['field'])} : "
+                               f"vous « {task['mine'] or '—'} », enregistré « {task['theirs'] or '—'} »")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**Votre version :**")
+                st.write(conflict['mine'])
+                keep_mine = st.button("Garder ma version", key=f"conflict_mine_{section}_{field}")
+            with col2:
+                st.markdown("**Version enregistrée :**")
+                st.write(conflict['theirs'])
+                take_theirs = st.button("Prendre la leur", key=f"conflict_theirs_{section}_{field}")
+            if keep_mine or take_theirs:
+                st.session_state.projects.resolve(project_id, section, field, keep_mine)
+                reset_section_widgets(project_id, {section})
+                st.session_state.projects.save(project_id)
+                st.rerun()
+
+# Onglet Planifier
+@st.fragment
+@timed('onglet_planifier')
+def show_plan_tab(project_id):
+    current_proj = section_project(project_id)
+    before = shared_view_state(current_proj)
+    
+    st.markdown(theme.PHASE_CARDS['plan'], unsafe_allow_html=True)
+    show_pdca_progress('plan')
+    
+    if st.session_state.user_role in ['Administrateur', 'Éditeur']:
+        # Définition du problème
+        st.subheader("🎯 Définition du Problème")
+        problem = tracked(project_id, 'plan', f"plan_problem_{project_id}", st.text_area(
+                             "Quel est le problème ?", 
+                             current_proj.get('plan', {}).get('problem', ''),
+                             help="Décrivez le problème de manière concrète et mesurable",
+                             key=f"plan_problem_{project_id}"))
+    
+        # Définition des objectifs
+        st.subheader("🎯 Définition des Objectifs")
+        goal = tracked(project_id, 'plan', f"plan_goal_{project_id}", st.text_area(
+                          "Quel est l'objectif ?", 
+                          current_proj.get('plan', {}).get('goal', ''),
+                          help="Objectifs SMART : Spécifiques, Mesurables, Atteignables, Pertinents, Temporels",
+                          key=f"plan_goal_{project_id}"))
+    
+        # Analyse des causes
+        st.subheader("🔍 Analyse des Causes")
+        root_cause = tracked(project_id, 'plan', f"plan_root_cause_{project_id}", st.text_area(
+                                "Quelles sont les causes principales ?", 
+                                current_proj.get('plan', {}).get('root_cause', ''),
+                                help="Utilisez les 5 Pourquoi, le diagramme d'Ishikawa ou d'autres méthodes d'analyse",
+                                key=f"plan_root_cause_{project_id}"))
+    
+        # Planification des mesures
+        st.subheader("📝 Planification des Mesures")
+        measures_text = tracked(project_id, 'plan', f"plan_measures_{project_id}", st.text_area(
+                                   "Mesures prévues (une par ligne) :", 
+                                   '\n'.join(current_proj.get('plan', {}).get('measures', [])),
+                                   key=f"plan_measures_{project_id}"))
+        measures = [m.strip() for m in measures_text.split('\n') if m.strip()]
+    
+        # Sauvegarde automatique
+        if 'plan' not in current_proj:
+            current_proj['plan'] = {}
+        current_proj['plan'].update({
+            'problem': problem,
+            'goal': goal,
+            'root_cause': root_cause,
+            'measures': measures
+        })
+    else:
+        # Affichage seul pour les lecteurs
+        plan_data = current_proj.get('plan', {})
+        if plan_data.get('problem'):
+            st.write("**Problème :**", plan_data['problem'])
+        if plan_data.get('goal'):
+            st.write("**Objectif :**", plan_data['goal'])
+        if plan_data.get('root_cause'):
+            st.write("**Causes :**", plan_data['root_cause'])
+        if plan_data.get('measures'):
+            st.write("**Mesures :**")
+            for measure in plan_data['measures']:
+                st.write(f"• {measure}")
+    
+    show_evidence(project_id, 'plan')
+    finish_section(current_proj, before)
+
+# Onglet Faire
+@st.fragment
+@timed('onglet_faire')
+def show_do_tab(project_id):
+    current_proj = section_project(project_id)
+    before = shared_view_state(current_proj)
+    
+    st.markdown(theme.PHASE_CARDS['do'], unsafe_allow_html=True)
+    show_pdca_progress('do')
+    
+    # Gestion des tâches
+    st.subheader("📋 Suivi des Tâches")
+    
+    if st.session_state.user_role in ['Administrateur', 'Éditeur']:
+        # Ajouter une nouvelle tâche
+        with st.expander("➕ Ajouter une Nouvelle Tâche"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                new_task_title = st.text_input("Tâche :")
+            with col2:
+                new_responsible = st.text_input("Responsable :")
+            with col3:
+                new_date = st.date_input("Date d'Échéance :")
+    
+            if st.button("Ajouter la Tâche") and new_task_title:
+                task_stats = get_task_stats(current_proj)
+                added_task = new_task(new_task_title, new_responsible, new_date)
+                add_task(current_proj, added_task)
+                task_stats.add(added_task)
+                st.session_state.projects.save(current_proj['id'])
+                st.rerun()
+    
+    # Afficher la liste des tâches
+    tasks = current_proj.get('do', {}).get('implementation_steps', [])
+    task_stats = get_task_stats(current_proj)
+    grid_mode = st.toggle("Mode grille", value=len(tasks) > GRID_MODE_THRESHOLD, key=f"grid_mode_{current_proj['id']}")
+    if tasks and grid_mode:
+        show_task_grid(current_proj, tasks, task_stats)
+    elif tasks:
+        # Clés des widgets liées à la liste affichée (position + génération) :
+        # une suppression renouvelle la génération, les lignes suivantes ne
+        # reprennent pas l'état du widget de la tâche qui les précédait
+        nonce = st.session_state.setdefault('grid_nonce', 0)
+        for i, task in enumerate(tasks):
+            with st.container():
+                col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 1, 1])
+    
                 with col1:
-                    new_task = st.text_input("Tâche :")
+                    task_class = "task-completed" if task['status'] == 'terminé' else ""
+                    st.markdown(f'<div class="{task_class}">{task["task"]}</div>', unsafe_allow_html=True)
+    
                 with col2:
-                    new_responsible = st.text_input("Responsable :")
+                    st.write(f"👤 {task['responsible']}")
+    
                 with col3:
-                    new_date = st.date_input("Date d'Échéance :")
-                
-                if st.button("Ajouter la Tâche") and new_task:
-                    if 'do' not in current_proj:
-                        current_proj['do'] = {'implementation_steps': []}
-                    if 'implementation_steps' not in current_proj['do']:
-                        current_proj['do']['implementation_steps'] = []
-                    
-                    current_proj['do']['implementation_steps'].append({
-                        'task': new_task,
-                        'responsible': new_responsible,
-                        'due_date': new_date.strftime('%Y-%m-%d'),
-                        'status': 'ouvert',
-                        'priority': 'moyen'
-                    })
-                    st.rerun()
-        
-        # Afficher la liste des tâches
-        tasks = current_proj.get('do', {}).get('implementation_steps', [])
-        if tasks:
-            for i, task in enumerate(tasks):
-                with st.container():
-                    col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 1, 1])
-                    
-                    with col1:
-                        task_class = "task-completed" if task['status'] == 'terminé' else ""
-                        st.markdown(f'<div class="{task_class}">{task["task"]}</div>', unsafe_allow_html=True)
-                    
-                    with col2:
-                        st.write(f"👤 {task['responsible']}")
-                    
-                    with col3:
-                        st.write(f"📅 {task['due_date']}")
-                    
-                    with col4:
-                        if st.session_state.user_role in ['Administrateur', 'Éditeur']:
-                            status_map = {'ouvert': 'Ouvert', 'en_cours': 'En Cours', 'terminé': 'Terminé'}
-                            status_options = ['ouvert', 'en_cours', 'terminé']
-                            current_status_index = status_options.index(task['status']) if task['status'] in status_options else 0
-                            new_status = st.selectbox("", status_options, 
-                                                    index=current_status_index,
-                                                    format_func=lambda x: status_map[x],
-                                                    key=f"status_{i}")
-                            task['status'] = new_status
-                    
-                    with col5:
-                        if st.session_state.user_role == 'Administrateur':
-                            if st.button("🗑️", key=f"delete_{i}"):
-                                tasks.pop(i)
-                                st.rerun()
-                    
-                    st.divider()
-        else:
-            st.info("Aucune tâche définie pour le moment.")
+                    st.write(f"📅 {task['due_date']}")
     
-    with tab3:  # CHECK
-        st.markdown('<div class="phase-card check-card"><h3>📊 Vérifier - Vérification</h3></div>', unsafe_allow_html=True)
-        show_pdca_progress('check')
-        
-        if st.session_state.user_role in ['Administrateur', 'Éditeur']:
-            st.subheader("📈 Indicateurs & Résultats")
-            
-            # Saisir les métriques
+                with col4:
+                    if st.session_state.user_role in ['Administrateur', 'Éditeur']:
+                        current_status_index = TASK_STATUSES.index(task['status']) if task['status'] in TASK_STATUSES else 0
+                        status_key = f"status_{current_proj['id']}_{nonce}_{i}"
+                        new_status = tracked(current_proj['id'], 'do', status_key, st.selectbox(
+                                                "", TASK_STATUSES, 
+                                                index=current_status_index,
+                                                format_func=lambda x: TASK_STATUS_LABELS[x],
+                                                key=status_key))
+                        if new_status != task['status']:
+                            old_status = set_task_status(current_proj, i, new_status)
+                            task_stats.change_status(task, old_status)
+    
+                with col5:
+                    if st.session_state.user_role == 'Administrateur':
+                        if st.button("🗑️", key=f"delete_{current_proj['id']}_{nonce}_{i}"):
+                            task_stats.remove(delete_task(current_proj, i))
+                            st.session_state.projects.save(current_proj['id'])
+                            reset_section_widgets(current_proj['id'], {'do'})
+                            st.rerun()
+    
+                st.divider()
+    else:
+        st.info("Aucune tâche définie pour le moment.")
+    
+    show_evidence(project_id, 'do', tasks)
+    finish_section(current_proj, before)
+
+# Onglet Vérifier
+@st.fragment
+@timed('onglet_verifier')
+def show_check_tab(project_id):
+    current_proj = section_project(project_id)
+    before = shared_view_state(current_proj)
+    
+    st.markdown(theme.PHASE_CARDS['check'], unsafe_allow_html=True)
+    show_pdca_progress('check')
+    
+    if st.session_state.user_role in ['Administrateur', 'Éditeur']:
+        st.subheader("📈 Indicateurs & Résultats")
+    
+        # Saisir les métriques
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            metric1 = tracked(project_id, 'check', f"check_before_{project_id}", st.number_input(
+                                    "Valeur Avant :", 
+                                    value=current_proj.get('check', {}).get('metrics', {}).get('temps_attente_avant', 0.0),
+                                    key=f"check_before_{project_id}"))
+        with col2:
+            metric2 = tracked(project_id, 'check', f"check_after_{project_id}", st.number_input(
+                                    "Valeur Après :", 
+                                    value=current_proj.get('check', {}).get('metrics', {}).get('temps_attente_apres', 0.0),
+                                    key=f"check_after_{project_id}"))
+        with col3:
+            metrics = check_metrics(metric1, metric2)
+            if metric1 > 0:
+                st.metric("Amélioration", f"{metrics['amelioration_pourcentage']:.1f}%")
+    
+        # Évaluation des résultats
+        results = tracked(project_id, 'check', f"check_results_{project_id}", st.text_area(
+                             "Évaluation des Résultats :", 
+                             current_proj.get('check', {}).get('results', ''),
+                             key=f"check_results_{project_id}"))
+    
+        # Sauvegarder
+        if 'check' not in current_proj:
+            current_proj['check'] = {}
+        current_proj['check'].update({'metrics': metrics, 'results': results})
+    else:
+        # Affichage seul
+        check_data = current_proj.get('check', {})
+        if check_data.get('metrics'):
+            metrics = check_data['metrics']
             col1, col2, col3 = st.columns(3)
             with col1:
-                metric1 = st.number_input("Valeur Avant :", 
-                                        value=current_proj.get('check', {}).get('metrics', {}).get('temps_attente_avant', 0.0))
+                st.metric("Avant", metrics.get('temps_attente_avant', 0))
             with col2:
-                metric2 = st.number_input("Valeur Après :", 
-                                        value=current_proj.get('check', {}).get('metrics', {}).get('temps_attente_apres', 0.0))
+                st.metric("Après", metrics.get('temps_attente_apres', 0))
             with col3:
-                if metric1 > 0:
-                    improvement = ((metric1 - metric2) / metric1) * 100
-                    st.metric("Amélioration", f"{improvement:.1f}%")
-            
-            # Évaluation des résultats
-            results = st.text_area("Évaluation des Résultats :", 
-                                 current_proj.get('check', {}).get('results', ''))
-            
-            # Sauvegarder
-            if 'check' not in current_proj:
-                current_proj['check'] = {}
-            current_proj['check'].update({
-                'metrics': {
-                    'temps_attente_avant': metric1,
-                    'temps_attente_apres': metric2,
-                    'amelioration_pourcentage': improvement if metric1 > 0 else 0
-                },
-                'results': results
-            })
+                st.metric("Amélioration", f"{metrics.get('amelioration_pourcentage', 0):.1f}%")
+    
+        if check_data.get('results'):
+            st.write("**Résultats :**", check_data['results'])
+    
+    show_kpi_series(project_id, st.session_state.user_role in ['Administrateur', 'Éditeur'])
+    show_evidence(project_id, 'check')
+    
+    finish_section(current_proj, before)
+
+# Périodes affichées, comptées depuis la dernière mesure
+KPI_PERIODS = {'Tout': None, '1 an': 365 * 86400, '30 jours': 30 * 86400, '7 jours': 7 * 86400,
+               '24 heures': 86400}
+
+# Indicateurs suivis (séries temporelles) : référence vs après changement et
+# graphique réduit à MAX_CHART_POINTS points, quelle que soit la longueur de la série
+def show_kpi_series(project_id, editable):
+    from kpi_series import to_epoch
+    kpis = get_kpis()
+    st.subheader("⏱️ Indicateurs Suivis")
+    if editable:
+        with st.expander("➕ Nouvel Indicateur"):
+            col1, col2 = st.columns(2)
+            with col1:
+                name = st.text_input("Nom :", key=f"kpi_name_{project_id}", placeholder="Temps de cycle, TRS, rebut…")
+                unit = st.text_input("Unité :", key=f"kpi_unit_{project_id}")
+            with col2:
+                change = st.date_input("Date du changement :", value=None, key=f"kpi_change_{project_id}")
+                higher = st.checkbox("Plus haut = meilleur", key=f"kpi_higher_{project_id}")
+            if st.button("Créer l'Indicateur", key=f"kpi_create_{project_id}") and name.strip():
+                try:
+                    kpis.create(project_id, name, unit, higher, to_epoch(change) if change else None)
+                except sqlite3.IntegrityError:
+                    st.error("Un indicateur porte déjà ce nom.")
+    
+    project_kpis = kpis.list(project_id)
+    if not project_kpis:
+        st.caption("Aucun indicateur suivi : créez-en un puis importez ses mesures (CSV horodatage,valeur).")
+    for kpi in project_kpis:
+        with st.container(border=True):
+            show_kpi(kpis, kpi, editable)
+
+def show_kpi(kpis, kpi, editable):
+    from kpi_series import DOWNSAMPLING_METHODS, MAX_CHART_POINTS, read_points, to_epoch
+    count = kpis.count(kpi.id)
+    unit = f" ({kpi.unit})" if kpi.unit else ''
+    st.markdown(f"**{kpi.name}**{unit} · {count:,} mesure(s)".replace(',', ' '))
+    stats = kpis.statistics(kpi)
+    baseline, after = stats['baseline'], stats['after']
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Référence (moyenne)", f"{baseline['mean']:.2f}" if baseline else "—",
+                  help=f"{baseline['n']} mesure(s), médiane {baseline['median']:.2f}, p95 {baseline['p95']:.2f}"
+                  if baseline else None)
+    with col2:
+        st.metric("Après changement", f"{after['mean']:.2f}" if after and kpi.change_at is not None else "—",
+                  help=f"{after['n']} mesure(s), médiane {after['median']:.2f}, p95 {after['p95']:.2f}"
+                  if after and kpi.change_at is not None else None)
+    with col3:
+        improvement = stats['improvement_pct']
+        st.metric("Amélioration", f"{improvement:.1f}%" if improvement is not None else "—")
+    
+    if count:
+        col1, col2 = st.columns(2)
+        with col1:
+            period = st.radio("Période :", list(KPI_PERIODS), horizontal=True, key=f"kpi_period_{kpi.id}")
+        with col2:
+            method = st.radio("Réduction :", DOWNSAMPLING_METHODS, horizontal=True, key=f"kpi_method_{kpi.id}",
+                              format_func={'lttb': 'Forme (LTTB)', 'minmax': 'Pics (min/max)'}.get)
+        times, _ = kpis.series(kpi.id)
+        start = int(times[-1]) - KPI_PERIODS[period] if KPI_PERIODS[period] else None
+        
+        def build():
+            with span('figure_indicateur'):
+                shown_times, shown_values = kpis.window(kpi.id, start=start, method=method)
+                return build_kpi_series(kpi.name, kpi.unit, shown_times, shown_values, kpi.change_at, stats)
+        
+        fig = get_figure_cache().get_or_build((kpi.project_id, count, kpi.change_at, 'kpi', kpi.id, period, method),
+                                              build)
+        st.plotly_chart(recorder.chart('indicateur', fig), use_container_width=True, key=f"kpi_chart_{kpi.id}")
+        if count > MAX_CHART_POINTS:
+            st.caption(f"{MAX_CHART_POINTS} points affichés au plus ; statistiques calculées sur toutes les mesures.")
+    
+    if editable:
+        with st.expander("Mesures et réglages"):
+            uploaded = st.file_uploader("Mesures (CSV horodatage,valeur) :", type=['csv'], key=f"kpi_file_{kpi.id}")
+            if uploaded is not None and st.button("Ajouter les Mesures", key=f"kpi_import_{kpi.id}"):
+                with span('import_indicateur'):
+                    times, values, rejected = read_points(uploaded)
+                    added = kpis.append(kpi.id, times, values)
+                message = f"{added} mesure(s) ajoutée(s)"
+                st.toast(f"{message}, {rejected} ligne(s) rejetée(s) (horodatage ou valeur illisible)"
+                         if rejected else f"{message}.")
+                st.rerun()
+            col1, col2 = st.columns(2)
+            with col1:
+                value = st.number_input("Mesure actuelle :", value=None, key=f"kpi_value_{kpi.id}")
+                if st.button("Ajouter", key=f"kpi_add_{kpi.id}") and value is not None:
+                    kpis.append(kpi.id, [int(time.time())], [value])
+                    st.rerun()
+            with col2:
+                current = datetime.fromtimestamp(kpi.change_at, timezone.utc).date() if kpi.change_at is not None else None
+                change = st.date_input("Date du changement :", value=current, key=f"kpi_change_{kpi.id}")
+                if change != current:
+                    kpis.set_change_at(kpi.id, to_epoch(change) if change else None)
+                    st.rerun()
+            if st.button("🗑️ Supprimer l'Indicateur", key=f"kpi_delete_{kpi.id}"):
+                kpis.delete(kpi.id)
+                st.rerun()
+
+# Onglet Agir
+@st.fragment
+@timed('onglet_agir')
+def show_act_tab(project_id):
+    current_proj = section_project(project_id)
+    before = shared_view_state(current_proj)
+    
+    st.markdown(theme.PHASE_CARDS['act'], unsafe_allow_html=True)
+    show_pdca_progress('act')
+    
+    if st.session_state.user_role in ['Administrateur', 'Éditeur']:
+        st.subheader("📋 Standardisation & Prochaines Étapes")
+    
+        # Standardisation
+        standardization = tracked(project_id, 'act', f"act_standardization_{project_id}", st.text_area(
+                                     "Standardisation :", 
+                                     current_proj.get('act', {}).get('standardization', ''),
+                                     help="Comment les améliorations sont-elles ancrées de manière permanente ?",
+                                     key=f"act_standardization_{project_id}"))
+    
+        # Leçons apprises
+        lessons = tracked(project_id, 'act', f"act_lessons_learned_{project_id}", st.text_area(
+                             "Leçons Apprises :", 
+                             current_proj.get('act', {}).get('lessons_learned', ''),
+                             help="Qu'avez-vous appris ? Que feriez-vous différemment ?",
+                             key=f"act_lessons_learned_{project_id}"))
+    
+        # Prochaines étapes
+        next_steps = tracked(project_id, 'act', f"act_next_steps_{project_id}", st.text_area(
+                                "Prochaines Étapes :", 
+                                current_proj.get('act', {}).get('next_steps', ''),
+                                help="Quelles mesures de suivi sont prévues ?",
+                                key=f"act_next_steps_{project_id}"))
+    
+        # Sauvegarder
+        if 'act' not in current_proj:
+            current_proj['act'] = {}
+        current_proj['act'].update({
+            'standardization': standardization,
+            'lessons_learned': lessons,
+            'next_steps': next_steps
+        })
+    else:
+        # Affichage seul
+        act_data = current_proj.get('act', {})
+        if act_data.get('standardization'):
+            st.write("**Standardisation :**", act_data['standardization'])
+        if act_data.get('lessons_learned'):
+            st.write("**Leçons Apprises :**", act_data['lessons_learned'])
+        if act_data.get('next_steps'):
+            st.write("**Prochaines Étapes :**", act_data['next_steps'])
+    
+    show_evidence(project_id, 'act')
+    finish_section(current_proj, before)
+
+# Pièces jointes et commentaires d'une phase (ou, pour Faire, d'une tâche).
+# Rien n'est lu tant que la bascule est fermée ; les fichiers passent par
+# blocs vers le magasin de blobs et les commentaires se chargent par page.
+def show_evidence(project_id, section, tasks=None):
+    evidence = get_evidence()
+    editable = st.session_state.user_role in ['Administrateur', 'Éditeur']
+    st.subheader("📎 Pièces Jointes et Commentaires")
+    task = ''
+    if tasks is not None:
+        titles = list(dict.fromkeys(t.get('task', '') for t in tasks if t.get('task')))
+        task = st.selectbox("Rattacher à :", [''] + titles, key=f"evidence_task_{project_id}",
+                            format_func=lambda t: t or "la phase Faire")
+    files, comments = evidence.counts(project_id, section, task)
+    target = f"{project_id}_{section}_{task}"
+    if not st.toggle(f"Afficher ({files} fichier(s), {comments} commentaire(s))", key=f"evidence_{target}"):
+        return
+    with span('pieces_jointes'):
+        show_attachments(evidence, project_id, section, task, target, editable)
+    with span('commentaires'):
+        show_comments(evidence, project_id, section, task, target)
+
+def show_attachments(evidence, project_id, section, task, target, editable):
+    from evidence import INLINE_DOWNLOAD_BYTES, PREVIEW_PENDING, human_size
+    server = get_api_server()
+    for attachment in evidence.attachments(project_id, section, task):
+        col1, col2, col3 = st.columns([1, 4, 1])
+        with col1:
+            if attachment.thumbnail:
+                st.image(evidence.blobs.path(attachment.thumbnail))
+            elif attachment.preview_status == PREVIEW_PENDING:
+                st.caption("⏳ Miniature…")
+            else:
+                st.markdown("📄")
+        with col2:
+            st.markdown(f"**{attachment.name}**")
+            st.caption(f"{human_size(attachment.size)} · {attachment.author or '—'} · "
+                       f"{(attachment.created_at or '')[:16].replace('T', ' ')}")
+            if attachment.preview and st.toggle("🔍 Aperçu", key=f"preview_{attachment.id}"):
+                st.image(evidence.blobs.path(attachment.preview))
+        with col3:
+            route = f"/attachments/{attachment.id}/content"
+            if attachment.size <= INLINE_DOWNLOAD_BYTES:
+                # Lecture différée : le fichier n'est lu qu'au clic
+                st.download_button("⬇️", data=lambda digest=attachment.blob: evidence.blobs.read(digest),
+                                   file_name=attachment.name, mime=attachment.mime or 'application/octet-stream',
+                                   key=f"download_{attachment.id}", on_click='ignore')
+            elif server is not None and not server.token:
+                host, port = server.server_address[:2]
+                st.link_button("⬇️", f"http://{host}:{port}{route}", help="Téléchargement par blocs (API)")
+            else:
+                st.caption(f"Volumineux : GET {route} (API, KVP_API_PORT)")
+            if editable and st.button("🗑️", key=f"remove_{attachment.id}"):
+                evidence.remove(attachment.id)
+                st.rerun()
+    if editable:
+        # Clé renouvelée après l'envoi : les fichiers reçus quittent la session
+        upload_key = f"evidence_upload_{target}_{st.session_state.get(f'evidence_uploads_{target}', 0)}"
+        uploaded = st.file_uploader("Ajouter des fichiers (photos, relevés, standards PDF) :",
+                                    accept_multiple_files=True, key=upload_key)
+        if uploaded and st.button("📎 Joindre", key=f"attach_{target}"):
+            for handle in uploaded:
+                try:
+                    evidence.attach(project_id, section, handle, handle.name, handle.type, current_user(), task)
+                except ValueError as exc:
+                    st.error(f"{handle.name} : {exc}")
+            st.session_state[f'evidence_uploads_{target}'] = st.session_state.get(f'evidence_uploads_{target}', 0) + 1
+            st.rerun()
+
+# Fils de commentaires, du plus récent au plus ancien, une page à la fois :
+# la session ne garde que les curseurs des pages parcourues
+def show_comments(evidence, project_id, section, task, target):
+    from evidence import COMMENTS_PAGE_SIZE, REPLIES_SHOWN
+    cursors = st.session_state.setdefault(f"comment_pages_{target}", [None])
+    body = st.text_area("Nouveau commentaire :", key=f"comment_body_{target}", height=80)
+    if st.button("💬 Publier", key=f"comment_post_{target}") and body.strip():
+        evidence.add_comment(project_id, section, body, current_user(), task)
+        st.session_state[f"comment_pages_{target}"] = [None]
+        st.session_state.pop(f"comment_body_{target}", None)
+        st.rerun()
+    threads, next_cursor = evidence.comments(project_id, section, task, before=cursors[-1])
+    for thread in threads:
+        with st.container(border=True):
+            st.markdown(f"**{thread.author or '—'}** · {thread.created_at[:16].replace('T', ' ')}")
+            st.write(thread.body)
+            replies, reply_cursors, more = thread.replies, None, None
+            if thread.reply_count > REPLIES_SHOWN and st.toggle(
+                    f"Toutes les réponses ({thread.reply_count})", key=f"replies_{thread.id}"):
+                # Réponses parcourues page par page (curseur : dernière réponse affichée)
+                reply_cursors = st.session_state.setdefault(f"reply_pages_{thread.id}", [None])
+                replies = evidence.replies(thread.id, after=reply_cursors[-1], limit=COMMENTS_PAGE_SIZE + 1)
+                if len(replies) > COMMENTS_PAGE_SIZE:
+                    replies = replies[:COMMENTS_PAGE_SIZE]
+                    more = replies[-1].id
+            for reply in replies:
+                st.caption(f"↳ **{reply.author or '—'}** · {reply.created_at[:16].replace('T', ' ')} — {reply.body}")
+            if reply_cursors and len(reply_cursors) > 1 and st.button(
+                    "◀ Réponses précédentes", key=f"replies_prev_{thread.id}"):
+                reply_cursors.pop()
+                st.rerun()
+            if more is not None and st.button("Réponses suivantes ▶", key=f"replies_next_{thread.id}"):
+                reply_cursors.append(more)
+                st.rerun()
+            with st.popover("↩️ Répondre"):
+                answer = st.text_input("Réponse :", key=f"reply_body_{thread.id}")
+                if st.button("Envoyer", key=f"reply_post_{thread.id}") and answer.strip():
+                    try:
+                        evidence.add_comment(project_id, section, answer, current_user(), task, parent_id=thread.id)
+                    except ValueError as exc:
+                        # Fil supprimé entre-temps
+                        st.warning(f"Réponse non publiée : {exc}")
+                    else:
+                        st.session_state.pop(f"reply_body_{thread.id}", None)
+                        st.rerun()
+    col1, col2 = st.columns(2)
+    with col1:
+        if len(cursors) > 1 and st.button("◀ Plus récents", key=f"comments_newer_{target}"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if next_cursor is not None and st.button("Plus anciens ▶", key=f"comments_older_{target}"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+# Onglet Tableau de Bord
+@st.fragment
+@timed('tableau_de_bord')
+def show_dashboard_tab(project_id):
+    current_proj = section_project(project_id)
+    before = shared_view_state(current_proj)
+    
+    st.header("📈 Tableau de Bord du Projet")
+    
+    # KPIs
+    col1, col2, col3, col4 = st.columns(4)
+    
+    task_stats = get_task_stats(current_proj)
+    total_tasks = task_stats.total
+    completed_tasks = task_stats.count('terminé')
+    in_progress_tasks = task_stats.count('en_cours')
+    overdue_tasks = task_stats.overdue()
+    
+    with col1:
+        st.metric("Total Tâches", total_tasks)
+    with col2:
+        st.metric("Terminées", completed_tasks, f"{completed_tasks}/{total_tasks}")
+    with col3:
+        st.metric("En Cours", in_progress_tasks)
+    with col4:
+        st.metric("En Retard", overdue_tasks, delta=f"-{overdue_tasks}" if overdue_tasks > 0 else None)
+    
+    # Figures mémorisées par (projet, version de section) et partagées entre sessions
+    figures = get_figure_cache()
+    versions = st.session_state.projects.versions(project_id)
+    
+    # Diagramme de statut des tâches
+    if total_tasks:
+        with span('figure_statut_taches'):
+            fig = status_pie(figures, project_id, versions['do'], task_stats, TASK_STATUS_LABELS)
+        st.plotly_chart(recorder.chart('statut_taches', fig), use_container_width=True)
+    
+    # Évolution temporelle (si des métriques sont disponibles)
+    check_data = current_proj.get('check', {}).get('metrics', {})
+    if check_data:
+        with span('figure_comparaison'):
+            fig = comparison_bar(figures, project_id, versions['check'], check_data)
+        st.plotly_chart(recorder.chart('comparaison', fig), use_container_width=True)
+    
+    # Indicateurs suivis : amélioration moyenne après changement (statistiques mémorisées)
+    project_kpis = get_kpis().list(project_id)
+    if project_kpis:
+        st.subheader("⏱️ Indicateurs Suivis")
+        columns = st.columns(min(len(project_kpis), 4))
+        for i, kpi in enumerate(project_kpis):
+            improvement = get_kpis().statistics(kpi)['improvement_pct']
+            with columns[i % len(columns)]:
+                st.metric(kpi.name, f"{improvement:+.1f}%" if improvement is not None else "—")
+    
+    finish_section(current_proj, before)
+
+# Sélecteur de projet (fragment : changer de projet relance toute l'application)
+@st.fragment
+@timed('selecteur_projet')
+def show_project_picker():
+    st.header("Sélection de Projet")
+    
+    # Créer un nouveau projet
+    if st.button("➕ Nouveau Projet"):
+        project = new_project('Nouveau Projet KVP')
+        st.session_state.projects[project['id']] = project
+        st.session_state.current_project = project['id']
+        st.rerun()
+    
+    # Ajouter un projet d'exemple
+    if st.button("📝 Charger Projet d'Exemple"):
+        sample = create_sample_project()
+        st.session_state.projects[sample['id']] = sample
+        st.session_state.current_project = sample['id']
+        st.rerun()
+    
+    if not st.session_state.projects:
+        return
+    current = st.session_state.current_project
+    if current is None or current not in st.session_state.projects:
+        current = st.session_state.current_project = get_store().first_project_id()
+    recent = st.session_state.recent_projects
+    if st.session_state.get('recent_touched') != current:
+        recent.touch(current)
+        st.session_state.recent_touched = current
+    
+    # Accès rapide : projets épinglés et récents de l'utilisateur (quelques
+    # entrées, quelle que soit la taille du portefeuille)
+    quick = {pid: ('📌 ' if pinned else '') + name for pid, name, _, pinned in recent.entries()}
+    if current not in quick:
+        quick = {current: st.session_state.projects[current]['name'], **quick}
+    options = list(quick)
+    selected_project = st.selectbox("Projet Actif :", options=options, format_func=quick.get,
+                                    index=options.index(current))
+    if selected_project != current:
+        st.session_state.current_project = selected_project
+        # Changement de projet : tout l'écran dépend du projet actif
+        if in_fragment_rerun():
+            st.rerun(scope='app')
+    pinned = recent.is_pinned(current)
+    if st.button("📌 Désépingler" if pinned else "📌 Épingler"):
+        recent.set_pinned(current, not pinned)
+        st.rerun()
+    
+    # Recherche dans tout le portefeuille (résultats limités côté serveur)
+    with st.expander("🔎 Rechercher un projet"):
+        query = st.text_input("Nom (fautes de frappe tolérées) :", key='picker_query')
+        status = st.selectbox("Statut :", [None] + PROJECT_STATUSES, key='picker_status',
+                              format_func=lambda x: 'Tous' if x is None else x)
+        owner = st.text_input("Responsable d'une tâche :", key='picker_owner')
+        if query.strip() or status or owner.strip():
+            found = find_projects(get_store(), query, status=status, owner=owner, limit=PICKER_LIMIT)
+            if not found:
+                st.caption("Aucun projet trouvé.")
+            for pid, name, project_status in found:
+                if st.button(f"{name} · {project_status}", key=f"picker_open_{pid}",
+                             on_click=open_project, args=(pid,)):
+                    st.rerun(scope='app')
+            if len(found) == PICKER_LIMIT:
+                st.caption(f"{PICKER_LIMIT} premiers résultats : précisez la recherche.")
+
+# Actions sur le projet actif (export, suppression)
+@st.fragment
+@timed('actions_projet')
+def show_project_actions(project_id):
+    current_proj = section_project(project_id)
+    st.markdown("---")
+    st.subheader("🔄 Actions")
+    
+    # Le JSON n'est construit qu'au clic, depuis la base : le projet a pu être
+    # modifié par un autre fragment depuis le dernier affichage de la barre latérale
+    store = get_store()
+    st.download_button(
+        label="📥 Exporter le Projet",
+        data=lambda: json.dumps(store.load(project_id), indent=2, ensure_ascii=False, default=str),
+        file_name=f"projet_kvp_{current_proj['name'].replace(' ', '_')}.json",
+        mime="application/json",
+        on_click='ignore'
+    )
+    
+    if st.button("🗑️ Supprimer le Projet",
+                 help="Le projet reste restaurable depuis la corbeille, mais ses indicateurs (définitions et "
+                      "séries), pièces jointes et commentaires sont supprimés définitivement.") \
+            and st.session_state.user_role == 'Administrateur':
+        successor = get_store().first_project_id(exclude=project_id)
+        if successor is not None:
+            del st.session_state.projects[project_id]
+            get_kpis().prune()
+            st.session_state.current_project = successor
+            st.rerun(scope='app')
         else:
-            # Affichage seul
-            check_data = current_proj.get('check', {})
-            if check_data.get('metrics'):
-                metrics = check_data['metrics']
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Avant", metrics.get('temps_attente_avant', 0))
-                with col2:
-                    st.metric("Après", metrics.get('temps_attente_apres', 0))
-                with col3:
-                    st.metric("Amélioration", f"{metrics.get('amelioration_pourcentage', 0):.1f}%")
-            
-            if check_data.get('results'):
-                st.write("**Résultats :**", check_data['results'])
-    
-    with tab4:  # ACT
-        st.markdown('<div class="phase-card act-card"><h3>🎯 Agir - Action</h3></div>', unsafe_allow_html=True)
-        show_pdca_progress('act')
+            st.error("Le dernier projet ne peut pas être supprimé.")
+
+# Historique du projet actif (journal) : dernières modifications, annulation,
+# état du projet à une date donnée
+@st.fragment
+@timed('historique')
+def show_project_history(project_id):
+    journal = get_store().journal
+    if journal is None:
+        return
+    with st.expander("🕘 Historique"):
+        if not st.toggle("Afficher l'historique", key=f"history_{project_id}"):
+            return
+        events = journal.history(project_id, limit=20)
+        if not events:
+            st.caption("Aucune modification enregistrée.")
+        for event in events:
+            label = EVENT_LABELS.get(event['type'], event['type'])
+            if event.get('field') and event['type'] == 'field':
+                label += f" – {FIELD_LABELS.get(event['field'], event['field'])}"
+            undone = " *(annulée)*" if event.get('undone_by') else ""
+            st.caption(f"{event['at'][:16].replace('T', ' ')} · {label}{undone}")
+        if events and st.session_state.user_role in ['Administrateur', 'Éditeur']:
+            count = st.number_input("Modifications à annuler", min_value=1, max_value=20, value=1,
+                                    key=f"undo_count_{project_id}")
+            if st.button("↩️ Annuler", key=f"undo_{project_id}"):
+                undone, skipped = journal.undo(project_id, int(count))
+                if skipped:
+                    st.toast(f"{len(skipped)} modification(s) recouverte(s) depuis, non annulée(s)")
+                if undone:
+                    st.rerun(scope='app')
+        st.markdown("**Projet à une date**")
+        col1, col2 = st.columns(2)
+        with col1:
+            day = st.date_input("Date", value=datetime.now().date(), key=f"asof_day_{project_id}")
+        with col2:
+            moment = st.time_input("Heure", value=datetime.now().time().replace(second=0, microsecond=0),
+                                   key=f"asof_time_{project_id}")
+        project = journal.project_as_of(project_id, datetime.combine(day, moment).isoformat())
+        if project is None:
+            st.caption("Le projet n'existait pas à cette date.")
+        else:
+            st.json(project, expanded=False)
+
+# Corbeille (administrateurs) : projets supprimés, restaurables depuis le journal.
+# Le journal ne garde que le projet lui-même : les indicateurs, pièces jointes et
+# commentaires, supprimés avec lui (cascade), ne reviennent pas à la restauration.
+def show_trash():
+    journal = get_store().journal
+    if journal is None:
+        return
+    with st.expander("🗑️ Corbeille"):
+        deleted = journal.deleted_projects()
+        if not deleted:
+            st.caption("Aucun projet supprimé.")
+        else:
+            st.info("La restauration reprend le contenu du projet (PDCA, tâches, mesures). Ses indicateurs, "
+                    "séries de mesures, pièces jointes et commentaires ont été supprimés avec lui et ne "
+                    "sont pas restaurés.")
+        for event in deleted:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.caption(f"{event['old']['name']} · supprimé le {event['at'][:16].replace('T', ' ')}")
+            with col2:
+                if st.button("Restaurer", key=f"restore_{event['pid']}"):
+                    journal.undo(event['pid'])
+                    st.session_state.current_project = event['pid']
+                    st.rerun()
+
+# Panneau Performance (administrateurs) : percentiles des relances et des sections,
+# widgets par relance, taille des figures ; mesures communes à tout le processus
+def show_performance_panel():
+    with st.expander("⏱️ Performance"):
+        enabled = st.toggle("Mesurer les relances", value=recorder.enabled)
+        if enabled != recorder.enabled:
+            recorder.enabled = enabled
+        if not recorder.enabled:
+            st.caption("Mesures désactivées. Activation au démarrage : KVP_PROFILE=1.")
+            return
+        summary = recorder.summary()
+        if not summary['spans']:
+            st.caption("Aucune mesure pour le moment.")
+            return
+        import pandas as pd
+        tables = (('spans', "Durées (ms)"), ('widgets', "Widgets par relance"), ('payloads', "Figures (octets)"))
+        for kind, title in tables:
+            if summary[kind]:
+                st.caption(title)
+                frame = pd.DataFrame.from_dict(summary[kind], orient='index').sort_values('p95', ascending=False)
+                st.dataframe(frame.round(1), use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Réinitialiser", key='profile_reset'):
+                recorder.reset()
+                st.rerun()
+        with col2:
+            if st.button("Exporter", key='profile_export'):
+                recorder.export()
+        st.caption(f"Journal : {recorder.log_path} · Prometheus : {recorder.metrics_path}")
+
+# Application principale
+@timed('app')
+def main():
+    init_session_state()
+    if st.session_state.current_project is not None:
+        with span('synchronisation_projet'):
+            sync_project(st.session_state.current_project)
+    
+    # En-tête
+    st.markdown(theme.HEADER_HTML, unsafe_allow_html=True)
+    
+    # Barre latérale pour la sélection de projet
+    with st.sidebar, span('barre_laterale'):
+        show_project_picker()
+        
+        # Rôle utilisateur
+        st.selectbox("Rôle Utilisateur :", ['Administrateur', 'Éditeur', 'Lecteur'], 
+                    index=['Administrateur', 'Éditeur', 'Lecteur'].index(st.session_state.user_role),
+                    key='user_role')
         
         if st.session_state.user_role in ['Administrateur', 'Éditeur']:
-            st.subheader("📋 Standardisation & Prochaines Étapes")
-            
-            # Standardisation
-            standardization = st.text_area("Standardisation :", 
-                                         current_proj.get('act', {}).get('standardization', ''),
-                                         help="Comment les améliorations sont-elles ancrées de manière permanente ?")
-            
-            # Leçons apprises
-            lessons = st.text_area("Leçons Apprises :", 
-                                 current_proj.get('act', {}).get('lessons_learned', ''),
-                                 help="Qu'avez-vous appris ? Que feriez-vous différemment ?")
-            
-            # Prochaines étapes
-            next_steps = st.text_area("Prochaines Étapes :", 
-                                    current_proj.get('act', {}).get('next_steps', ''),
-                                    help="Quelles mesures de suivi sont prévues ?")
-            
-            # Sauvegarder
-            if 'act' not in current_proj:
-                current_proj['act'] = {}
-            current_proj['act'].update({
-                'standardization': standardization,
-                'lessons_learned': lessons,
-                'next_steps': next_steps
-            })
-        else:
-            # Affichage seul
-            act_data = current_proj.get('act', {})
-            if act_data.get('standardization'):
-                st.write("**Standardisation :**", act_data['standardization'])
-            if act_data.get('lessons_learned'):
-                st.write("**Leçons Apprises :**", act_data['lessons_learned'])
-            if act_data.get('next_steps'):
-                st.write("**Prochaines Étapes :**", act_data['next_steps'])
-    
-    with tab5:  # DASHBOARD
-        st.header("📈 Tableau de Bord du Projet")
+            show_import_panel()
         
-        # KPIs
-        col1, col2, col3, col4 = st.columns(4)
+        view = st.radio("Vue :", ['Projet', 'Portefeuille', 'Planning', 'Recherche'], horizontal=True, key='view')
+        show_alerts()
         
-        tasks = current_proj.get('do', {}).get('implementation_steps', [])
-        total_tasks = len(tasks)
-        completed_tasks = len([t for t in tasks if t['status'] == 'terminé'])
-        in_progress_tasks = len([t for t in tasks if t['status'] == 'en_cours'])
-        overdue_tasks = len([t for t in tasks if t['status'] != 'terminé' and 
-                           datetime.strptime(t['due_date'], '%Y-%m-%d') < datetime.now()])
+        if st.session_state.user_role == 'Administrateur':
+            show_trash()
+            show_performance_panel()
+    
+    # Contenu principal
+    if st.session_state.projects and view == 'Portefeuille':
+        show_portfolio()
+        return
+    if st.session_state.projects and view == 'Planning':
+        show_timeline()
+        return
+    if st.session_state.projects and view == 'Recherche':
+        show_search()
+        return
+    
+    if not st.session_state.projects:
+        st.info(theme.WELCOME)
         
+        # Information d'intégration
+        with st.expander(theme.TOUR_TITLE):
+            st.markdown(theme.TOUR)
+        return
+    
+    # Afficher le projet actuel
+    current_proj = st.session_state.projects[st.session_state.current_project]
+    
+    # En-tête du projet avec progrès
+    with span('en_tete'):
+        col1, col2, col3 = st.columns([2, 1, 1])
         with col1:
-            st.metric("Total Tâches", total_tasks)
+            st.header(current_proj['name'])
+            if st.session_state.user_role in ['Administrateur', 'Éditeur']:
+                name_key = f"proj_name_{current_proj['id']}"
+                new_name = tracked(current_proj['id'], 'meta', name_key,
+                                   st.text_input("Nom du Projet :", current_proj['name'], key=name_key))
+                if new_name != current_proj['name']:
+                    current_proj['name'] = new_name
+                site_key = f"proj_site_{current_proj['id']}"
+                site = tracked(current_proj['id'], 'meta', site_key,
+                               st.text_input("Site :", current_proj.get('site', ''), key=site_key))
+                if site != current_proj.get('site', ''):
+                    current_proj['site'] = site
+    
         with col2:
-            st.metric("Terminées", completed_tasks, f"{completed_tasks}/{total_tasks}")
-        with col3:
-            st.metric("En Cours", in_progress_tasks)
-        with col4:
-            st.metric("En Retard", overdue_tasks, delta=f"-{overdue_tasks}" if overdue_tasks > 0 else None)
-        
-        # Diagramme de statut des tâches
-        if tasks:
-            status_counts = {}
-            status_labels_fr = {'terminé': 'Terminé', 'en_cours': 'En Cours', 'ouvert': 'Ouvert'}
-            for task in tasks:
-                status = task['status']
-                label = status_labels_fr.get(status, status)
-                status_counts[label] = status_counts.get(label, 0) + 1
-            
-            fig = px.pie(
-                values=list(status_counts.values()),
-                names=list(status_counts.keys()),
-                title="Répartition du Statut des Tâches",
-                color_discrete_map={
-                    'Terminé': '#4CAF50',
-                    'En Cours': '#FFA500',
-                    'Ouvert': '#FF4444'
-                }
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Évolution temporelle (si des métriques sont disponibles)
-        check_data = current_proj.get('check', {}).get('metrics', {})
-        if check_data:
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                x=['Avant', 'Après'],
-                y=[check_data.get('temps_attente_avant', 0), check_data.get('temps_attente_apres', 0)],
-                marker_color=['#FF6B6B', '#4CAF50']
-            ))
-            fig.update_layout(title="Amélioration par Comparaison", yaxis_title="Valeur")
-            st.plotly_chart(fig, use_container_width=True)
+            progress = calculate_progress(current_proj)
+            st.metric("Progrès", f"{progress:.0f}%")
     
-    # Fonctions d'export
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("🔄 Actions")
-    
-    if st.sidebar.button("📥 Exporter le Projet"):
-        project_json = json.dumps(current_proj, indent=2, ensure_ascii=False, default=str)
-        st.sidebar.download_button(
-            label="💾 Télécharger JSON",
-            data=project_json,
-            file_name=f"projet_kvp_{current_proj['name'].replace(' ', '_')}.json",
-            mime="application/json"
-        )
+        with col3:
+            status_options = ['brouillon', 'en_cours', 'terminé', 'en_attente']
+            status_labels = {'brouillon': '📝 Brouillon', 'en_cours': '🔄 En Cours', 
+                            'terminé': '✅ Terminé', 'en_attente': '⏸️ En Attente'}
+            if st.session_state.user_role in ['Administrateur', 'Éditeur']:
+                status_key = f"proj_status_{current_proj['id']}"
+                new_status = tracked(current_proj['id'], 'meta', status_key, st.selectbox(
+                                        "Statut :", status_options, 
+                                        index=status_options.index(current_proj.get('status', 'brouillon')),
+                                        format_func=lambda x: status_labels[x], key=status_key))
+                current_proj['status'] = new_status
     
-    if st.sidebar.button("🗑️ Supprimer le Projet") and st.session_state.user_role == 'Administrateur':
-        if len(st.session_state.projects) > 1:
-            del st.session_state.projects[st.session_state.current_project]
-            st.session_state.current_project = list(st.session_state.projects.keys())[0]
+        # Persister les modifications de l'en-tête (seuls les champs modifiés sont écrits)
+        result = st.session_state.projects.save(current_proj['id'])
+        if result.refreshed:
+            reset_section_widgets(current_proj['id'], result.refreshed)
             st.rerun()
-        else:
-            st.sidebar.error("Le dernier projet ne peut pas être supprimé.")
+        show_conflicts(current_proj['id'])
+    
+    # Onglets pour les phases PDCA (chacun est un fragment réexécuté isolément).
+    # En mode paresseux, un onglet fermé n'exécute rien : ni widgets ni figures.
+    tab_labels = ["📋 Planifier", "🔨 Faire", "📊 Vérifier", "🎯 Agir", "📈 Tableau de Bord"]
+    if LAZY_TABS:
+        tabs = st.tabs(tab_labels, key='pdca_tab', on_change='rerun')
+    else:
+        tabs = st.tabs(tab_labels)
+    sections = [show_plan_tab, show_do_tab, show_check_tab, show_act_tab, show_dashboard_tab]
+    for tab, show_section in zip(tabs, sections):
+        if getattr(tab, 'open', None) is False:
+            continue
+        with tab:
+            show_section(current_proj['id'])
+    
+    # Fonctions d'export
+    with st.sidebar:
+        show_project_actions(current_proj['id'])
+        show_project_history(current_proj['id'])
+        show_sync_status(current_proj['id'])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,156 @@
+# Pièces jointes et commentaires : débit d'envoi et de lecture par blocs
+# (mémoire du processus stable quelle que soit la taille du fichier), envoi
+# en flux par l'API, temps de rendu des miniatures selon le nombre de
+# processus, et latence d'une page de commentaires sur un long fil.
+#
+# Usage :
+#   python benchmarks/attachments.py                      # fichier de 200 Mo, 20 000 commentaires
+#   python benchmarks/attachments.py --size-mb 50 --images 4 --comments 5000
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import api
+from blobstore import CHUNK_SIZE, BlobStore
+from evidence import PREVIEW_PENDING, EvidenceStore
+from generator import PortfolioSpec, populate
+from kvp_core import ProjectService
+from storage import ProjectStore
+
+
+def ms(started):
+    return (time.perf_counter() - started) * 1000
+
+
+# Pic de mémoire résidente du processus (Mo)
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Contenu de `size` octets produit bloc par bloc (jamais entier en mémoire)
+def generated(size, seed=0):
+    block = os.urandom(CHUNK_SIZE)
+    sent = 0
+    while sent < size:
+        chunk = block[:min(CHUNK_SIZE, size - sent)]
+        # Premier octet variable : contenu distinct à chaque envoi (pas de dédoublonnage)
+        yield bytes([seed & 0xFF]) + chunk[1:]
+        sent += len(chunk)
+
+
+def sample_image(seed):
+    from PIL import Image
+    image = Image.effect_noise((3000, 2000), 40 + seed).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=200)
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--pages', type=int, default=50, help="pages parcourues avant la mesure de la dernière")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='kvp_attachments_')
+    store = ProjectStore(os.path.join(directory, 'kvp.db'))
+    populate(store, PortfolioSpec(projects=1, tasks_per_project=5))
+    project_id = store.project_ids()[0]
+    blobs = BlobStore(os.path.join(directory, 'blobs'))
+    evidence = EvidenceStore(store, blobs)
+    size = args.size_mb * 1024 * 1024
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    attachment = evidence.attach(project_id, 'check', generated(size, 1), 'releve.bin', author='mesure')
+    seconds = time.perf_counter() - started
+    print(f"{f'envoi de {args.size_mb} Mo':22} {args.size_mb / seconds:7.0f} Mo/s   pic mémoire +{peak_rss_mb() - baseline:.0f} Mo")
+    started = time.perf_counter()
+    read = sum(len(chunk) for chunk in blobs.iter_chunks(attachment.blob))
+    seconds = time.perf_counter() - started
+    print(f"lecture par blocs      {read / 1024 / 1024 / seconds:7.0f} Mo/s   pic mémoire +{peak_rss_mb() - baseline:.0f} Mo")
+    started = time.perf_counter()
+    evidence.attach(project_id, 'act', generated(size, 1), 'copie.bin', author='mesure')
+    print(f"doublon                {ms(started):7.0f} ms     {blobs.usage()[0]} fichier(s) stocké(s)")
+
+    # Envoi et téléchargement en flux par l'API (fichier sur disque, corps lu par blocs)
+    source = os.path.join(directory, 'source.bin')
+    with open(source, 'wb') as handle:
+        for chunk in generated(size, 2):
+            handle.write(chunk)
+    server = api.start(ProjectService(store, api.API_ORIGIN), port=0, token='', evidence=evidence)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    started = time.perf_counter()
+    with open(source, 'rb') as handle:
+        request = urllib.request.Request(
+            f"{base}/projects/{project_id}/attachments?section=do&name=source.bin", data=handle, method='POST',
+            headers={'Content-Length': str(size), 'Content-Type': 'application/octet-stream'})
+        uploaded = json.loads(urllib.request.urlopen(request).read())
+    seconds = time.perf_counter() - started
+    print(f"API : envoi            {args.size_mb / seconds:7.0f} Mo/s   pic mémoire +{peak_rss_mb() - baseline:.0f} Mo")
+    started = time.perf_counter()
+    with urllib.request.urlopen(f"{base}/attachments/{uploaded['id']}/content") as response:
+        received = sum(len(chunk) for chunk in iter(lambda: response.read(CHUNK_SIZE), b''))
+    seconds = time.perf_counter() - started
+    print(f"API : téléchargement   {received / 1024 / 1024 / seconds:7.0f} Mo/s   pic mémoire +{peak_rss_mb() - baseline:.0f} Mo")
+    server.shutdown()
+    os.remove(source)
+
+    # Miniatures et aperçus : photos de 3000 × 2000, rendues par le pool de processus
+    images = [sample_image(i) for i in range(args.images)]
+    for workers in (int(w) for w in args.workers.split(',')):
+        evidence.workers = workers
+        started = time.perf_counter()
+        added = [evidence.attach(project_id, 'plan', io.BytesIO(data + bytes([workers, i])),
+                                 f"photo_{workers}_{i}.jpg", 'image/jpeg') for i, data in enumerate(images)]
+        upload_ms = ms(started)
+        while any(evidence.get(a.id).preview_status == PREVIEW_PENDING for a in added):
+            time.sleep(0.01)
+        print(f"{f'rendus, {workers} processus':22} {ms(started):7.0f} ms     ({len(added)} image(s), envoi {upload_ms:.0f} ms)")
+        evidence.close()
+
+    # Long fil : une réponse tous les dix commentaires
+    now = '2026-01-01T08:00:00'
+    with store.pool.transaction() as conn:
+        conn.executemany('INSERT INTO comments (project_id, section, task, parent_id, author, body, created_at) '
+                         'VALUES (?,?,?,?,?,?,?)',
+                         ((project_id, 'check', '', None, f"auteur {i % 7}", f"commentaire {i} " * 8, now)
+                          for i in range(args.comments)))
+        parents = [row[0] for row in conn.execute('SELECT id FROM comments WHERE parent_id IS NULL')]
+        conn.executemany('INSERT INTO comments (project_id, section, task, parent_id, author, body, created_at) '
+                         'VALUES (?,?,?,?,?,?,?)',
+                         ((project_id, 'check', '', parent, 'auteur', 'réponse', now)
+                          for parent in parents[::10] for _ in range(8)))
+    started = time.perf_counter()
+    threads, cursor = evidence.comments(project_id, 'check')
+    print(f"première page          {ms(started):7.2f} ms     ({len(threads)} fil(s) sur {args.comments})")
+    for _ in range(args.pages):
+        threads, cursor = evidence.comments(project_id, 'check', before=cursor)
+    started = time.perf_counter()
+    evidence.comments(project_id, 'check', before=cursor)
+    print(f"{f'page {args.pages + 2}':22} {ms(started):7.2f} ms")
+    # Référence : tout le fil chargé à chaque relance (ancienne liste en session)
+    started = time.perf_counter()
+    with store.pool.connection() as conn:
+        everything = conn.execute('SELECT * FROM comments WHERE project_id = ? AND section = ?',
+                                  (project_id, 'check')).fetchall()
+    print(f"{'fil complet (référence)':22} {ms(started):7.2f} ms     ({len(everything)} ligne(s))")
+    evidence.close()
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
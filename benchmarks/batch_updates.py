@@ -0,0 +1,79 @@
+# Lot de nuit : N changements de statut de tâches (intégration MES) appliqués
+# en une transaction par le service métier, sans Streamlit, puis via le point
+# d'entrée HTTP local (sérialisation NDJSON comprise).
+#
+# Usage :
+#   python benchmarks/batch_updates.py                       # 1 000 projets × 100 tâches, 100 000 mises à jour
+#   python benchmarks/batch_updates.py --updates 20000 --no-journal
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import api
+import journal
+from generator import PortfolioSpec, populate
+from kvp_core import ProjectService
+from storage import ProjectStore
+from task_editor import TASK_STATUSES
+
+
+def operations(ids, tasks_per_project, count, seed):
+    rnd = random.Random(seed)
+    return [{'op': 'set_task_status', 'project_id': rnd.choice(ids), 'index': rnd.randrange(tasks_per_project),
+             'status': rnd.choice(TASK_STATUSES)} for _ in range(count)]
+
+
+def report(label, result, elapsed=None):
+    elapsed = elapsed or result['seconds']
+    print(f"  {label:22} {result['applied']:7} appliquée(s), {result['errors']} erreur(s), "
+          f"{result['projects']} projet(s) en {elapsed:5.2f} s ({result['operations'] / elapsed:,.0f} op/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--projects', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100)
+    parser.add_argument('--updates', type=int, default=100000)
+    parser.add_argument('--no-journal', action='store_true')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='kvp_batch_')
+    store = ProjectStore(os.path.join(directory, 'kvp.db'))
+    started = time.perf_counter()
+    populate(store, PortfolioSpec(projects=args.projects, tasks_per_project=args.tasks))
+    print(f"{args.projects} projets × {args.tasks} tâches générés en {time.perf_counter() - started:.1f} s")
+    if not args.no_journal:
+        store.journal = journal.Journal(store, os.path.join(directory, 'journal'))
+    service = ProjectService(store)
+    ids = store.project_ids()
+
+    report('service (direct)', service.apply(operations(ids, args.tasks, args.updates, 1)).to_dict())
+
+    server = api.start(service, '127.0.0.1', 0, token='')
+    body = '\n'.join(json.dumps(op) for op in operations(ids, args.tasks, args.updates, 2)).encode('utf-8')
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/batch", data=body, method='POST',
+                                     headers={'Content-Type': 'application/x-ndjson'})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        result = json.loads(response.read())
+    report('HTTP POST /batch', result, time.perf_counter() - started)
+    server.shutdown()
+
+    if store.journal is not None:
+        started = time.perf_counter()
+        store.journal.close()
+        print(f"  journal synchronisé en {time.perf_counter() - started:.2f} s ({store.journal.seq} événements)")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
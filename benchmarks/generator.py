@@ -0,0 +1,135 @@
+# Générateur de portefeuilles synthétiques (reproductibles à graine égale).
+#
+# Usage :
+#   python benchmarks/generator.py --projects 1000 --tasks 50 > portefeuille.ndjson
+#   python importer.py portefeuille.ndjson
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from importer import PROJECT_STATUSES
+from task_editor import TASK_STATUSES
+
+DEFAULT_STATUS_MIX = {'brouillon': 0.1, 'en_cours': 0.5, 'terminé': 0.3, 'en_attente': 0.1}
+WORDS = (
+    "machine réglage opérateur flux stock attente qualité défaut poste formation outil changement "
+    "série maintenance panne temps cycle lot client fournisseur goulot équilibrage ligne cadence "
+    "rebut retouche inspection standard procédure audit sécurité ergonomie déplacement transport "
+    "inventaire commande livraison planning capacité charge équipe communication indicateur kanban"
+).split()
+SITES = ['Lyon', 'Nantes', 'Lille', 'Toulouse', 'Strasbourg']
+
+
+# Paramètres d'un portefeuille ; `overdue_ratio` : part des tâches non terminées
+# dont l'échéance est dépassée à la date `today`
+class PortfolioSpec:
+    def __init__(self, projects=100, tasks_per_project=20, text_words=40, status_mix=None,
+                 overdue_ratio=0.2, owners=50, seed=42, today=None):
+        self.projects = projects
+        self.tasks_per_project = tasks_per_project
+        self.text_words = text_words
+        self.status_mix = status_mix or DEFAULT_STATUS_MIX
+        self.overdue_ratio = overdue_ratio
+        self.owners = owners
+        self.seed = seed
+        self.today = today or date.today()
+        unknown = set(self.status_mix) - set(PROJECT_STATUSES)
+        if unknown:
+            raise ValueError(f"statuts de projet inconnus : {', '.join(sorted(unknown))}")
+
+
+def _text(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _task(rnd, spec, i):
+    status = rnd.choice(TASK_STATUSES)
+    if status != 'terminé' and rnd.random() < spec.overdue_ratio:
+        due = spec.today - timedelta(days=rnd.randint(1, 90))
+    else:
+        due = spec.today + timedelta(days=rnd.randint(1, 180))
+    return {
+        'task': f"Tâche {i + 1} : {_text(rnd, 4)}",
+        'responsible': f"Responsable {rnd.randrange(spec.owners)}",
+        'due_date': due.isoformat(),
+        'status': status,
+    }
+
+
+# Génère les projets un à un (même forme que l'export JSON)
+def generate(spec):
+    rnd = random.Random(spec.seed)
+    statuses = list(spec.status_mix)
+    weights = [spec.status_mix[s] for s in statuses]
+    for i in range(spec.projects):
+        before = round(rnd.uniform(20, 120), 1)
+        after = round(before * rnd.uniform(0.4, 1.0), 1)
+        yield {
+            'id': f"gen-{spec.seed}-{i}",
+            'name': f"Projet {i + 1} : {_text(rnd, 3)[:-1]}",
+            'description': _text(rnd, spec.text_words // 4),
+            'created_date': (spec.today - timedelta(days=rnd.randint(0, 720))).isoformat(),
+            'status': rnd.choices(statuses, weights)[0],
+            'site': rnd.choice(SITES),
+            'plan': {
+                'problem': _text(rnd, spec.text_words),
+                'goal': _text(rnd, spec.text_words // 2),
+                'root_cause': _text(rnd, spec.text_words),
+                'measures': [_text(rnd, 6) for _ in range(3)],
+            },
+            'do': {'implementation_steps': [_task(rnd, spec, t) for t in range(spec.tasks_per_project)]},
+            'check': {
+                'metrics': {'temps_attente_avant': before, 'temps_attente_apres': after,
+                            'amelioration_pourcentage': round((before - after) / before * 100, 1)},
+                'results': _text(rnd, spec.text_words),
+            },
+            'act': {
+                'standardization': _text(rnd, spec.text_words // 2),
+                'lessons_learned': _text(rnd, spec.text_words),
+                'next_steps': _text(rnd, spec.text_words // 2),
+            },
+        }
+
+
+# Écrit le portefeuille dans la base, par lots
+def populate(store, spec, batch_size=500):
+    batch, count = [], 0
+    for project in generate(spec):
+        batch.append(project)
+        if len(batch) >= batch_size:
+            count += store.save_many(batch)
+            batch = []
+    if batch:
+        count += store.save_many(batch)
+    return count
+
+
+def add_arguments(parser):
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=20, help="tâches par projet")
+    parser.add_argument('--text-words', type=int, default=40)
+    parser.add_argument('--overdue-ratio', type=float, default=0.2)
+    parser.add_argument('--status-mix', default=None,
+                        help="ex. brouillon=0.1,en_cours=0.5,terminé=0.3,en_attente=0.1")
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def spec_from_args(args):
+    mix = None
+    if args.status_mix:
+        mix = {k: float(v) for k, v in (item.split('=') for item in args.status_mix.split(','))}
+    return PortfolioSpec(projects=args.projects, tasks_per_project=args.tasks, text_words=args.text_words,
+                         status_mix=mix, overdue_ratio=args.overdue_ratio, seed=args.seed)
+
+
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser()
+    add_arguments(cli)
+    for generated in generate(spec_from_args(cli.parse_args())):
+        sys.stdout.write(json.dumps(generated, ensure_ascii=False) + '\n')
@@ -0,0 +1,67 @@
+# Indicateur mesuré chaque minute pendant des années : écriture, statistiques
+# avant/après et réduction des points affichés (LTTB, min/max).
+#
+# Usage :
+#   python benchmarks/kpi_downsampling.py                  # 5 000 000 points
+#   python benchmarks/kpi_downsampling.py --points 1000000 --threshold 4000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from charts import build_kpi_series
+from kpi_series import KpiStore, downsample
+from storage import ProjectStore
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=5000000)
+    parser.add_argument('--threshold', type=int, default=2000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='kvp_kpi_')
+    store = ProjectStore(os.path.join(directory, 'kvp.db'))
+    store.save({'id': 'bench', 'name': 'Mesure', 'description': '', 'created_date': '2024-01-01',
+                'status': 'en_cours'})
+    kpis = KpiStore(store, os.path.join(directory, 'kpis'))
+    times = 1704067200 + np.arange(args.points, dtype=np.int64) * 60
+    change_at = int(times[args.points * 2 // 3])
+    rnd = np.random.default_rng(7)
+    values = np.where(times < change_at, 52.0, 45.0) + rnd.normal(0, 3, args.points)
+    values[rnd.integers(0, args.points, 50)] += 40
+    kpi = kpis.create('bench', 'Temps de cycle', 's', change_at=change_at)
+
+    _, append_ms = timed(lambda: kpis.append(kpi.id, times, values))
+    stats, stats_ms = timed(lambda: kpis.statistics(kpis.get(kpi.id)))
+    print(f"{args.points} points ({os.path.getsize(kpis.path(kpi.id)) / 1e6:.0f} Mo) écrits en {append_ms:.0f} ms")
+    print(f"  avant/après : {stats['baseline']['mean']:.2f} → {stats['after']['mean']:.2f} "
+          f"({stats['improvement_pct']:+.1f} %) en {stats_ms:.0f} ms")
+
+    series = kpis.series(kpi.id)
+    for method in ('lttb', 'minmax'):
+        (shown_times, shown_values), ms = timed(lambda: downsample(*series, args.threshold, method))
+        payload = len(build_kpi_series(kpi.name, kpi.unit, shown_times, shown_values, change_at, stats).to_json())
+        print(f"  {method:6} : {len(shown_values):5} points en {ms:6.1f} ms, figure {payload / 1e3:7.1f} Ko, "
+              f"pic conservé : {shown_values.max() >= series[1].max()}")
+    # Ordre de grandeur de la figure complète (extrapolé depuis 100 000 points)
+    sample = 100000
+    full = len(build_kpi_series(kpi.name, kpi.unit, series[0][:sample], series[1][:sample]).to_json())
+    print(f"  sans réduction : ~{full * args.points / sample / 1e6:.0f} Mo de figure à envoyer au navigateur")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
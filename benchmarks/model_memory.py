@@ -0,0 +1,101 @@
+# Mémoire par tâche : dictionnaires JSON vs modèle typé (model.py).
+#
+# Les tâches sont décodées ligne à ligne depuis du JSON, comme à l'import ou au
+# chargement d'un export : chaque tâche porte ses propres chaînes (statut,
+# responsable, date). On compare la mémoire retenue (tracemalloc) et le temps
+# d'un comptage des tâches en retard.
+#
+# Usage :
+#   python benchmarks/model_memory.py                # 1 000 000 tâches
+#   python benchmarks/model_memory.py --tasks 200000
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from model import Task, TaskTable
+
+STATUSES = ['ouvert', 'en_cours', 'terminé']
+OWNERS = [f"Responsable {i}" for i in range(500)]
+
+
+def make_lines(count, seed=7):
+    rnd = random.Random(seed)
+    start = date(2024, 1, 1).toordinal()
+    for i in range(count):
+        task = {
+            'task': f"Tâche {i}",
+            'responsible': rnd.choice(OWNERS),
+            'due_date': date.fromordinal(start + rnd.randrange(730)).isoformat(),
+            'status': rnd.choice(STATUSES),
+        }
+        if i % 2:
+            task['priority'] = 'moyen'
+        yield json.dumps(task, ensure_ascii=False)
+
+
+def retained(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+# Comptage « à la dictionnaire » : la date est réanalysée à chaque passage
+def overdue_dicts(tasks, today):
+    return sum(1 for t in tasks
+               if t['status'] != 'terminé' and datetime.strptime(t['due_date'], '%Y-%m-%d').date() <= today)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=1000000)
+    args = parser.parse_args()
+    lines = list(make_lines(args.tasks))
+    today = date(2025, 1, 1)
+
+    tasks, dict_bytes = retained(lambda: [json.loads(line) for line in lines])
+    dict_overdue, dict_seconds = timed(lambda: overdue_dicts(tasks, today))
+    sample = tasks[:10000]
+    del tasks
+
+    # Chaque modèle est construit depuis le JSON : seules ses propres données sont retenues
+    table, table_bytes = retained(lambda: TaskTable.from_dicts(json.loads(line) for line in lines))
+    table_overdue, table_seconds = timed(lambda: table.overdue_count(today))
+    assert table_overdue == dict_overdue
+    assert table.to_dicts()[:10000] == sample, "aller-retour JSON avec perte"
+    del table
+
+    objects, object_bytes = retained(lambda: [Task.from_dict(json.loads(line)) for line in lines])
+    del objects
+    gc.collect()
+
+    n = args.tasks
+    print(f"{n} tâches")
+    print(f"  dictionnaires JSON : {dict_bytes / 1e6:8.1f} Mo  ({dict_bytes / n:6.1f} o/tâche)  "
+          f"retard : {dict_seconds * 1000:7.1f} ms")
+    print(f"  objets Task        : {object_bytes / 1e6:8.1f} Mo  ({object_bytes / n:6.1f} o/tâche)")
+    print(f"  TaskTable          : {table_bytes / 1e6:8.1f} Mo  ({table_bytes / n:6.1f} o/tâche)  "
+          f"retard : {table_seconds * 1000:7.1f} ms")
+    print(f"  gain mémoire (TaskTable) : x{dict_bytes / table_bytes:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Latence de relance après modification d'un champ du plan.
+#
+# « Relance complète » : AppTest.run() après saisie dans « Quel est le problème ? »
+# (c'est ce que fait l'application sans fragments). « Relance du fragment » :
+# durée d'exécution du seul fragment de l'onglet Planifier, mesurée en
+# enveloppant st.fragment avant l'exécution du script.
+#
+# Usage :
+#   python benchmarks/rerun_latency.py                       # app.py courant
+#   git show <commit>:app.py > /tmp/app_avant.py
+#   python benchmarks/rerun_latency.py --app /tmp/app_avant.py --tasks 1500
+import argparse
+import functools
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+FRAGMENT_TIMINGS = {}
+
+
+# Enveloppe st.fragment pour chronométrer chaque appel de fragment
+def _timed_fragment(original):
+    def fragment(func=None, **kwargs):
+        if func is None:
+            return lambda f: fragment(f, **kwargs)
+
+        @functools.wraps(func)
+        def timed(*args, **kw):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kw)
+            finally:
+                FRAGMENT_TIMINGS.setdefault(func.__name__, []).append(time.perf_counter() - started)
+        return original(timed, **kwargs)
+    return fragment
+
+
+def make_project(task_count):
+    return {
+        'id': str(uuid.uuid4()),
+        'name': 'Projet de mesure',
+        'description': '',
+        'created_date': '2024-01-01',
+        'status': 'en_cours',
+        'plan': {'problem': 'Problème initial', 'goal': 'Objectif', 'root_cause': 'Cause', 'measures': ['M1']},
+        'do': {'implementation_steps': [
+            {'task': f'Tâche {i}', 'responsible': f'Responsable {i % 25}',
+             'due_date': f'2024-{1 + i % 12:02d}-{1 + i % 28:02d}',
+             'status': ('ouvert', 'en_cours', 'terminé')[i % 3]}
+            for i in range(task_count)]},
+        'check': {'metrics': {'temps_attente_avant': 45, 'temps_attente_apres': 32,
+                              'amelioration_pourcentage': 28.9}, 'results': 'Résultats'},
+        'act': {'standardization': 'Standard', 'lessons_learned': 'Leçons', 'next_steps': 'Suite'},
+    }
+
+
+def measure(app_path, task_count, repeats):
+    project = make_project(task_count)
+    at = AppTest.from_file(app_path, default_timeout=120)
+    at.session_state['projects'] = {project['id']: project}
+    at.session_state['current_project'] = project['id']
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception)
+    full = []
+    FRAGMENT_TIMINGS.clear()
+    for i in range(repeats):
+        area = next(a for a in at.text_area if a.label == "Quel est le problème ?")
+        started = time.perf_counter()
+        area.input(f"Problème modifié {i}").run()
+        full.append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(at.exception)
+    return full, FRAGMENT_TIMINGS.get('show_plan_tab', [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--app', default=os.path.join(ROOT, 'app.py'))
+    parser.add_argument('--tasks', type=int, default=1500)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('KVP_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='kvp_bench_'), 'kvp.db'))
+    st.fragment = _timed_fragment(st.fragment)
+
+    full, plan_fragment = measure(args.app, args.tasks, args.repeats)
+    print(f"{args.app} — {args.tasks} tâches, {args.repeats} modifications du plan")
+    print(f"  relance complète   : médiane {statistics.median(full) * 1000:.0f} ms")
+    if plan_fragment:
+        print(f"  relance du fragment: médiane {statistics.median(plan_fragment) * 1000:.0f} ms (onglet Planifier seul)")
+    else:
+        print("  relance du fragment: — (aucun fragment dans cette version)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Agrégats d'arrière-plan du portefeuille : recalcul complet (selon le nombre
+# de fils), recalcul incrémental après quelques modifications, et coût de
+# lecture côté relance comparé au balayage pandas de la vue Portefeuille.
+#
+# Usage :
+#   python benchmarks/rollups.py                          # 1 000 projets × 100 tâches
+#   python benchmarks/rollups.py --projects 5000 --edits 500
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generator import add_arguments, populate, spec_from_args
+from kvp_core import ProjectService
+from rollups import RollupWorker
+from storage import ProjectStore
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.set_defaults(projects=1000, tasks=100)
+    parser.add_argument('--edits', type=int, default=100, help="projets modifiés avant le recalcul incrémental")
+    parser.add_argument('--workers', default='1,2,4')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='kvp_rollups_')
+    store = ProjectStore(os.path.join(directory, 'kvp.db'), pool_size=6)
+    started = time.perf_counter()
+    populate(store, spec_from_args(args))
+    print(f"{args.projects} projets × {args.tasks} tâches générés en {time.perf_counter() - started:.1f} s")
+
+    for workers in (int(w) for w in args.workers.split(',')):
+        worker = RollupWorker(store, outbox=os.path.join(directory, 'outbox'), workers=workers)
+        started = time.perf_counter()
+        worker.refresh()
+        snapshot = worker.snapshot
+        print(f"  recalcul complet, {workers} fil(s)   {(time.perf_counter() - started) * 1000:7.0f} ms   "
+              f"({snapshot['overdue']} tâches en retard, {len(snapshot['stalled'])} projet(s) bloqué(s))")
+        worker.close()
+
+    worker = RollupWorker(store, outbox=os.path.join(directory, 'outbox'))
+    worker.refresh()
+    rnd = random.Random(args.seed)
+    ids = store.project_ids()
+    ProjectService(store).apply([{'op': 'set_task_status', 'project_id': pid, 'index': 0, 'status': 'terminé'}
+                                 for pid in rnd.sample(ids, min(args.edits, len(ids)))])
+    started = time.perf_counter()
+    recomputed = worker.refresh()
+    print(f"  recalcul incrémental           {(time.perf_counter() - started) * 1000:7.0f} ms   "
+          f"({recomputed} projet(s) modifié(s))")
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        snapshot = worker.snapshot
+        overdue, stalled = snapshot['overdue'], len(snapshot['stalled'])
+    print(f"  lecture par relance            {(time.perf_counter() - started) * 1000:7.3f} µs")
+
+    from portfolio import PortfolioFrames, overdue_by_owner
+    started = time.perf_counter()
+    frames = PortfolioFrames(store)
+    frames.refresh()
+    int(overdue_by_owner(frames).sum())
+    print(f"  balayage pandas (comparaison)  {(time.perf_counter() - started) * 1000:7.0f} ms   (chargement + retards)")
+
+    started = time.perf_counter()
+    path = worker.digest(force=True)
+    print(f"  résumé déposé en {(time.perf_counter() - started) * 1000:.0f} ms : {path}")
+    worker.close()
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
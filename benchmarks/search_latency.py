@@ -0,0 +1,92 @@
+# Latence de la recherche plein texte sur un portefeuille généré.
+#
+# Les textes (leçons apprises, causes, résultats) suivent une loi de Zipf sur
+# un vocabulaire d'atelier : quelques mots très fréquents, beaucoup de mots rares.
+#
+# Usage :
+#   python benchmarks/search_latency.py                    # 50 000 projets
+#   python benchmarks/search_latency.py --projects 10000 --budget-ms 50
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search import search
+from storage import ProjectStore
+
+VOCABULARY = (
+    "machine réglage opérateur flux stock attente qualité défaut poste formation outil changement "
+    "série maintenance panne temps cycle lot client fournisseur goulot équilibrage ligne cadence "
+    "rebut retouche inspection standard procédure audit sécurité ergonomie déplacement transport "
+    "inventaire commande livraison planning capacité charge équipe communication tableau indicateur "
+    "kanban smed poka-yoke 5s andon visuel amélioration gaspillage surproduction mouvement traitement"
+).split()
+QUERIES = ["goulot", "goulots", "équilibré", "machine réglage", "qualité", "kanban livraison", "smed"]
+
+
+def make_text(rnd, words):
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    return ' '.join(rnd.choices(VOCABULARY, weights=weights, k=words))
+
+
+def make_projects(count, seed=42):
+    rnd = random.Random(seed)
+    for i in range(count):
+        yield {
+            'id': f'bench-{i}', 'name': f'Projet {i}', 'description': '',
+            'created_date': '2024-01-01', 'status': 'terminé',
+            'plan': {'root_cause': make_text(rnd, 25)},
+            'check': {'results': make_text(rnd, 20)},
+            'act': {'lessons_learned': make_text(rnd, 35)},
+        }
+
+
+def measure(store, repeats):
+    timings = {}
+    for query in QUERIES:
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            search(store, query)
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[query] = sorted(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--projects', type=int, default=50000)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='kvp_search_'), 'bench.db')
+    store = ProjectStore(path)
+    started = time.perf_counter()
+    batch = []
+    for project in make_projects(args.projects):
+        batch.append(project)
+        if len(batch) == 1000:
+            store.save_many(batch)
+            batch = []
+    if batch:
+        store.save_many(batch)
+    print(f"{args.projects} projets indexés en {time.perf_counter() - started:.1f} s")
+
+    over_budget = False
+    for query, samples in measure(store, args.repeats).items():
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        over_budget |= p95 > args.budget_ms
+        print(f"  {query!r:22} médiane {statistics.median(samples):6.1f} ms   p95 {p95:6.1f} ms")
+    store.close()
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Démarrage à froid : temps d'import des modules de l'application puis du
+# premier affichage (AppTest, sans navigateur), chacun mesuré dans un
+# interpréteur neuf, comme après un déploiement. Deux écrans : l'accueil
+# (base vide) et un projet ouvert sur l'onglet Planifier.
+#
+# Échoue (code 1) si la médiane dépasse un budget, ou si un module lourd
+# (pandas, numpy, plotly.express, pyarrow) est chargé par ces écrans.
+#
+# Usage :
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --runs 7 --import-budget-ms 300 --render-budget-ms 800
+import argparse
+import ast
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, 'app.py')
+HEAVY_MODULES = ('pandas', 'numpy', 'plotly.express', 'pyarrow')
+SCENARIOS = ('accueil', 'projet')
+
+
+# Modules importés au niveau du module par app.py (hors streamlit, mesuré à part)
+def app_imports(path=APP):
+    with open(path, encoding='utf-8') as handle:
+        tree = ast.parse(handle.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.append(node.module)
+    return [name for name in dict.fromkeys(names) if name.split('.')[0] != 'streamlit']
+
+
+# Exécuté dans un interpréteur neuf : une mesure, écrite en JSON sur la sortie
+def child(scenario, db_path):
+    os.environ['KVP_DB_PATH'] = db_path
+    os.environ.setdefault('STREAMLIT_LOGGER_LEVEL', 'error')
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    streamlit_done = time.perf_counter()
+    for name in app_imports():
+        importlib.import_module(name)
+    imports_done = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=120)
+    if scenario == 'projet':
+        at.session_state['pdca_tab'] = "📋 Planifier"
+    at.run()
+    rendered = time.perf_counter()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    print(json.dumps({
+        'streamlit_ms': (streamlit_done - started) * 1000,
+        'import_ms': (imports_done - streamlit_done) * 1000,
+        'render_ms': (rendered - imports_done) * 1000,
+        'heavy': [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def prepare(scenario, directory):
+    db_path = os.path.join(directory, f"{scenario}.db")
+    if scenario == 'projet':
+        sys.path.insert(0, ROOT)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from generator import PortfolioSpec, populate
+        from storage import ProjectStore
+        store = ProjectStore(db_path)
+        populate(store, PortfolioSpec(projects=20, tasks_per_project=10))
+        store.close()
+    return db_path
+
+
+def measure(scenario, db_path, runs):
+    samples = []
+    env = dict(os.environ, KVP_JOURNAL_DIR=os.path.join(os.path.dirname(db_path), f"journal_{scenario}"))
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', scenario, db_path],
+                                capture_output=True, text=True, env=env, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    result = {key: statistics.median(s[key] for s in samples) for key in ('streamlit_ms', 'import_ms', 'render_ms')}
+    result['heavy'] = sorted({name for s in samples for name in s['heavy']})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=250.0,
+                        help="import des modules de l'application (hors streamlit)")
+    parser.add_argument('--render-budget-ms', type=float, default=1000.0,
+                        help="premier affichage, modules déjà importés")
+    parser.add_argument('--allow-heavy', action='store_true', help="ne pas échouer sur les modules lourds")
+    parser.add_argument('--child', nargs=2, metavar=('SCENARIO', 'DB'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    directory = tempfile.mkdtemp(prefix='kvp_startup_')
+    failures = []
+    for scenario in SCENARIOS:
+        result = measure(scenario, prepare(scenario, directory), args.runs)
+        print(f"{scenario:8} streamlit {result['streamlit_ms']:6.0f} ms   application {result['import_ms']:6.0f} ms   "
+              f"premier affichage {result['render_ms']:6.0f} ms   modules lourds : {', '.join(result['heavy']) or '—'}")
+        if result['import_ms'] > args.import_budget_ms:
+            failures.append(f"{scenario} : import {result['import_ms']:.0f} ms > {args.import_budget_ms:.0f} ms")
+        if result['render_ms'] > args.render_budget_ms:
+            failures.append(f"{scenario} : affichage {result['render_ms']:.0f} ms > {args.render_budget_ms:.0f} ms")
+        if result['heavy'] and not args.allow_heavy:
+            failures.append(f"{scenario} : modules lourds chargés ({', '.join(result['heavy'])})")
+    for failure in failures:
+        print(f"BUDGET DÉPASSÉ {failure}")
+    if failures:
+        sys.exit(1)
+    print("Démarrage dans le budget.")
+
+
+if __name__ == '__main__':
+    main()
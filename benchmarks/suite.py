@@ -0,0 +1,284 @@
+# Suite de mesure des relances, sans navigateur (AppTest), sur un portefeuille généré.
+#
+# Chaque interaction (premier affichage, recherche et changement de projet,
+# modification du plan, statut d'une tâche, tableau de bord, export du portefeuille) est
+# rejouée --repeats fois : temps de relance (médiane, p95), puis --memory-repeats
+# fois sous tracemalloc (passes séparées : le traçage ralentit la relance) : pic
+# des allocations de la relance, et écart avec une relance à vide (« relance »),
+# qui isole le coût propre de l'interaction de celui du banc (AppTest).
+# Les résultats sont écrits en JSON ; avec --baseline, toute interaction plus
+# lente ou plus gourmande que la référence au-delà de --threshold fait échouer la suite.
+#
+# Usage :
+#   python benchmarks/suite.py --projects 1000 --tasks 30 --output reference.json
+#   python benchmarks/suite.py --projects 1000 --tasks 30 --baseline reference.json --threshold 0.2
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Les avertissements de Streamlit (mode sans navigateur) masqueraient le rapport
+os.environ.setdefault('STREAMLIT_LOGGER_LEVEL', 'error')
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from generator import add_arguments, populate, spec_from_args
+from task_editor import TASK_STATUSES
+
+PLAN_TAB = "📋 Planifier"
+DO_TAB = "🔨 Faire"
+DASHBOARD_TAB = "📈 Tableau de Bord"
+
+
+# Une interaction : `prepare` met l'application dans l'état voulu (non mesuré),
+# `act` renvoie l'élément dont la relance est mesurée
+class Interaction:
+    def __init__(self, name, act, prepare=None, fresh=False):
+        self.name = name
+        self.act = act
+        self.prepare = prepare
+        # Nouvelle session à chaque exécution (premier affichage)
+        self.fresh = fresh
+
+
+def _check(at):
+    if at.exception:
+        raise RuntimeError(f"exception dans l'application : {at.exception[0].message}")
+    return at
+
+
+def _show_tab(at, label):
+    at.session_state['pdca_tab'] = label
+    return at
+
+
+def _target(ctx, i):
+    return ctx['projects'][(i + 1) % len(ctx['projects'])]
+
+
+def _search(at, ctx, i):
+    return at.text_input(key='picker_query').input(_target(ctx, i)[1])
+
+
+def _open_searched(at, ctx, i):
+    return at.button(key=f"picker_open_{_target(ctx, i)[0]}").click()
+
+
+def _edit_plan(at, ctx, i):
+    pid = at.session_state['current_project']
+    _show_tab(at, PLAN_TAB)
+    return at.text_area(key=f"plan_problem_{pid}").input(f"Problème modifié {i}")
+
+
+def _list_mode(at, ctx, i):
+    pid = at.session_state['current_project']
+    _show_tab(at, DO_TAB)
+    _check(at.run())
+    grid = at.toggle(key=f"grid_mode_{pid}")
+    if grid.value:
+        _show_tab(at, DO_TAB)
+        _check(grid.set_value(False).run())
+
+
+def _task_status(at, ctx, i):
+    pid = at.session_state['current_project']
+    _show_tab(at, DO_TAB)
+    # Clé de la première ligne : status_<projet>_<génération de la liste>_0
+    box = next(b for b in at.selectbox if b.key and b.key.startswith(f"status_{pid}_") and b.key.endswith('_0'))
+    return box.set_value(next(s for s in TASK_STATUSES if s != box.value))
+
+
+def _leave_dashboard(at, ctx, i):
+    _check(_show_tab(at, PLAN_TAB).run())
+
+
+def _open_dashboard(at, ctx, i):
+    return _show_tab(at, DASHBOARD_TAB)
+
+
+def _portfolio_view(at, ctx, i):
+    if at.radio(key='view').value != 'Portefeuille':
+        _check(at.radio(key='view').set_value('Portefeuille').run())
+
+
+def _export_portfolio(at, ctx, i):
+    return next(b for b in at.button if b.label == "Préparer l'Archive").click()
+
+
+def _back_to_project(at):
+    _check(at.radio(key='view').set_value('Projet').run())
+
+
+INTERACTIONS = [
+    Interaction('premier_affichage', lambda at, ctx, i: at, fresh=True),
+    Interaction('relance', lambda at, ctx, i: at),
+    Interaction('rechercher_projet', _search),
+    Interaction('changer_projet', _open_searched, prepare=lambda at, ctx, i: _check(_search(at, ctx, i).run())),
+    Interaction('modifier_plan', _edit_plan),
+    Interaction('statut_tache', _task_status, prepare=_list_mode),
+    Interaction('ouvrir_tableau_de_bord', _open_dashboard, prepare=_leave_dashboard),
+    Interaction('exporter_portefeuille', _export_portfolio, prepare=_portfolio_view),
+]
+
+
+def _new_session(app_path):
+    return AppTest.from_file(app_path, default_timeout=300)
+
+
+# Durée de la relance (s) ; avec `trace`, pic des allocations faites pendant la relance (octets)
+def _run(at, interaction, ctx, i, trace=False):
+    if interaction.prepare:
+        interaction.prepare(at, ctx, i)
+    target = interaction.act(at, ctx, i)
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        target.run()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+    _check(at)
+    return elapsed, peak
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def measure(app_path, ctx, repeats, warmup=1, memory_repeats=3):
+    results = {}
+    at = _check(_new_session(app_path).run())
+    for interaction in INTERACTIONS:
+        samples, peaks = [], []
+        for i in range(warmup + repeats + memory_repeats):
+            session = _new_session(app_path) if interaction.fresh else at
+            traced = i >= warmup + repeats
+            elapsed, peak = _run(session, interaction, ctx, i, trace=traced)
+            if traced:
+                peaks.append(peak / 1024)
+            elif i >= warmup:
+                samples.append(elapsed * 1000)
+        if interaction.name == 'exporter_portefeuille':
+            _back_to_project(at)
+        result = results[interaction.name] = {
+            'wall_ms': {'median': statistics.median(samples), 'p95': _percentile(samples, 0.95),
+                        'min': min(samples), 'samples': [round(s, 2) for s in samples]},
+        }
+        if peaks:
+            result['peak_kib'] = {'median': statistics.median(peaks), 'max': max(peaks),
+                                  'samples': [round(p, 1) for p in peaks]}
+        idle = results.get('relance', {}).get('peak_kib')
+        if idle and 'peak_kib' in result:
+            result['peak_kib']['over_idle'] = result['peak_kib']['median'] - idle['median']
+        memory = ''
+        if 'peak_kib' in result:
+            memory = f"   pic {result['peak_kib']['median']:9.0f} Kio"
+            if 'over_idle' in result['peak_kib'] and interaction.name != 'relance':
+                memory += f" ({result['peak_kib']['over_idle']:+.0f} vs relance à vide)"
+        print(f"  {interaction.name:24} médiane {result['wall_ms']['median']:8.1f} ms   "
+              f"p95 {result['wall_ms']['p95']:8.1f} ms{memory}")
+    return results
+
+
+# Interactions en régression : (nom, mesure, référence, actuel)
+def regressions(current, baseline, threshold, min_delta_ms, min_delta_kib=256):
+    found = []
+    for name, reference in baseline['interactions'].items():
+        measured = current['interactions'].get(name)
+        if measured is None:
+            continue
+        before, after = reference['wall_ms']['median'], measured['wall_ms']['median']
+        if after > before * (1 + threshold) and after - before > min_delta_ms:
+            found.append((name, 'temps (ms)', before, after))
+        if 'peak_kib' in reference and 'peak_kib' in measured:
+            before, after = reference['peak_kib']['median'], measured['peak_kib']['median']
+            if after > before * (1 + threshold) and after - before > min_delta_kib:
+                found.append((name, 'pic mémoire (Kio)', before, after))
+    return found
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument('--app', default=os.path.join(ROOT, 'app.py'))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--memory-repeats', type=int, default=3,
+                        help="relances supplémentaires sous tracemalloc (0 : pas de mesure mémoire)")
+    parser.add_argument('--output', default=None, help="fichier JSON des résultats")
+    parser.add_argument('--baseline', default=None, help="résultats de référence (JSON)")
+    parser.add_argument('--threshold', type=float, default=0.2, help="régression tolérée (0.2 = +20 %%)")
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                        help="écart minimal pour signaler une régression de temps")
+    parser.add_argument('--min-delta-kib', type=float, default=256,
+                        help="écart minimal pour signaler une régression de mémoire")
+    args = parser.parse_args()
+    spec = spec_from_args(args)
+
+    os.environ['KVP_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='kvp_suite_'), 'kvp.db')
+    from storage import ProjectStore
+    store = ProjectStore(os.environ['KVP_DB_PATH'])
+    started = time.perf_counter()
+    populate(store, spec)
+    with store.pool.connection() as conn:
+        projects = [tuple(r) for r in conn.execute('SELECT id, name FROM projects ORDER BY rowid LIMIT 2')]
+    store.close()
+    print(f"{spec.projects} projets × {spec.tasks_per_project} tâches générés en "
+          f"{time.perf_counter() - started:.1f} s")
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'streamlit': st.__version__,
+        'app': os.path.relpath(args.app, ROOT),
+        'spec': {'projects': spec.projects, 'tasks_per_project': spec.tasks_per_project,
+                 'text_words': spec.text_words, 'status_mix': spec.status_mix,
+                 'overdue_ratio': spec.overdue_ratio, 'seed': spec.seed},
+        'repeats': args.repeats,
+        'memory_repeats': args.memory_repeats,
+        'interactions': measure(args.app, {'projects': projects}, args.repeats, args.warmup, args.memory_repeats),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2, ensure_ascii=False)
+        print(f"Résultats écrits dans {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        if baseline.get('spec') != results['spec']:
+            print("Attention : la référence a été mesurée sur un autre portefeuille.")
+        found = regressions(results, baseline, args.threshold, args.min_delta_ms, args.min_delta_kib)
+        for name, metric, before, after in found:
+            print(f"RÉGRESSION {name} — {metric} : {before:.1f} → {after:.1f} (+{(after / before - 1) * 100:.0f} %)")
+        if found:
+            sys.exit(1)
+        print(f"Aucune régression au-delà de {args.threshold * 100:.0f} %.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Planning multi-projets : taille de la figure d'ensemble agrégée comparée à
+# une barre Plotly par tâche, construction de l'index, agrégation à froid puis
+# lors d'un déplacement de la fenêtre (tuiles mémorisées).
+#
+# Usage :
+#   python benchmarks/timeline.py                         # 1 000 projets × 100 tâches
+#   python benchmarks/timeline.py --projects 300 --tasks 50 --pans 40
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from charts import build_timeline_bars, build_timeline_heatmap
+from generator import add_arguments, populate, spec_from_args
+from storage import ProjectStore
+from timeline import Timeline
+
+
+def ms(started):
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.set_defaults(projects=1000, tasks=100)
+    parser.add_argument('--pans', type=int, default=20, help="déplacements d'un quart de fenêtre")
+    parser.add_argument('--window-days', type=int, default=90)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='kvp_timeline_')
+    store = ProjectStore(os.path.join(directory, 'kvp.db'))
+    populate(store, spec_from_args(args))
+    timeline = Timeline(store)
+    started = time.perf_counter()
+    index = timeline.refresh()
+    print(f"index : {len(index)} tâche(s) datée(s) en {ms(started):.0f} ms")
+
+    lo, hi = index.extent
+    for group_by in ('responsible', 'project'):
+        started = time.perf_counter()
+        view = timeline.view(group_by, lo, hi)
+        aggregate_ms = ms(started)
+        size = len(build_timeline_heatmap(view, group_by).to_json())
+        print(f"  ensemble par {group_by:11}  niveau {view['level']:8} {aggregate_ms:6.1f} ms   "
+              f"figure {size / 1024:8.0f} Ko ({len(view['groups'])} groupes × {len(view['bins'])} intervalles)")
+
+    # Référence : une barre par tâche (ce qu'enverrait un Gantt non agrégé)
+    sample = min(len(index), 5000)
+    tasks = [{'task': index.titles[i], 'project': index.projects[index.project[i]],
+              'group': index.owners[index.owner[i]], 'start': date.fromordinal(int(index.start[i])).isoformat(),
+              'end': date.fromordinal(int(index.end[i]) + 1).isoformat(),
+              'due': date.fromordinal(int(index.end[i])).isoformat(), 'done': bool(index.done[i]), 'late': False}
+             for i in range(sample)]
+    started = time.perf_counter()
+    size = len(build_timeline_bars({'tasks': tasks}, 'Responsable').to_json())
+    print(f"  une barre par tâche            {sample} barres : {size / 1024:.0f} Ko en {ms(started):.0f} ms "
+          f"(≈ {size / sample * len(index) / 1024 / 1024:.1f} Mo pour {len(index)} tâches)")
+
+    center = date.today().toordinal()
+    start, width = center - args.window_days // 2, args.window_days
+    step = max(width // 4, 1)
+    for label in ('à froid', 'aller-retour'):
+        timeline.hits = timeline.misses = 0
+        samples = []
+        for i in list(range(args.pans)) + list(range(args.pans, -1, -1)) if label == 'aller-retour' else range(args.pans):
+            started = time.perf_counter()
+            view = timeline.view('responsible', start + i * step, start + i * step + width, level='jour')
+            samples.append(ms(started))
+        samples.sort()
+        print(f"  déplacement {label:12} niveau {view['level']:8} médiane {samples[len(samples) // 2]:5.2f} ms, "
+              f"max {samples[-1]:5.2f} ms   (tuiles : {timeline.hits} réutilisée(s), {timeline.misses} calculée(s))")
+    print(f"  fenêtre de {args.window_days} jours à partir du {date.fromordinal(start)}, pas de "
+          f"{timedelta(days=step).days} jours")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from storage import DEFAULT_DB_PATH
+
+# Fichiers adressés par leur contenu : le nom est l'empreinte SHA-256
+# (<dossier>/ab/cdef…), un contenu identique n'est stocké qu'une fois. Écriture
+# et lecture par blocs : la taille d'un fichier n'influe pas sur la mémoire.
+BLOB_DIR = os.environ.get('KVP_BLOB_DIR', os.path.join(os.path.dirname(os.path.abspath(DEFAULT_DB_PATH)), 'kvp_blobs'))
+CHUNK_SIZE = 1024 * 1024
+MAX_BLOB_BYTES = int(os.environ.get('KVP_MAX_BLOB_MB', '200')) * 1024 * 1024
+# Rendus produits par render_previews : (nom, côté maximal en pixels)
+PREVIEW_SIZES = (('thumbnail', 160), ('preview', 1280))
+
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+
+class BlobTooLarge(ValueError):
+    pass
+
+
+# Blocs d'une source : objet fichier (read) ou itérable d'octets
+def _chunks(source, chunk_size=CHUNK_SIZE):
+    if hasattr(source, 'read'):
+        return iter(lambda: source.read(chunk_size), b'')
+    return iter(source)
+
+
+class BlobStore:
+    def __init__(self, directory=BLOB_DIR):
+        self.directory = directory
+        self.tmp_dir = os.path.join(directory, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, digest):
+        if not _DIGEST.match(digest or ''):
+            raise KeyError(digest)
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def size(self, digest):
+        return os.path.getsize(self.path(digest))
+
+    # Enregistre un contenu reçu par blocs ; renvoie (empreinte, taille)
+    def put(self, source, limit=MAX_BLOB_BYTES):
+        tmp_path, digest, size = self.stage(source, limit)
+        return self.adopt(tmp_path, digest), size
+
+    # Écrit le contenu dans un fichier temporaire ; renvoie (chemin, empreinte,
+    # taille). Le fichier est ensuite adopté (adopt) ou abandonné (discard).
+    def stage(self, source, limit=MAX_BLOB_BYTES):
+        sha = hashlib.sha256()
+        size = 0
+        handle = tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False)
+        try:
+            with handle:
+                for chunk in _chunks(source):
+                    size += len(chunk)
+                    if limit and size > limit:
+                        raise BlobTooLarge(f"fichier trop volumineux (> {limit // (1024 * 1024)} Mo)")
+                    sha.update(chunk)
+                    handle.write(chunk)
+            return handle.name, sha.hexdigest(), size
+        except BaseException:
+            self.discard(handle.name)
+            raise
+
+    def discard(self, tmp_path):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # Fichier temporaire -> fichier définitif ; renvoie l'empreinte (calculée si
+    # absente : rendus écrits par un processus de fond). Le fichier temporaire
+    # n'est renommé que si le contenu n'existe pas déjà.
+    def adopt(self, tmp_path, digest=None):
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(tmp_path, 'rb') as handle:
+                for chunk in _chunks(handle):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+        target = self.path(digest)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+        return digest
+
+    def open(self, digest):
+        return open(self.path(digest), 'rb')
+
+    def read(self, digest):
+        with self.open(digest) as handle:
+            return handle.read()
+
+    # Lecture par blocs de [start, end[ (téléchargement en flux, reprise par plage)
+    def iter_chunks(self, digest, chunk_size=CHUNK_SIZE, start=0, end=None):
+        with self.open(digest) as handle:
+            handle.seek(start)
+            remaining = (end if end is not None else self.size(digest)) - start
+            while remaining > 0:
+                chunk = handle.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, digest):
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def digests(self):
+        for prefix in os.listdir(self.directory):
+            folder = os.path.join(self.directory, prefix)
+            if len(prefix) == 2 and os.path.isdir(folder):
+                for rest in os.listdir(folder):
+                    if _DIGEST.match(prefix + rest):
+                        yield prefix + rest
+
+    # (nombre de fichiers, octets)
+    def usage(self):
+        count = total = 0
+        for digest in self.digests():
+            count += 1
+            total += self.size(digest)
+        return count, total
+
+
+# Exécuté dans un processus de fond : miniature et aperçu JPEG d'une image,
+# écrits dans `tmp_dir`. Renvoie {nom: chemin} (vide si le format n'est pas
+# une image lisible). Pillow n'est importé que dans ces processus.
+def render_previews(source_path, tmp_dir, sizes=PREVIEW_SIZES):
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    try:
+        image = Image.open(source_path)
+    except UnidentifiedImageError:
+        return {}
+    with image:
+        # Décodage JPEG directement à une résolution réduite (mémoire bornée)
+        image.draft('RGB', (max(s for _, s in sizes),) * 2)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        rendered = {}
+        for name, side in sorted(sizes, key=lambda item: -item[1]):
+            image.thumbnail((side, side))
+            handle = tempfile.NamedTemporaryFile(dir=tmp_dir, suffix='.jpg', delete=False)
+            with handle:
+                image.save(handle, 'JPEG', quality=85, optimize=True)
+            rendered[name] = handle.name
+        return rendered
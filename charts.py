@@ -0,0 +1,144 @@
+import threading
+from collections import OrderedDict
+
+STATUS_COLORS = {'Terminé': '#4CAF50', 'En Cours': '#FFA500', 'Ouvert': '#FF4444'}
+
+
+# Cache LRU de figures partagé entre sessions, indexé sur
+# (projet, version des données, nom du graphique)
+class FigureCache:
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return figure
+        figure = build()
+        with self._lock:
+            self.misses += 1
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.max_size:
+                self._figures.popitem(last=False)
+        return figure
+
+    def __len__(self):
+        return len(self._figures)
+
+
+# --- Séries agrégées (quelques points, jamais les tâches elles-mêmes) ---
+def status_series(task_stats, labels):
+    counts = task_stats.labelled_status_counts(labels)
+    return tuple(counts.keys()), tuple(counts.values())
+
+
+def comparison_series(metrics):
+    return (metrics.get('temps_attente_avant', 0), metrics.get('temps_attente_apres', 0))
+
+
+# --- Construction des figures ---
+# plotly et numpy sont importés à la première figure construite, pas au
+# chargement du module (démarrage de l'application)
+def build_status_pie(names, values):
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Pie(labels=list(names), values=list(values),
+                           marker_colors=[STATUS_COLORS.get(n, '#999999') for n in names]))
+    fig.update_layout(title="Répartition du Statut des Tâches")
+    return fig
+
+
+def build_comparison_bar(before, after):
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=['Avant', 'Après'],
+        y=[before, after],
+        marker_color=['#FF6B6B', '#4CAF50']
+    ))
+    fig.update_layout(title="Amélioration par Comparaison", yaxis_title="Valeur")
+    return fig
+
+
+# Série d'indicateur déjà réduite (quelques milliers de points au plus) ;
+# horodatages en secondes epoch, moyennes avant/après en pointillés
+def build_kpi_series(name, unit, times, values, change_at=None, statistics=None):
+    import numpy as np
+    import plotly.graph_objects as go
+    when = np.asarray(times, dtype='datetime64[s]')
+    fig = go.Figure(go.Scattergl(x=when, y=values, mode='lines', name=name, line={'width': 1}))
+    if change_at is not None:
+        fig.add_vline(x=int(change_at) * 1000, line_dash='dash', line_color='#666666')
+    for period, color in (('baseline', '#FF6B6B'), ('after', '#4CAF50')):
+        summary = (statistics or {}).get(period)
+        if summary:
+            fig.add_hline(y=summary['mean'], line_dash='dot', line_color=color)
+    fig.update_layout(title=name, yaxis_title=unit or '', margin={'t': 40, 'b': 20}, height=320,
+                      showlegend=False)
+    return fig
+
+
+# Planning agrégé (timeline.Timeline.view) : une cellule par groupe et
+# intervalle, jamais une barre par tâche
+def build_timeline_heatmap(view, group_label):
+    import numpy as np
+    import plotly.graph_objects as go
+    period = "Jour" if view['width'] == 1 else "Semaine du"
+    fig = go.Figure(go.Heatmap(
+        z=view['active'], x=view['bins'], y=view['groups'],
+        customdata=np.dstack([view['due'], view['late']]),
+        colorscale='Blues', colorbar={'title': 'Tâches'},
+        hovertemplate=(f"{group_label} : %{{y}}<br>{period} %{{x}}<br>Tâches actives : %{{z}}<br>"
+                       "Échéances : %{customdata[0]} (dont en retard : %{customdata[1]})<extra></extra>"),
+    ))
+    fig.update_layout(title=f"Tâches actives par {group_label.lower()} ({view['tasks']} tâche(s))",
+                      height=160 + 22 * len(view['groups']), margin={'t': 40, 'b': 20},
+                      yaxis={'autorange': 'reversed'}, xaxis={'type': 'date'})
+    return fig
+
+
+TIMELINE_COLORS = {'Terminée': '#4CAF50', 'En retard': '#FF4444', 'À venir': '#1f77b4'}
+
+
+# Fenêtre rapprochée : une barre par tâche (au plus timeline.MAX_TASK_BARS)
+def build_timeline_bars(view, group_label):
+    from datetime import date
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    rows = [f"{t['group']} · {t['task'][:40]}" for t in view['tasks']]
+    for state, color in TIMELINE_COLORS.items():
+        picked = [i for i, t in enumerate(view['tasks'])
+                  if (t['done'] and state == 'Terminée') or (not t['done'] and t['late'] and state == 'En retard')
+                  or (not t['done'] and not t['late'] and state == 'À venir')]
+        if not picked:
+            continue
+        tasks = [view['tasks'][i] for i in picked]
+        fig.add_trace(go.Bar(
+            name=state, orientation='h', marker_color=color, y=[rows[i] for i in picked],
+            base=[t['start'] for t in tasks],
+            x=[(date.fromisoformat(t['end']) - date.fromisoformat(t['start'])).days * 86400000 for t in tasks],
+            customdata=[[t['project'], t['task'], t['due']] for t in tasks],
+            hovertemplate="%{customdata[1]}<br>%{customdata[0]}<br>%{base|%d/%m/%Y} → %{customdata[2]}<extra></extra>"))
+    fig.update_layout(title=f"Tâches par {group_label.lower()} ({len(rows)})", barmode='overlay',
+                      height=160 + 20 * len(rows), margin={'t': 40, 'b': 20}, xaxis={'type': 'date'},
+                      yaxis={'autorange': 'reversed', 'categoryorder': 'array', 'categoryarray': rows})
+    return fig
+
+
+# Figures mémorisées : la version du projet invalide le cache ; en cas
+# d'absence, la figure est construite à partir de la seule série agrégée
+def status_pie(cache, project_id, version, task_stats, labels):
+    return cache.get_or_build((project_id, version, 'status_pie'),
+                              lambda: build_status_pie(*status_series(task_stats, labels)))
+
+
+def comparison_bar(cache, project_id, version, metrics):
+    return cache.get_or_build((project_id, version, 'comparison'),
+                              lambda: build_comparison_bar(*comparison_series(metrics)))
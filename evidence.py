@@ -0,0 +1,375 @@
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from blobstore import BlobStore, render_previews
+
+# Pièces jointes (photos terrain, relevés avant/après, standards PDF) et
+# commentaires en fil, rattachés à une phase (plan, do, check, act) et
+# éventuellement à une tâche (par son intitulé). Les fichiers sont dans le
+# magasin de blobs ; la base ne garde que leur empreinte et leurs métadonnées,
+# jamais le projet JSON ni la session. Miniatures et aperçus sont rendus par un
+# pool de processus ; les commentaires se lisent page par page.
+SECTIONS = {'plan': 'Planifier', 'do': 'Faire', 'check': 'Vérifier', 'act': 'Agir'}
+PREVIEW_WORKERS = int(os.environ.get('KVP_PREVIEW_WORKERS', '2'))
+COMMENTS_PAGE_SIZE = 20
+# Réponses affichées au plus par fil (les suivantes sont comptées)
+REPLIES_SHOWN = 5
+STALE_TMP_SECONDS = 3600
+# Au-delà, pas de téléchargement depuis l'application (Streamlit garde le fichier
+# entier en mémoire) : le fichier passe par GET /attachments/<id>/content, par blocs
+INLINE_DOWNLOAD_BYTES = 20 * 1024 * 1024
+PREVIEW_PENDING = 'en_attente'
+PREVIEW_READY = 'prête'
+PREVIEW_NONE = 'aucune'
+PREVIEW_FAILED = 'échec'
+
+EVIDENCE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attachments (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    task TEXT NOT NULL DEFAULT '',
+    blob TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mime TEXT,
+    size INTEGER NOT NULL,
+    author TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attachments_target ON attachments(project_id, section, task);
+CREATE INDEX IF NOT EXISTS idx_attachments_blob ON attachments(blob);
+CREATE TABLE IF NOT EXISTS previews (
+    blob TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    thumbnail TEXT,
+    preview TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    task TEXT NOT NULL DEFAULT '',
+    parent_id INTEGER REFERENCES comments(id) ON DELETE CASCADE,
+    author TEXT,
+    body TEXT NOT NULL,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_comments_thread ON comments(project_id, section, task, parent_id, id);
+CREATE INDEX IF NOT EXISTS idx_comments_parent ON comments(parent_id, id);
+"""
+
+
+class Attachment:
+    def __init__(self, id, project_id, section, task, blob, name, mime, size, author, created_at,
+                 preview_status=None, thumbnail=None, preview=None):
+        self.id = id
+        self.project_id = project_id
+        self.section = section
+        self.task = task
+        self.blob = blob
+        self.name = name
+        self.mime = mime
+        self.size = size
+        self.author = author
+        self.created_at = created_at
+        self.preview_status = preview_status
+        self.thumbnail = thumbnail
+        self.preview = preview
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+class Comment:
+    def __init__(self, id, parent_id, author, body, created_at, replies=None, reply_count=0):
+        self.id = id
+        self.parent_id = parent_id
+        self.author = author
+        self.body = body
+        self.created_at = created_at
+        self.replies = replies or []
+        self.reply_count = reply_count
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+_ATTACHMENT_SQL = """
+SELECT a.id, a.project_id, a.section, a.task, a.blob, a.name, a.mime, a.size, a.author, a.created_at,
+       p.status, p.thumbnail, p.preview
+FROM attachments a LEFT JOIN previews p ON p.blob = a.blob
+"""
+
+
+# Pièces jointes et commentaires des projets : métadonnées en base, contenus
+# dans le magasin de blobs, rendus d'aperçus en arrière-plan
+class EvidenceStore:
+    def __init__(self, store, blobs=None, workers=PREVIEW_WORKERS):
+        self.store = store
+        self.blobs = blobs or BlobStore()
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        with store.pool.connection() as conn:
+            conn.executescript(EVIDENCE_SCHEMA)
+        self._resume_previews()
+
+    # --- Pièces jointes ---
+    # Les fichiers ne sont placés ou supprimés que dans une transaction
+    # d'écriture (BEGIN IMMEDIATE) : un ajout et la suppression de la dernière
+    # référence au même contenu ne peuvent pas s'entrecroiser, même entre processus.
+    def attach(self, project_id, section, source, name, mime=None, author=None, task=''):
+        if section not in SECTIONS:
+            raise ValueError(f"phase inconnue : {section!r}")
+        if not self.store.exists(project_id):
+            raise KeyError(project_id)
+        tmp_path, digest, size = self.blobs.stage(source)
+        attachment_id = uuid.uuid4().hex
+        try:
+            with self.store.pool.transaction() as conn:
+                conn.execute('INSERT INTO attachments VALUES (?,?,?,?,?,?,?,?,?,?)',
+                             (attachment_id, project_id, section, task or '', digest, os.path.basename(name),
+                              mime, size, author, _now()))
+                # Un contenu déjà connu (doublon) garde ses rendus
+                scheduled = conn.execute('INSERT OR IGNORE INTO previews (blob, status) VALUES (?, ?)',
+                                         (digest, PREVIEW_PENDING if _is_image(mime) else PREVIEW_NONE)).rowcount
+                self.blobs.adopt(tmp_path, digest)
+        except sqlite3.IntegrityError:
+            # Projet supprimé entre-temps
+            self.blobs.discard(tmp_path)
+            raise KeyError(project_id)
+        except BaseException:
+            self.blobs.discard(tmp_path)
+            raise
+        if scheduled and _is_image(mime):
+            self._schedule(digest)
+        return self.get(attachment_id)
+
+    def get(self, attachment_id):
+        with self.store.pool.connection() as conn:
+            row = conn.execute(_ATTACHMENT_SQL + ' WHERE a.id = ?', (attachment_id,)).fetchone()
+        return Attachment.from_row(tuple(row)) if row else None
+
+    def attachments(self, project_id, section, task=''):
+        with self.store.pool.connection() as conn:
+            return [Attachment.from_row(tuple(r)) for r in conn.execute(
+                _ATTACHMENT_SQL + ' WHERE a.project_id = ? AND a.section = ? AND a.task = ? ORDER BY a.created_at, a.id',
+                (project_id, section, task or ''))]
+
+    # Nombre de pièces jointes et de commentaires d'une phase ou d'une tâche
+    def counts(self, project_id, section, task=''):
+        params = (project_id, section, task or '')
+        with self.store.pool.connection() as conn:
+            files = conn.execute('SELECT COUNT(*) FROM attachments WHERE project_id = ? AND section = ? AND task = ?',
+                                 params).fetchone()[0]
+            comments = conn.execute('SELECT COUNT(*) FROM comments WHERE project_id = ? AND section = ? AND task = ?',
+                                    params).fetchone()[0]
+        return files, comments
+
+    # Supprime la pièce jointe ; le fichier (et ses rendus) seulement s'il n'est plus référencé
+    def remove(self, attachment_id):
+        with self.store.pool.transaction() as conn:
+            row = conn.execute('SELECT blob FROM attachments WHERE id = ?', (attachment_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute('DELETE FROM attachments WHERE id = ?', (attachment_id,))
+            self._delete_blobs(self._orphans(conn, [row[0]]))
+        return True
+
+    def _orphans(self, conn, digests):
+        orphans = []
+        for digest in digests:
+            if conn.execute('SELECT 1 FROM attachments WHERE blob = ? LIMIT 1', (digest,)).fetchone():
+                continue
+            preview = conn.execute('SELECT thumbnail, preview FROM previews WHERE blob = ?', (digest,)).fetchone()
+            conn.execute('DELETE FROM previews WHERE blob = ?', (digest,))
+            orphans += [digest] + [d for d in (preview or ()) if d and not _referenced(conn, d)]
+        return orphans
+
+    def _delete_blobs(self, digests):
+        for digest in digests:
+            self.blobs.delete(digest)
+
+    # Fichiers que plus aucune pièce jointe ne référence (projets supprimés par
+    # cascade, écritures interrompues) ; renvoie le nombre de fichiers supprimés
+    def collect(self):
+        removed = 0
+        with self.store.pool.transaction() as conn:
+            conn.execute('DELETE FROM previews WHERE blob NOT IN (SELECT blob FROM attachments)')
+            kept = {r[0] for r in conn.execute('SELECT blob FROM attachments')}
+            for thumbnail, preview in conn.execute('SELECT thumbnail, preview FROM previews'):
+                kept.update(d for d in (thumbnail, preview) if d)
+            for digest in list(self.blobs.digests()):
+                if digest not in kept:
+                    self.blobs.delete(digest)
+                    removed += 1
+        # Fichiers temporaires abandonnés (les rendus en cours sont récents)
+        for name in os.listdir(self.blobs.tmp_dir):
+            path = os.path.join(self.blobs.tmp_dir, name)
+            if time.time() - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                os.remove(path)
+        return removed
+
+    # --- Rendus en arrière-plan ---
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # 'spawn' : processus neufs, sans hériter des fils ni des connexions du serveur
+                self._pool = ProcessPoolExecutor(max_workers=max(1, self.workers),
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _schedule(self, digest):
+        pool = self._executor()
+        future = pool.submit(render_previews, self.blobs.path(digest), self.blobs.tmp_dir)
+        future.add_done_callback(lambda done: self._previews_done(digest, done, pool))
+        return future
+
+    def _previews_done(self, digest, future, pool=None):
+        rendered = {}
+        try:
+            rendered = future.result()
+            values = (PREVIEW_READY if rendered else PREVIEW_NONE, None, None, None)
+        except BrokenProcessPool:
+            # Processus interrompu : nouveau pool au prochain envoi, rendu repris au démarrage
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            return
+        except Exception as exc:
+            values = (PREVIEW_FAILED, None, None, str(exc))
+        with self.store.pool.transaction() as conn:
+            if conn.execute('SELECT 1 FROM previews WHERE blob = ?', (digest,)).fetchone() is None:
+                # Contenu supprimé pendant le rendu
+                for path in rendered.values():
+                    self.blobs.discard(path)
+                return
+            names = {name: self.blobs.adopt(path) for name, path in rendered.items()}
+            conn.execute('UPDATE previews SET status = ?, thumbnail = ?, preview = ?, error = ? WHERE blob = ?',
+                         (values[0], names.get('thumbnail'), names.get('preview'), values[3], digest))
+
+    # Rendus interrompus (arrêt du serveur) : relancés au démarrage
+    def _resume_previews(self):
+        with self.store.pool.connection() as conn:
+            pending = [r[0] for r in conn.execute('SELECT blob FROM previews WHERE status = ?', (PREVIEW_PENDING,))]
+        for digest in pending:
+            if self.blobs.exists(digest):
+                self._schedule(digest)
+
+    # Attend la fin des rendus en cours (ligne de commande, mesures)
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    # --- Commentaires ---
+    def add_comment(self, project_id, section, body, author=None, task='', parent_id=None):
+        if section not in SECTIONS:
+            raise ValueError(f"phase inconnue : {section!r}")
+        if not str(body or '').strip():
+            raise ValueError("commentaire vide")
+        try:
+            with self.store.pool.transaction() as conn:
+                # Une réponse reste dans le fil de sa phase et de sa tâche
+                if parent_id is not None and conn.execute(
+                        'SELECT 1 FROM comments WHERE id = ? AND project_id = ? AND section = ? AND task = ? '
+                        'AND parent_id IS NULL', (parent_id, project_id, section, task or '')).fetchone() is None:
+                    raise ValueError(f"fil de commentaires inconnu : {parent_id!r}")
+                cur = conn.execute(
+                    'INSERT INTO comments (project_id, section, task, parent_id, author, body, created_at) '
+                    'VALUES (?,?,?,?,?,?,?)', (project_id, section, task or '', parent_id, author, body.strip(), _now()))
+        except sqlite3.IntegrityError:
+            # Projet inconnu ou supprimé entre-temps
+            raise KeyError(project_id)
+        return cur.lastrowid
+
+    def delete_comment(self, comment_id):
+        with self.store.pool.transaction() as conn:
+            conn.execute('DELETE FROM comments WHERE id = ?', (comment_id,))
+
+    # Une page de fils, du plus récent au plus ancien : pagination par curseur
+    # (`before` : identifiant du dernier fil de la page précédente), avec les
+    # premières réponses de chaque fil. Renvoie (fils, curseur suivant ou None).
+    def comments(self, project_id, section, task='', before=None, limit=COMMENTS_PAGE_SIZE):
+        with self.store.pool.connection() as conn:
+            rows = conn.execute(
+                'SELECT id, parent_id, author, body, created_at FROM comments '
+                'WHERE project_id = ? AND section = ? AND task = ? AND parent_id IS NULL AND id < ? '
+                'ORDER BY id DESC LIMIT ?',
+                (project_id, section, task or '', before if before is not None else sys.maxsize, limit + 1)).fetchall()
+            threads = [Comment(*row) for row in rows[:limit]]
+            if threads:
+                by_id = {c.id: c for c in threads}
+                marks = ','.join('?' * len(by_id))
+                for parent_id, count in conn.execute(
+                        f'SELECT parent_id, COUNT(*) FROM comments WHERE parent_id IN ({marks}) GROUP BY parent_id',
+                        list(by_id)):
+                    by_id[parent_id].reply_count = count
+                for row in conn.execute(
+                        'SELECT id, parent_id, author, body, created_at FROM ('
+                        '  SELECT *, ROW_NUMBER() OVER (PARTITION BY parent_id ORDER BY id) AS rank'
+                        f'  FROM comments WHERE parent_id IN ({marks})'
+                        ') WHERE rank <= ? ORDER BY id', list(by_id) + [REPLIES_SHOWN]):
+                    by_id[row[1]].replies.append(Comment(*row))
+        cursor = threads[-1].id if len(rows) > limit else None
+        return threads, cursor
+
+    # Réponses d'un fil au-delà des premières (chargées à la demande)
+    def replies(self, parent_id, after=None, limit=COMMENTS_PAGE_SIZE):
+        with self.store.pool.connection() as conn:
+            return [Comment(*row) for row in conn.execute(
+                'SELECT id, parent_id, author, body, created_at FROM comments WHERE parent_id = ? AND id > ? '
+                'ORDER BY id LIMIT ?', (parent_id, after or 0, limit))]
+
+
+# Un rendu identique à un autre contenu (même octets) partage son fichier
+def _referenced(conn, digest):
+    return conn.execute('SELECT 1 FROM attachments WHERE blob = ? UNION ALL '
+                        'SELECT 1 FROM previews WHERE thumbnail = ? OR preview = ? LIMIT 1',
+                        (digest, digest, digest)).fetchone() is not None
+
+
+def _is_image(mime):
+    return bool(mime) and mime.startswith('image/')
+
+
+def human_size(size):
+    for unit in ('o', 'Ko', 'Mo'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'o' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} Go"
+
+
+if __name__ == '__main__':
+    # Usage :
+    #   python evidence.py attach <id_projet> <phase> <fichier> [intitulé de tâche]
+    #   python evidence.py gc                 # fichiers non référencés
+    #   python evidence.py usage
+    import mimetypes
+    from storage import ProjectStore
+    command = sys.argv[1] if len(sys.argv) > 1 else 'usage'
+    evidence = EvidenceStore(ProjectStore())
+    if command == 'attach':
+        project_id, section, path = sys.argv[2:5]
+        with open(path, 'rb') as handle:
+            attachment = evidence.attach(project_id, section, handle, path, mimetypes.guess_type(path)[0], 'cli',
+                                         sys.argv[5] if len(sys.argv) > 5 else '')
+        evidence.close()
+        print(f"{attachment.name} ({human_size(attachment.size)}) joint : {attachment.blob}")
+    elif command == 'gc':
+        print(f"{evidence.collect()} fichier(s) supprimé(s)")
+    count, total = evidence.blobs.usage()
+    print(f"{count} fichier(s), {human_size(total)} dans {evidence.blobs.directory}")
@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import date
+
+from storage import DEFAULT_DB_PATH
+
+EXPORT_FORMATS = ['ndjson', 'csv', 'parquet']
+# Archives préparées par l'application et l'API (jamais dans le /tmp partagé) ;
+# celles des sessions fermées sont supprimées au-delà de STALE_EXPORT_SECONDS
+EXPORT_DIR = os.environ.get('KVP_EXPORT_DIR',
+                            os.path.join(os.path.dirname(os.path.abspath(DEFAULT_DB_PATH)), 'kvp_exports'))
+EXPORT_PREFIX = 'kvp_export_'
+STALE_EXPORT_SECONDS = float(os.environ.get('KVP_EXPORT_TTL', '21600'))
+
+# Tables plates exportées : nom -> (colonnes, table source, colonne projet)
+EXPORT_TABLES = {
+    'projects': (['id', 'name', 'description', 'created_date', 'status', 'site', 'problem', 'goal',
+                  'root_cause', 'results', 'standardization', 'lessons_learned', 'next_steps',
+                  'version', 'updated_at'], 'projects', 'id'),
+    'measures': (['project_id', 'position', 'measure'], 'plan_measures', 'project_id'),
+    'tasks': (['project_id', 'position', 'task', 'responsible', 'due_date', 'status', 'priority'],
+              'tasks', 'project_id'),
+    'metrics': (['project_id', 'name', 'value'], 'check_metrics', 'project_id'),
+}
+
+# Types Parquet (les autres colonnes sont des textes)
+_PARQUET_TYPES = {'version': 'int64', 'position': 'int64', 'value': 'float64'}
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def available_formats():
+    return [f for f in EXPORT_FORMATS if f != 'parquet' or _parquet_available()]
+
+
+# Filtre sur les projets (statut, date de création) traduit en SQL
+def _project_filter(statuses=None, created_from=None, created_to=None):
+    clauses, params = [], []
+    if statuses:
+        clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if created_from:
+        clauses.append('created_date >= ?')
+        params.append(created_from.isoformat() if isinstance(created_from, date) else created_from)
+    if created_to:
+        clauses.append('created_date <= ?')
+        params.append(created_to.isoformat() if isinstance(created_to, date) else created_to)
+    return ' AND '.join(clauses), params
+
+
+def _table_query(name, where, params):
+    columns, source, project_column = EXPORT_TABLES[name]
+    sql = f"SELECT {', '.join(columns)} FROM {source}"
+    if where:
+        if source == 'projects':
+            sql += f" WHERE {where}"
+        else:
+            sql += f" WHERE {project_column} IN (SELECT id FROM projects WHERE {where})"
+    return sql, params
+
+
+# Écrivains par format : reçoivent des lots de tuples et écrivent dans un flux binaire
+class _NdjsonWriter:
+    def __init__(self, stream, columns):
+        self.text = io.TextIOWrapper(stream, encoding='utf-8', newline='\n')
+        self.columns = columns
+        # Encodeur réutilisé : json.dumps(..., ensure_ascii=False) en recrée un à chaque appel
+        self.encode = json.JSONEncoder(ensure_ascii=False).encode
+
+    def write(self, rows):
+        encode = self.encode
+        columns = self.columns
+        self.text.write(''.join([encode(dict(zip(columns, row))) + '\n' for row in rows]))
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+
+
+class _CsvWriter:
+    def __init__(self, stream, columns):
+        self.text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+
+
+class _ParquetWriter:
+    def __init__(self, stream, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(c, getattr(pa, _PARQUET_TYPES.get(c, 'string'))()) for c in columns])
+        self.writer = pq.ParquetWriter(stream, self.schema)
+
+    def write(self, rows):
+        arrays = list(zip(*rows)) if rows else [[] for _ in self.columns]
+        table = self.pa.Table.from_arrays(
+            [self.pa.array(list(values), type=field.type) for values, field in zip(arrays, self.schema)],
+            schema=self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+
+_WRITERS = {'ndjson': _NdjsonWriter, 'csv': _CsvWriter, 'parquet': _ParquetWriter}
+
+
+class ExportResult:
+    def __init__(self, path, rows, size, seconds, tables):
+        self.path = path
+        self.rows = rows
+        self.size = size
+        self.seconds = seconds
+        self.tables = tables
+
+    @property
+    def megabytes(self):
+        return self.size / 1e6
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else float('inf')
+
+    def summary(self):
+        return (f"{self.rows} ligne(s), {self.megabytes:.2f} Mo en {self.seconds:.2f} s "
+                f"({self.rows_per_second:,.0f} lignes/s)")
+
+
+# Supprime les archives abandonnées du dossier d'export ; renvoie leur nombre
+def prune_exports(directory=EXPORT_DIR, max_age=STALE_EXPORT_SECONDS):
+    removed = 0
+    if not os.path.isdir(directory):
+        return removed
+    for name in os.listdir(directory):
+        if not name.startswith(EXPORT_PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            # Supprimée entre-temps par une autre session
+            pass
+    return removed
+
+
+# Chemin d'une archive du dossier d'export d'après son nom (None si le nom
+# n'en désigne pas une : pas de chemin arbitraire depuis l'API)
+def export_path(name, directory=EXPORT_DIR):
+    if (os.path.basename(name) != name or not name.startswith(EXPORT_PREFIX)
+            or not name.endswith('.zip')):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
+
+
+# Exporte le portefeuille (filtré) dans une archive zip : une entrée par table,
+# remplie lot par lot depuis un curseur SQLite, sans jamais tout charger en mémoire
+def export_portfolio(store, fmt='ndjson', statuses=None, created_from=None, created_to=None,
+                     path=None, batch_size=5000):
+    if fmt not in available_formats():
+        raise ValueError(f"Format d'export indisponible : {fmt}")
+    if path is None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        prune_exports()
+        handle, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix='.zip', dir=EXPORT_DIR)
+        os.close(handle)
+    try:
+        return _write_archive(store, fmt, path, statuses, created_from, created_to, batch_size)
+    except BaseException:
+        # Pas d'archive partielle laissée sur le disque
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def _write_archive(store, fmt, path, statuses, created_from, created_to, batch_size):
+    where, params = _project_filter(statuses, created_from, created_to)
+    started = time.perf_counter()
+    total = 0
+    tables = {}
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive, \
+            store.pool.connection() as conn:
+        for name, (columns, _, _) in EXPORT_TABLES.items():
+            sql, query_params = _table_query(name, where, params)
+            cursor = conn.execute(sql, query_params)
+            count = 0
+            with archive.open(f"{name}.{fmt}", 'w', force_zip64=True) as entry:
+                writer = _WRITERS[fmt](entry, columns)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    writer.write([tuple(r) for r in rows])
+                    count += len(rows)
+                writer.close()
+            tables[name] = count
+            total += count
+    seconds = time.perf_counter() - started
+    return ExportResult(path, total, os.path.getsize(path), seconds, tables)
+
+
+if __name__ == '__main__':
+    # Usage : python exporter.py [ndjson|csv|parquet] [archive.zip] [statut ...]
+    from storage import ProjectStore
+    fmt = sys.argv[1] if len(sys.argv) > 1 else 'ndjson'
+    target = sys.argv[2] if len(sys.argv) > 2 else f'portefeuille_kvp.{fmt}.zip'
+    result = export_portfolio(ProjectStore(), fmt, statuses=sys.argv[3:] or None, path=target)
+    print(f"{result.path} : {result.summary()}")
+    for name, count in result.tables.items():
+        print(f"  {name} : {count}")
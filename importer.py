@@ -0,0 +1,386 @@
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime
+
+from task_editor import TASK_STATUSES
+
+PROJECT_STATUSES = ['brouillon', 'en_cours', 'terminé', 'en_attente']
+# Au-delà du brouillon, le plan doit décrire au moins le problème et l'objectif
+REQUIRED_PLAN_FIELDS = ['problem', 'goal']
+PLAN_TEXT_FIELDS = ['problem', 'goal', 'root_cause']
+CHECK_TEXT_FIELDS = ['results']
+ACT_TEXT_FIELDS = ['standardization', 'lessons_learned', 'next_steps']
+# Champs texte facultatifs (None accepté) d'une tâche et de l'en-tête d'un projet
+TASK_TEXT_FIELDS = ['responsible', 'priority']
+PROJECT_TEXT_FIELDS = ['description', 'site']
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 10000
+# Document JSON (tableau) lu par blocs de cette taille, élément par élément
+JSON_READ_CHARS = 64 * 1024
+# Au-delà, un élément du tableau est refusé (ou le JSON est invalide) : la
+# lecture s'arrête au lieu de garder le reste du fichier en mémoire
+MAX_JSON_ITEM_CHARS = 16 * 1024 * 1024
+
+
+class ImportValidationError(ValueError):
+    pass
+
+
+# --- Validation ---
+def validate_due_date(value):
+    if not isinstance(value, str) or len(value) != 10:
+        raise ImportValidationError(f"date d'échéance invalide : {value!r} (attendu AAAA-MM-JJ)")
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        raise ImportValidationError(f"date d'échéance invalide : {value!r} (attendu AAAA-MM-JJ)")
+    return value
+
+
+def validate_task(task):
+    if not isinstance(task, dict):
+        raise ImportValidationError("tâche mal formée")
+    if not isinstance(task.get('task'), str) or not task['task'].strip():
+        raise ImportValidationError("intitulé de tâche manquant")
+    if task.get('status', 'ouvert') not in TASK_STATUSES:
+        raise ImportValidationError(f"statut de tâche inconnu : {task.get('status')!r}")
+    for field in TASK_TEXT_FIELDS:
+        if task.get(field) is not None and not isinstance(task[field], str):
+            raise ImportValidationError(f"champ {field} de tâche doit être un texte")
+    validate_due_date(task.get('due_date'))
+    return task
+
+
+def validate_project(project):
+    if not isinstance(project, dict):
+        raise ImportValidationError("projet mal formé (objet JSON attendu)")
+    if 'id' in project and not (isinstance(project['id'], str) and project['id'].strip()):
+        raise ImportValidationError("identifiant de projet invalide (texte non vide attendu)")
+    if not isinstance(project.get('name'), str) or not project['name'].strip():
+        raise ImportValidationError("nom de projet manquant")
+    for field in PROJECT_TEXT_FIELDS:
+        if project.get(field) is not None and not isinstance(project[field], str):
+            raise ImportValidationError(f"champ {field} doit être un texte")
+    status = project.get('status', 'brouillon')
+    if status not in PROJECT_STATUSES:
+        raise ImportValidationError(f"statut de projet inconnu : {status!r}")
+    plan = project.get('plan', {})
+    if not isinstance(plan, dict):
+        raise ImportValidationError("section 'plan' mal formée")
+    for field in PLAN_TEXT_FIELDS:
+        if field in plan and not isinstance(plan[field], str):
+            raise ImportValidationError(f"champ plan.{field} doit être un texte")
+    measures = plan.get('measures')
+    if measures is not None and not (isinstance(measures, list) and all(isinstance(m, str) for m in measures)):
+        raise ImportValidationError("plan.measures doit être une liste de textes")
+    if status != 'brouillon':
+        missing = [f for f in REQUIRED_PLAN_FIELDS if not str(plan.get(f) or '').strip()]
+        if missing:
+            raise ImportValidationError(f"champs du plan requis manquants : {', '.join('plan.' + f for f in missing)}")
+    do = project.get('do') or {}
+    if not isinstance(do, dict):
+        raise ImportValidationError("section 'do' mal formée")
+    steps = do.get('implementation_steps') or []
+    if not isinstance(steps, list):
+        raise ImportValidationError("do.implementation_steps doit être une liste de tâches")
+    for i, task in enumerate(steps):
+        try:
+            validate_task(task)
+        except ImportValidationError as exc:
+            raise ImportValidationError(f"tâche {i + 1} : {exc}")
+    _validate_text_section(project, 'check', CHECK_TEXT_FIELDS)
+    metrics = (project.get('check') or {}).get('metrics')
+    if metrics is not None and not (isinstance(metrics, dict) and all(
+            isinstance(k, str) and isinstance(v, (int, float)) and not isinstance(v, bool)
+            for k, v in metrics.items())):
+        raise ImportValidationError("check.metrics doit associer des noms à des nombres")
+    _validate_text_section(project, 'act', ACT_TEXT_FIELDS)
+    project.setdefault('id', str(uuid.uuid4()))
+    project.setdefault('created_date', datetime.now().strftime('%Y-%m-%d'))
+    project.setdefault('status', status)
+    return project
+
+
+def _validate_text_section(project, section, fields):
+    values = project.get(section) or {}
+    if not isinstance(values, dict):
+        raise ImportValidationError(f"section '{section}' mal formée")
+    for field in fields:
+        if values.get(field) is not None and not isinstance(values[field], str):
+            raise ImportValidationError(f"champ {section}.{field} doit être un texte")
+
+
+# --- Lecture en flux ---
+def _text_stream(raw):
+    return io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+
+
+# Détecte le format : CSV par extension, sinon d'après le premier caractère
+# significatif : '[' (tableau) ou '{' seul sur sa ligne (export indenté de la
+# barre latérale) pour un document JSON, '{' suivi du projet sur la même
+# ligne pour du NDJSON. Seul le début du fichier est lu, quelle que soit la
+# longueur des lignes.
+def detect_format(filename, raw):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    head = raw.read(4096)
+    raw.seek(0)
+    head = head.lstrip(b'\xef\xbb\xbf').lstrip()
+    if head.startswith(b'['):
+        return 'json'
+    if head.startswith(b'{') and head[1:].lstrip(b' \t\r')[:1] == b'\n':
+        return 'json'
+    return 'ndjson'
+
+
+# Générateurs (numéro de ligne, objet) ; les erreurs de syntaxe sont remontées ligne à ligne
+def iter_ndjson(text):
+    for line_no, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as exc:
+            yield line_no, ImportValidationError(f"JSON invalide : {exc}")
+
+
+# Document JSON : un projet seul (export de la barre latérale), ou un tableau
+# lu par blocs et décodé élément par élément (mémoire bornée par le plus gros
+# élément, pas par la taille du fichier)
+def iter_json_document(text):
+    buffer = text.read(JSON_READ_CHARS).lstrip()
+    if not buffer.startswith('['):
+        yield 1, json.loads(buffer + text.read())
+        return
+    decoder = json.JSONDecoder()
+    pos, eof, number, expect_item = 1, False, 0, True
+    while True:
+        # Blancs et séparateur avant l'élément suivant (ou la fin du tableau)
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+            pos += 1
+        if pos == len(buffer) and not eof:
+            chunk = text.read(JSON_READ_CHARS)
+            buffer, pos, eof = chunk, 0, not chunk
+            continue
+        char = buffer[pos] if pos < len(buffer) else ''
+        if char == ']' and (expect_item is False or number == 0):
+            return
+        if not expect_item:
+            if char != ',':
+                yield number + 1, ImportValidationError("JSON invalide : ',' ou ']' attendu entre les éléments")
+                return
+            pos, expect_item = pos + 1, True
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # Élément qui touche la fin du bloc : peut-être tronqué (nombre)
+            complete = end < len(buffer) or eof
+        except ValueError as exc:
+            item, complete = exc, eof
+        if not complete:
+            if len(buffer) - pos > MAX_JSON_ITEM_CHARS:
+                yield number + 1, ImportValidationError(
+                    f"JSON invalide ou élément trop volumineux (> {MAX_JSON_ITEM_CHARS // (1024 * 1024)} Mo) ; "
+                    "pour les gros fichiers, préférer NDJSON (un projet par ligne)")
+                return
+            # Bloc suivant, de taille croissante (lecture linéaire des gros éléments)
+            chunk = text.read(max(JSON_READ_CHARS, len(buffer) - pos))
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+        if isinstance(item, ValueError):
+            yield number + 1, ImportValidationError(f"JSON invalide : {item}")
+            return
+        number += 1
+        yield number, item
+        pos, expect_item = end, False
+
+
+def iter_csv_tasks(text):
+    reader = csv.DictReader(text)
+    missing = [c for c in ('project_id', 'task', 'due_date') if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ImportValidationError(f"colonnes CSV manquantes : {', '.join(missing)}")
+    for line_no, row in enumerate(reader, start=2):
+        task = {
+            'task': (row.get('task') or '').strip(),
+            'responsible': (row.get('responsible') or '').strip(),
+            'due_date': (row.get('due_date') or '').strip(),
+            'status': (row.get('status') or 'ouvert').strip(),
+        }
+        if (row.get('priority') or '').strip():
+            task['priority'] = row['priority'].strip()
+        yield line_no, (row.get('project_id') or '').strip(), task
+
+
+# Tâche d'import en arrière-plan : lit en flux, valide et valide (commit) par lots
+class ImportJob:
+    def __init__(self, store, raw, filename, size=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.id = str(uuid.uuid4())
+        self.store = store
+        self.raw = raw
+        self.filename = filename
+        self.size = size
+        self.chunk_size = chunk_size
+        self.format = None
+        self.rows = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.touched = set()
+        self.done = False
+        self.finished_at = None
+        self.failure = None
+        self._thread = None
+
+    @property
+    def progress(self):
+        if self.done:
+            return 1.0
+        raw = self.raw
+        if not self.size or raw is None:
+            return 0.0
+        try:
+            return min(raw.tell() / self.size, 0.99)
+        except (ValueError, OSError):
+            return 0.0
+
+    def _error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'ligne': line_no, 'erreur': str(message)})
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f"kvp-import-{self.id[:8]}", daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        try:
+            self.format = detect_format(self.filename, self.raw)
+            text = _text_stream(self.raw)
+            if self.format == 'csv':
+                self._import_tasks(iter_csv_tasks(text))
+            elif self.format == 'ndjson':
+                self._import_projects(iter_ndjson(text))
+            else:
+                self._import_projects(iter_json_document(text))
+        except Exception as exc:
+            self.failure = str(exc)
+        finally:
+            self.done = True
+            self.finished_at = time.time()
+            # Le fichier reçu n'est plus lu : il peut être libéré
+            self.raw = None
+
+    def _import_projects(self, items):
+        batch = []
+        for line_no, item in items:
+            self.rows += 1
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                batch.append((line_no, validate_project(item)))
+            except ImportValidationError as exc:
+                self._error(line_no, exc)
+            if len(batch) >= self.chunk_size:
+                self._commit_projects(batch)
+                batch = []
+        if batch:
+            self._commit_projects(batch)
+
+    # Un lot refusé par la base (valeur non enregistrable) est repris ligne à
+    # ligne : seules les lignes fautives deviennent des erreurs
+    def _commit_projects(self, batch):
+        try:
+            self.imported += self.store.save_many([p for _, p in batch])
+            self.touched.update(p['id'] for _, p in batch)
+        except Exception as exc:
+            if len(batch) == 1:
+                self._error(batch[0][0], f"enregistrement impossible : {exc}")
+                return
+            for row in batch:
+                self._commit_projects([row])
+
+    def _import_tasks(self, rows):
+        batch = []
+        for line_no, project_id, task in rows:
+            self.rows += 1
+            try:
+                if not project_id:
+                    raise ImportValidationError("project_id manquant")
+                batch.append((line_no, project_id, validate_task(task)))
+            except ImportValidationError as exc:
+                self._error(line_no, exc)
+            if len(batch) >= self.chunk_size:
+                self._commit_tasks(batch)
+                batch = []
+        if batch:
+            self._commit_tasks(batch)
+
+    # Un lot de tâches : chaque projet concerné est chargé une fois puis réenregistré
+    def _commit_tasks(self, batch):
+        projects = {}
+        for line_no, project_id, task in batch:
+            if project_id not in projects:
+                try:
+                    projects[project_id] = self.store.load(project_id)
+                except KeyError:
+                    projects[project_id] = None
+            project = projects[project_id]
+            if project is None:
+                self._error(line_no, f"projet inconnu : {project_id}")
+                continue
+            project.setdefault('do', {}).setdefault('implementation_steps', []).append(task)
+            self.imported += 1
+        loaded = [p for p in projects.values() if p is not None]
+        if not loaded:
+            return
+        try:
+            self.store.save_many(loaded)
+            self.touched.update(p['id'] for p in loaded)
+        except Exception as exc:
+            # Lot annulé : ses tâches sont signalées (les projets restent inchangés)
+            for line_no, project_id, _ in batch:
+                if projects[project_id] is not None:
+                    self.imported -= 1
+                    self._error(line_no, f"enregistrement impossible : {exc}")
+
+    def error_report_csv(self):
+        return error_report_csv(self.errors)
+
+
+# Rapport d'erreurs (ligne, erreur) au format CSV
+def error_report_csv(errors):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=['ligne', 'erreur'])
+    writer.writeheader()
+    writer.writerows(errors)
+    return out.getvalue()
+
+
+if __name__ == '__main__':
+    # Usage : python importer.py fichier.ndjson|fichier.csv|export.json
+    from storage import ProjectStore
+    target = ProjectStore()
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as f:
+            job = ImportJob(target, f, path, size=os.path.getsize(path))
+            job.run()
+        print(f"{path} : {job.imported} importé(s), {job.error_count} erreur(s) sur {job.rows} ligne(s)")
+        if job.failure:
+            print(f"  échec : {job.failure}")
+        for error in job.errors[:20]:
+            print(f"  ligne {error['ligne']} : {error['erreur']}")
@@ -0,0 +1,252 @@
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Mesures activées au démarrage (sinon depuis le panneau Performance)
+ENABLED = os.environ.get('KVP_PROFILE', '') not in ('', '0')
+DATA_DIR = os.path.dirname(os.path.abspath(os.environ.get('KVP_DB_PATH', 'kvp.db')))
+METRICS_PATH = os.environ.get('KVP_METRICS_PATH', os.path.join(DATA_DIR, 'kvp_metrics.prom'))
+LOG_PATH = os.environ.get('KVP_PROFILE_LOG', os.path.join(DATA_DIR, 'kvp_profile.log'))
+# Fenêtre glissante (dernières mesures) sur laquelle portent les percentiles
+WINDOW = 500
+QUANTILES = (0.5, 0.95, 0.99)
+EXPORT_INTERVAL_SECONDS = 15
+LOG_MAX_BYTES = 1000000
+LOG_BACKUPS = 3
+
+
+# Contexte vide partagé : sans mesure, une section ne coûte qu'un test de booléen
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+# Dernières valeurs d'une série (fenêtre bornée) et cumuls depuis le démarrage
+class RollingStats:
+    def __init__(self, window=WINDOW):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q):
+        ordered = sorted(self.values)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    def summary(self):
+        row = {'n': self.count}
+        for q in QUANTILES:
+            row[f"p{int(q * 100)}"] = self.percentile(q)
+        row['max'] = max(self.values) if self.values else 0.0
+        return row
+
+
+def _widget_count():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None
+    shared = getattr(ctx, 'shared', None)
+    ids = getattr(shared, 'widget_ids_this_run', None) if shared is not None else None
+    if ids is None:
+        ids = getattr(ctx, 'widget_ids_this_run', None)
+    if ids is None:
+        return None
+    return len(ids.snapshot()) if hasattr(ids, 'snapshot') else len(ids)
+
+
+class _Span:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        self.recorder._record(self.recorder.spans, self.name, elapsed)
+        current = getattr(self.recorder._local, 'rerun', None)
+        if current is not None:
+            current[self.name] = current.get(self.name, 0.0) + elapsed
+        return False
+
+
+# Relance (application complète ou fragment seul) : durée, sections traversées
+# et widgets affichés, consignés dans le journal ; exporte périodiquement
+class _Rerun(_Span):
+    def __enter__(self):
+        self.recorder._local.rerun = {}
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        sections = self.recorder._local.rerun
+        self.recorder._local.rerun = None
+        widgets = _widget_count()
+        if widgets is not None:
+            self.recorder._record(self.recorder.widgets, self.name, widgets)
+        self.recorder._log({'rerun': self.name, 'ms': round(sections.pop(self.name), 2),
+                            'widgets': widgets, 'spans': {k: round(v, 2) for k, v in sections.items()}})
+        self.recorder.maybe_export()
+        return False
+
+
+# Mesures du processus, communes à toutes les sessions : durées des sections (ms),
+# widgets par relance, taille des figures envoyées au navigateur (octets)
+class Recorder:
+    def __init__(self, enabled=ENABLED, metrics_path=METRICS_PATH, log_path=LOG_PATH, window=WINDOW):
+        self.enabled = enabled
+        self.metrics_path = metrics_path
+        self.log_path = log_path
+        self.window = window
+        self.spans = {}
+        self.widgets = {}
+        self.payloads = {}
+        self.last_export = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._logger = None
+
+    def _record(self, series, name, value):
+        with self._lock:
+            stats = series.get(name)
+            if stats is None:
+                stats = series[name] = RollingStats(self.window)
+            stats.add(value)
+
+    # Section chronométrée : `with span('export'):`
+    def span(self, name):
+        return _Span(self, name) if self.enabled else NO_SPAN
+
+    # Fonction chronométrée ; appelée hors de toute relance mesurée (fragment
+    # réexécuté seul, ou main()), elle compte comme une relance
+    def timed(self, name):
+        def wrap(func):
+            @functools.wraps(func)
+            def run(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                if getattr(self._local, 'rerun', None) is None:
+                    measure = _Rerun(self, name)
+                else:
+                    measure = _Span(self, name)
+                with measure:
+                    return func(*args, **kwargs)
+            return run
+        return wrap
+
+    # Taille sérialisée d'une figure Plotly (calculée seulement si les mesures sont actives)
+    def chart(self, name, fig):
+        if self.enabled:
+            self._record(self.payloads, name, len(fig.to_json()))
+        return fig
+
+    def reset(self):
+        with self._lock:
+            self.spans, self.widgets, self.payloads = {}, {}, {}
+
+    def summary(self):
+        with self._lock:
+            return {kind: {name: stats.summary() for name, stats in series.items()}
+                    for kind, series in (('spans', self.spans), ('widgets', self.widgets),
+                                         ('payloads', self.payloads))}
+
+    def _log(self, entry):
+        if not self.log_path:
+            return
+        if self._logger is None:
+            logger = logging.getLogger('kvp.profile')
+            logger.propagate = False
+            if not logger.handlers:
+                logger.addHandler(logging.handlers.RotatingFileHandler(
+                    self.log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8'))
+            logger.setLevel(logging.INFO)
+            self._logger = logger
+        entry['at'] = datetime.now().isoformat(timespec='milliseconds')
+        self._logger.info(json.dumps(entry, ensure_ascii=False))
+
+    # Format texte de Prometheus (résumés : quantiles sur la fenêtre, cumuls)
+    def prometheus_text(self):
+        lines = []
+        metrics = (('kvp_span_milliseconds', 'span', self.spans, "Durée des sections et relances"),
+                   ('kvp_widgets_per_rerun', 'rerun', self.widgets, "Widgets affichés par relance"),
+                   ('kvp_chart_payload_bytes', 'chart', self.payloads, "Taille des figures envoyées"))
+        with self._lock:
+            for metric, label, series, help_text in metrics:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} summary")
+                for name, stats in sorted(series.items()):
+                    value = _label_value(name)
+                    for q in QUANTILES:
+                        lines.append(f'{metric}{{{label}="{value}",quantile="{q}"}} {stats.percentile(q):.3f}')
+                    lines.append(f'{metric}_sum{{{label}="{value}"}} {stats.total:.3f}')
+                    lines.append(f'{metric}_count{{{label}="{value}"}} {stats.count}')
+        return '\n'.join(lines) + '\n'
+
+    # Écriture atomique du fichier lu par Prometheus (collecteur textfile)
+    def export(self):
+        if not self.metrics_path:
+            return None
+        temporary = f"{self.metrics_path}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            handle.write(self.prometheus_text())
+        os.replace(temporary, self.metrics_path)
+        self.last_export = time.monotonic()
+        return self.metrics_path
+
+    def maybe_export(self):
+        if time.monotonic() - self.last_export >= EXPORT_INTERVAL_SECONDS:
+            try:
+                self.export()
+            except OSError:
+                pass
+
+
+def _label_value(name):
+    return name.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Enregistreur unique du processus (le module n'est importé qu'une fois,
+# l'application, elle, est réexécutée à chaque relance)
+recorder = Recorder()
+span = recorder.span
+timed = recorder.timed
+chart = recorder.chart
+
+
+if __name__ == '__main__':
+    # Usage : python instrumentation.py [kvp_profile.log]
+    # Percentiles par relance et par section, recalculés depuis le journal
+    stats = {}
+    with open(sys.argv[1] if len(sys.argv) > 1 else LOG_PATH, encoding='utf-8') as handle:
+        for line in handle:
+            entry = json.loads(line)
+            stats.setdefault(entry['rerun'], RollingStats(None)).add(entry['ms'])
+            for name, ms in entry['spans'].items():
+                stats.setdefault(name, RollingStats(None)).add(ms)
+    for name, series in sorted(stats.items(), key=lambda item: -item[1].percentile(0.95)):
+        row = series.summary()
+        print(f"{name:28} n={row['n']:6}  p50 {row['p50']:8.1f} ms  p95 {row['p95']:8.1f} ms  "
+              f"p99 {row['p99']:8.1f} ms")
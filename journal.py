@@ -0,0 +1,544 @@
+import glob
+import gzip
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+from storage import DEFAULT_DB_PATH, SECTION_FIELDS, ProjectStore, clone_project, section_values, set_section_value
+
+# Journal des modifications : fichiers segments en ajout seul (<premier seq>.log),
+# trames [longueur, crc32, JSON compact] ; les trames longues sont compressées.
+# Les écritures sont regroupées : un seul fsync par lot (au plus toutes les
+# FSYNC_INTERVAL_SECONDS). Un processus écrit dans le journal (l'application).
+JOURNAL_ENABLED = os.environ.get('KVP_JOURNAL', '1') != '0'
+JOURNAL_DIR = os.environ.get('KVP_JOURNAL_DIR',
+                             os.path.join(os.path.dirname(os.path.abspath(DEFAULT_DB_PATH)), 'kvp_journal'))
+SEGMENT_BYTES = 64 * 1024 * 1024
+FSYNC_INTERVAL_SECONDS = 0.05
+COMPRESS_ABOVE = 512
+# Événements entre deux instantanés : borne le rejeu au redémarrage
+SNAPSHOT_EVERY = 50000
+SNAPSHOTS_KEPT = 3
+UNDO_ORIGIN = 'undo'
+
+_HEADER = struct.Struct('<II')
+_COMPRESSED = 1 << 31
+
+# Index du journal (dérivé : reconstruit depuis les segments si besoin)
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal_index (
+    seq INTEGER PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    at TEXT NOT NULL,
+    type TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    undo INTEGER NOT NULL DEFAULT 0,
+    undone_by INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_journal_project ON journal_index(project_id, seq);
+CREATE INDEX IF NOT EXISTS idx_journal_type ON journal_index(type, seq);
+"""
+
+TASK_EVENTS = ('task_add', 'task_delete', 'task_status', 'task_edit', 'tasks')
+PROJECT_EVENTS = ('create', 'delete')
+EVENT_LABELS = {
+    'create': "Création du projet", 'delete': "Suppression du projet", 'rename': "Renommage",
+    'status': "Statut du projet", 'field': "Modification", 'task_add': "Tâche ajoutée",
+    'task_delete': "Tâche supprimée", 'task_status': "Statut de tâche", 'task_edit': "Tâche modifiée",
+    'tasks': "Liste des tâches", 'undo': "Annulation",
+}
+
+
+# --- Trames ---
+def encode(event):
+    payload = json.dumps(event, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    length = len(payload)
+    if length > COMPRESS_ABOVE:
+        payload = zlib.compress(payload, 1)
+        length = len(payload) | _COMPRESSED
+    return _HEADER.pack(length, zlib.crc32(payload)) + payload
+
+
+def _decode(length, payload):
+    if length & _COMPRESSED:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+# Trames d'un segment à partir de `offset` : (début, fin, événement) ; s'arrête
+# à la première trame incomplète ou corrompue (écriture interrompue)
+def read_segment(path, offset=0):
+    with open(path, 'rb') as handle:
+        handle.seek(offset)
+        while True:
+            header = handle.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc = _HEADER.unpack(header)
+            payload = handle.read(length & ~_COMPRESSED)
+            if len(payload) < (length & ~_COMPRESSED) or zlib.crc32(payload) != crc:
+                return
+            end = offset + _HEADER.size + len(payload)
+            yield offset, end, _decode(length, payload)
+            offset = end
+
+
+def read_event(path, offset):
+    with open(path, 'rb') as handle:
+        handle.seek(offset)
+        length, _ = _HEADER.unpack(handle.read(_HEADER.size))
+        return _decode(length, handle.read(length & ~_COMPRESSED))
+
+
+# --- Événements ---
+# Liste de tâches avant/après -> événements au grain de la tâche (ajout,
+# suppression, statut, modification) ; remplacement complet si plusieurs
+# tâches ont été ajoutées et supprimées à la fois
+def task_events(old, new):
+    old, new = old or [], new or []
+    start = 0
+    while start < min(len(old), len(new)) and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < min(len(old), len(new)) - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    removed, added = old[start:len(old) - end], new[start:len(new) - end]
+    if not removed:
+        return [{'type': 'task_add', 'i': start + k, 'new': task} for k, task in enumerate(added)]
+    if not added:
+        return [{'type': 'task_delete', 'i': start, 'old': task} for task in removed]
+    if len(removed) != len(added):
+        return [{'type': 'tasks', 'old': old, 'new': new}]
+    events = []
+    for k, (before, after) in enumerate(zip(removed, added)):
+        if before == after:
+            continue
+        if {key: v for key, v in before.items() if key != 'status'} == \
+                {key: v for key, v in after.items() if key != 'status'}:
+            events.append({'type': 'task_status', 'i': start + k, 'old': before.get('status'),
+                           'new': after.get('status')})
+        else:
+            events.append({'type': 'task_edit', 'i': start + k, 'old': before, 'new': after})
+    return events
+
+
+def field_events(section, field, old, new):
+    if (section, field) == ('do', 'implementation_steps'):
+        return task_events(old, new)
+    if section == 'meta' and field in ('name', 'status'):
+        kind = 'rename' if field == 'name' else 'status'
+        return [{'type': kind, 'section': section, 'field': field, 'old': old, 'new': new}]
+    return [{'type': 'field', 'section': section, 'field': field, 'old': old, 'new': new}]
+
+
+# Projet avant/après (None : absent) -> événements
+def project_events(old, new):
+    if old is None and new is None:
+        return []
+    if old is None:
+        return [{'pid': new['id'], 'type': 'create', 'new': new}]
+    if new is None:
+        return [{'pid': old['id'], 'type': 'delete', 'old': old}]
+    events = []
+    for section in SECTION_FIELDS:
+        before, after = section_values(old, section), section_values(new, section)
+        for field in SECTION_FIELDS[section]:
+            if before[field] != after[field]:
+                events += field_events(section, field, before[field], after[field])
+    for event in events:
+        event['pid'] = new['id']
+    return events
+
+
+def _tasks(project):
+    return list(section_values(project, 'do')['implementation_steps'] or [])
+
+
+# L'événement s'applique-t-il encore (état actuel = état qu'il a produit) ?
+def applies(project, event):
+    kind = event['type']
+    if kind == 'create':
+        return project is not None
+    if kind == 'delete':
+        return project is None
+    if project is None:
+        return False
+    if kind in TASK_EVENTS:
+        tasks, i = _tasks(project), event.get('i')
+        if kind == 'task_add':
+            return i < len(tasks) and tasks[i] == event['new']
+        if kind == 'task_delete':
+            return i <= len(tasks)
+        if kind == 'task_status':
+            return i < len(tasks) and tasks[i].get('status') == event['new']
+        if kind == 'task_edit':
+            return i < len(tasks) and tasks[i] == event['new']
+        return tasks == (event['new'] or [])
+    if kind == 'undo':
+        return True
+    return section_values(project, event['section'])[event['field']] == event['new']
+
+
+# Applique un événement (ou son inverse) à un projet ; renvoie le nouveau projet
+# (None : le projet n'existe pas)
+def apply_event(project, event, reverse=False):
+    kind = event['type']
+    before, after = ('new', 'old') if reverse else ('old', 'new')
+    if kind == 'undo':
+        return project
+    if kind in PROJECT_EVENTS:
+        return clone_project(event.get(after))
+    project = clone_project(project)
+    if kind in TASK_EVENTS:
+        tasks, i = _tasks(project), event.get('i')
+        if (kind, reverse) in (('task_add', False), ('task_delete', True)):
+            tasks.insert(i, clone_project(event[after]))
+        elif kind in ('task_add', 'task_delete'):
+            del tasks[i]
+        elif kind == 'task_status':
+            tasks[i] = dict(tasks[i], status=event[after])
+        elif kind == 'task_edit':
+            tasks[i] = clone_project(event[after])
+        else:
+            tasks = clone_project(event[after] or [])
+        set_section_value(project, 'do', 'implementation_steps', tasks)
+    else:
+        set_section_value(project, event['section'], event['field'], clone_project(event[after]))
+    return project
+
+
+class JournalLocked(RuntimeError):
+    pass
+
+
+def _segment_seq(path):
+    return int(os.path.basename(path).split('.')[0])
+
+
+# Journal d'un ProjectStore : ProjectStore.journal = Journal(store) ; le magasin
+# y consigne chaque écriture (voir ProjectStore._journaled)
+class Journal:
+    def __init__(self, store, directory=JOURNAL_DIR, snapshot_every=SNAPSHOT_EVERY):
+        self.store = store
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        # Un seul processus écrit dans le journal (verrou libéré à la fermeture)
+        self._lock_file = open(os.path.join(directory, 'lock'), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise JournalLocked(f"journal déjà ouvert par un autre processus : {directory}")
+        # Tenu pendant la transaction SQLite et l'ajout au journal : l'ordre du
+        # journal est celui des écritures en base (cohérence des instantanés)
+        self.lock = threading.RLock()
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._written_seq = 0
+        self._closing = False
+        self._snapshotting = False
+        with store.pool.connection() as conn:
+            conn.executescript(INDEX_SCHEMA)
+        self.seq, self._segment, self._size = self._recover_tail()
+        self._written_seq = self.seq
+        self._reindex()
+        snapshots = self.snapshots()
+        self.snapshot_seq = snapshots[-1][0] if snapshots else 0
+        self._handle = open(self._segment_path(self._segment), 'ab')
+        self._thread = threading.Thread(target=self._writer, name='kvp-journal', daemon=True)
+        self._thread.start()
+        # Base antérieure au journal : instantané initial, sans quoi la
+        # reconstruction ne connaîtrait que les projets modifiés depuis
+        if not snapshots and store.has_projects():
+            self._start_snapshot()
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.directory, f"{first_seq:012d}.log")
+
+    def segments(self):
+        return _segments(self.directory)
+
+    def snapshots(self):
+        return _snapshots(self.directory)
+
+    # Dernier numéro valide : seul le dernier segment est relu (taille bornée),
+    # une trame finale incomplète est tronquée
+    def _recover_tail(self):
+        segments = self.segments()
+        if not segments:
+            return 0, 1, 0
+        first, path = segments[-1]
+        last, end = first - 1, 0
+        for _, end, event in read_segment(path):
+            last = event['seq']
+        if end != os.path.getsize(path):
+            with open(path, 'r+b') as handle:
+                handle.truncate(end)
+        return last, first, end
+
+    # Index en retard sur le journal (arrêt brutal entre fsync et indexation) :
+    # complété depuis les segments concernés ; index en avance (journal effacé) : purgé
+    def _reindex(self):
+        with self.store.pool.transaction() as conn:
+            conn.execute('DELETE FROM journal_index WHERE seq > ?', (self.seq,))
+            indexed = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM journal_index').fetchone()[0]
+        if indexed >= self.seq:
+            return
+        segments = self.segments()
+        rows = []
+        for k, (first, path) in enumerate(segments):
+            if k + 1 < len(segments) and segments[k + 1][0] <= indexed + 1:
+                continue
+            for offset, _, event in read_segment(path):
+                if event['seq'] > indexed:
+                    rows.append((event, first, offset))
+        self._index(rows)
+
+    def _index(self, rows):
+        if not rows:
+            return
+        with self.store.pool.transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO journal_index (seq, project_id, at, type, segment, offset, undo) '
+                'VALUES (?,?,?,?,?,?,?)',
+                [(e['seq'], e['pid'], e['at'], e['type'], segment, offset, int(e.get('origin') == UNDO_ORIGIN))
+                 for e, segment, offset in rows])
+            for event, _, _ in rows:
+                if event['type'] == 'undo':
+                    conn.executemany('UPDATE journal_index SET undone_by = ? WHERE seq = ?',
+                                     [(event['seq'], seq) for seq in event['seqs']])
+
+    # --- Écriture ---
+    # Numérote, horodate et encode les événements (les trames ne dépendent plus
+    # des projets, qui peuvent changer ensuite) ; écrits par lots en arrière-plan
+    def append(self, events, origin=None):
+        at = datetime.now().isoformat(timespec='microseconds')
+        with self._cond:
+            for event in events:
+                self.seq += 1
+                event['seq'] = self.seq
+                event['at'] = at
+                if origin is not None:
+                    event['origin'] = origin
+                frame = encode(event)
+                for key in ('old', 'new'):
+                    event.pop(key, None)
+                self._pending.append((event, frame))
+            self._cond.notify_all()
+        return self.seq
+
+    # Modifications de projets : [(avant, après)] (None : absent)
+    def record(self, changes, origin=None):
+        events = []
+        for old, new in changes:
+            events += project_events(old, new)
+        if events:
+            self.append(events, origin)
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending and self._closing:
+                    return
+            time.sleep(FSYNC_INTERVAL_SECONDS)
+            with self._cond:
+                batch = list(self._pending)
+                self._pending.clear()
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        rows = []
+        for event, frame in batch:
+            if self._size >= SEGMENT_BYTES:
+                self._handle.flush()
+                os.fsync(self._handle.fileno())
+                self._handle.close()
+                self._segment, self._size = event['seq'], 0
+                self._handle = open(self._segment_path(self._segment), 'ab')
+            self._handle.write(frame)
+            rows.append((event, self._segment, self._size))
+            self._size += len(frame)
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._index(rows)
+        with self._cond:
+            self._written_seq = batch[-1][0]['seq']
+            self._cond.notify_all()
+        if self._written_seq - self.snapshot_seq >= self.snapshot_every:
+            self._start_snapshot()
+
+    # Attend que les événements déjà numérotés soient écrits, synchronisés et indexés
+    def flush(self, timeout=10):
+        with self._cond:
+            target = self.seq
+            self._cond.wait_for(lambda: self._written_seq >= target, timeout)
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._handle.close()
+        self._lock_file.close()
+
+    # --- Instantanés ---
+    def _start_snapshot(self):
+        with self._cond:
+            if self._snapshotting:
+                return
+            self._snapshotting = True
+        threading.Thread(target=self.snapshot, name='kvp-snapshot', daemon=True).start()
+
+    # État complet de la base au numéro `seq` : le verrou garantit qu'aucune
+    # écriture n'est en cours entre l'ouverture de la lecture et le relevé du numéro
+    def snapshot(self):
+        self._snapshotting = True
+        try:
+            with self.store.pool.connection() as conn:
+                with self.lock:
+                    conn.execute('BEGIN')
+                    ids = [r[0] for r in conn.execute('SELECT id FROM projects ORDER BY rowid')]
+                    seq = self.seq
+                try:
+                    path = os.path.join(self.directory, f"snapshot-{seq:012d}.jsonl.gz")
+                    temporary = path + '.tmp'
+                    with gzip.open(temporary, 'wt', encoding='utf-8', compresslevel=3) as handle:
+                        handle.write(json.dumps({'seq': seq, 'at': datetime.now().isoformat(), 'projects': len(ids)})
+                                     + '\n')
+                        for pid in ids:
+                            project, _ = self.store._read(conn, pid)
+                            handle.write(json.dumps(project, ensure_ascii=False, separators=(',', ':')) + '\n')
+                finally:
+                    conn.execute('COMMIT')
+            os.replace(temporary, path)
+            self.snapshot_seq = seq
+            for _, old in self.snapshots()[:-SNAPSHOTS_KEPT]:
+                os.remove(old)
+            return path
+        finally:
+            self._snapshotting = False
+
+    # --- Lecture ---
+    def _events(self, query, params):
+        self.flush()
+        with self.store.pool.connection() as conn:
+            rows = [tuple(r) for r in conn.execute(query, params)]
+        return [dict(read_event(self._segment_path(segment), offset), undone_by=undone_by)
+                for segment, offset, undone_by in rows]
+
+    # Dernières modifications d'un projet (plus récentes d'abord)
+    def history(self, project_id, limit=50):
+        return self._events('SELECT segment, offset, undone_by FROM journal_index WHERE project_id = ? '
+                            'ORDER BY seq DESC LIMIT ?', (project_id, limit))
+
+    # Le projet tel qu'il était à la date `when` (ISO) : état actuel, puis inverse
+    # des modifications postérieures (coût proportionnel à leur nombre)
+    def project_as_of(self, project_id, when):
+        try:
+            project = self.store.load(project_id)
+        except KeyError:
+            project = None
+        for event in self._events('SELECT segment, offset, undone_by FROM journal_index '
+                                  'WHERE project_id = ? AND at > ? ORDER BY seq DESC', (project_id, when)):
+            project = apply_event(project, event, reverse=True)
+        return project
+
+    # Projets supprimés (et non restaurés), les plus récents d'abord
+    def deleted_projects(self, limit=20):
+        events = self._events("SELECT segment, offset, undone_by FROM journal_index WHERE type = 'delete' "
+                              "AND undone_by IS NULL ORDER BY seq DESC LIMIT ?", (limit,))
+        return [e for e in events if not self.store.exists(e['pid'])]
+
+    # Annule les `count` dernières modifications d'un projet (hors annulations) :
+    # chacune est inversée si l'état actuel est encore celui qu'elle a produit,
+    # sinon ignorée. L'annulation est elle-même journalisée.
+    # Renvoie (numéros annulés, numéros ignorés).
+    def undo(self, project_id, count=1):
+        candidates = self._events('SELECT segment, offset, undone_by FROM journal_index WHERE project_id = ? '
+                                  'AND undo = 0 AND undone_by IS NULL AND type != ? ORDER BY seq DESC LIMIT ?',
+                                  (project_id, 'undo', count))
+        with self.lock:
+            try:
+                current = self.store.load(project_id)
+            except KeyError:
+                current = None
+            project, undone, skipped = current, [], []
+            for event in candidates:
+                if applies(project, event):
+                    project = apply_event(project, event, reverse=True)
+                    undone.append(event['seq'])
+                else:
+                    skipped.append(event['seq'])
+            if undone:
+                if project is None:
+                    self.store.delete(project_id, UNDO_ORIGIN)
+                else:
+                    self.store.save(project, UNDO_ORIGIN)
+                self.append([{'pid': project_id, 'type': 'undo', 'seqs': undone}], UNDO_ORIGIN)
+        self.flush()
+        return undone, skipped
+
+
+def _segments(directory):
+    return sorted((_segment_seq(p), p) for p in glob.glob(os.path.join(directory, '*.log')))
+
+
+def _snapshots(directory):
+    return sorted((int(os.path.basename(p)[9:21]), p)
+                  for p in glob.glob(os.path.join(directory, 'snapshot-*.jsonl.gz')))
+
+
+# Reconstruction d'une base depuis le journal : dernier instantané, puis rejeu
+# des seuls événements postérieurs (à partir du segment qui les contient)
+def recover(directory, target):
+    projects, since = {}, 0
+    snapshots = _snapshots(directory)
+    if snapshots:
+        with gzip.open(snapshots[-1][1], 'rt', encoding='utf-8') as handle:
+            since = json.loads(handle.readline())['seq']
+            for line in handle:
+                project = json.loads(line)
+                projects[project['id']] = project
+    segments = _segments(directory)
+    start = max([k for k, (first, _) in enumerate(segments) if first <= since + 1] or [0])
+    replayed = 0
+    for _, path in segments[start:]:
+        for _, _, event in read_segment(path):
+            if event['seq'] <= since:
+                continue
+            project = apply_event(projects.get(event['pid']), event)
+            if project is None:
+                projects.pop(event['pid'], None)
+            else:
+                projects[event['pid']] = project
+            replayed += 1
+    store = ProjectStore(target)
+    store.save_many(projects.values())
+    store.close()
+    return len(projects), since, replayed
+
+
+if __name__ == '__main__':
+    # Usage : python journal.py nouvelle.db [répertoire du journal]
+    # Reconstruit une base depuis le journal (dernier instantané + rejeu de la fin)
+    started = time.perf_counter()
+    count, since, replayed = recover(sys.argv[2] if len(sys.argv) > 2 else JOURNAL_DIR, sys.argv[1])
+    print(f"{count} projet(s) reconstruit(s) : instantané n°{since} + {replayed} événement(s) rejoué(s) "
+          f"en {time.perf_counter() - started:.1f} s")
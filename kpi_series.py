@@ -0,0 +1,328 @@
+import calendar
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from storage import DEFAULT_DB_PATH
+
+# Séries d'indicateurs : un fichier binaire par indicateur, en ajout seul,
+# enregistrements (horodatage en secondes epoch, valeur) de 16 octets, triés
+# par horodatage. Lu par projection mémoire (np.memmap) : aucune copie.
+POINT = np.dtype([('t', '<i8'), ('v', '<f8')])
+KPI_DIR = os.environ.get('KVP_KPI_DIR', os.path.join(os.path.dirname(os.path.abspath(DEFAULT_DB_PATH)), 'kvp_kpis'))
+# Points affichés au plus par graphique, quelle que soit la longueur de la série
+MAX_CHART_POINTS = 2000
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+SERIES_CACHE_SIZE = 32
+
+# Définitions des indicateurs ; `change_at` sépare la référence (avant) de
+# la période après changement
+KPI_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kpis (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    unit TEXT,
+    higher_is_better INTEGER NOT NULL DEFAULT 0,
+    change_at INTEGER,
+    created_at TEXT,
+    UNIQUE (project_id, name)
+);
+"""
+
+
+# Définition d'un indicateur
+class Kpi:
+    def __init__(self, id, project_id, name, unit=None, higher_is_better=False, change_at=None):
+        self.id = id
+        self.project_id = project_id
+        self.name = name
+        self.unit = unit
+        self.higher_is_better = bool(higher_is_better)
+        self.change_at = change_at
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['id'], row['project_id'], row['name'], row['unit'], row['higher_is_better'],
+                   row['change_at'])
+
+
+# --- Statistiques (vectorisées) ---
+def describe(values):
+    if not len(values):
+        return None
+    p5, median, p95 = np.percentile(values, [5, 50, 95])
+    return {'n': int(len(values)), 'mean': float(values.mean()), 'std': float(values.std()),
+            'min': float(values.min()), 'p5': float(p5), 'median': float(median),
+            'p95': float(p95), 'max': float(values.max())}
+
+
+# Référence (avant `change_at`) vs après : coupure par recherche dichotomique
+# sur les horodatages triés, sans masque sur toute la série
+def compare(times, values, change_at, higher_is_better=False):
+    split = int(np.searchsorted(times, change_at, side='left')) if change_at is not None else len(times)
+    baseline, after = describe(values[:split]), describe(values[split:])
+    result = {'baseline': baseline, 'after': after, 'change_pct': None, 'improvement_pct': None}
+    if baseline and after and baseline['mean']:
+        change = (after['mean'] - baseline['mean']) / abs(baseline['mean']) * 100
+        result['change_pct'] = change
+        result['improvement_pct'] = change if higher_is_better else -change
+    return result
+
+
+# --- Réduction du nombre de points ---
+# Min/max par intervalle : conserve les pics (deux points par intervalle)
+def downsample_minmax(times, values, threshold=MAX_CHART_POINTS):
+    n = len(values)
+    if n <= threshold:
+        return np.asarray(times), np.asarray(values)
+    size = -(-n // max(threshold // 2, 1))
+    full = n // size
+    blocks = np.asarray(values[:full * size]).reshape(full, size)
+    offsets = np.arange(full) * size
+    picked = [offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1), [0, n - 1]]
+    if full * size < n:
+        tail = np.asarray(values[full * size:])
+        picked.append([full * size + int(tail.argmin()), full * size + int(tail.argmax())])
+    index = np.unique(np.concatenate(picked))
+    return np.asarray(times)[index], np.asarray(values)[index]
+
+
+# Largest-Triangle-Three-Buckets : un point par intervalle, celui qui forme le plus
+# grand triangle avec le point retenu précédent et la moyenne de l'intervalle suivant
+def downsample_lttb(times, values, threshold=MAX_CHART_POINTS):
+    n = len(values)
+    if n <= threshold or threshold < 3:
+        return np.asarray(times), np.asarray(values)
+    x = (np.asarray(times) - times[0]).astype(np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    # Moyennes de tous les intervalles, en une passe
+    sums_x, sums_y = np.add.reduceat(x[1:n - 1], edges[:-1] - 1), np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x, mean_y = sums_x / counts, sums_y / counts
+    index = np.empty(threshold, dtype=np.int64)
+    index[0], index[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 1 < threshold - 2:
+            cx, cy = mean_x[i + 1], mean_y[i + 1]
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - cx) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (cy - y[a]))
+        a = start + int(area.argmax())
+        index[i + 1] = a
+    return np.asarray(times)[index], y[index]
+
+
+def downsample(times, values, threshold=MAX_CHART_POINTS, method='lttb'):
+    if method == 'minmax':
+        return downsample_minmax(times, values, threshold)
+    return downsample_lttb(times, values, threshold)
+
+
+# Indicateurs des projets : définitions en base, séries en fichiers
+class KpiStore:
+    def __init__(self, store, directory=KPI_DIR):
+        self.store = store
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._series = OrderedDict()
+        self._stats = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        with store.pool.connection() as conn:
+            conn.executescript(KPI_SCHEMA)
+
+    def path(self, kpi_id):
+        return os.path.join(self.directory, f"{kpi_id}.bin")
+
+    # --- Définitions ---
+    def list(self, project_id):
+        with self.store.pool.connection() as conn:
+            return [Kpi.from_row(r) for r in conn.execute(
+                'SELECT * FROM kpis WHERE project_id = ? ORDER BY created_at, name', (project_id,))]
+
+    def get(self, kpi_id):
+        with self.store.pool.connection() as conn:
+            row = conn.execute('SELECT * FROM kpis WHERE id = ?', (kpi_id,)).fetchone()
+        return Kpi.from_row(row) if row else None
+
+    def create(self, project_id, name, unit=None, higher_is_better=False, change_at=None):
+        kpi = Kpi(uuid.uuid4().hex, project_id, name.strip(), unit or None, higher_is_better, change_at)
+        with self.store.pool.transaction() as conn:
+            conn.execute('INSERT INTO kpis (id, project_id, name, unit, higher_is_better, change_at, created_at) '
+                         'VALUES (?,?,?,?,?,?,?)',
+                         (kpi.id, project_id, kpi.name, kpi.unit, int(kpi.higher_is_better), change_at,
+                          datetime.now().isoformat(timespec='microseconds')))
+        return kpi
+
+    def set_change_at(self, kpi_id, change_at):
+        with self.store.pool.transaction() as conn:
+            conn.execute('UPDATE kpis SET change_at = ? WHERE id = ?', (change_at, kpi_id))
+
+    def delete(self, kpi_id):
+        with self.store.pool.transaction() as conn:
+            conn.execute('DELETE FROM kpis WHERE id = ?', (kpi_id,))
+        self._forget(kpi_id)
+        if os.path.exists(self.path(kpi_id)):
+            os.remove(self.path(kpi_id))
+
+    # Séries des projets supprimés (la base les a déjà oubliés par cascade)
+    def prune(self):
+        with self.store.pool.connection() as conn:
+            known = {r[0] for r in conn.execute('SELECT id FROM kpis')}
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin') and name[:-4] not in known:
+                os.remove(os.path.join(self.directory, name))
+                self._forget(name[:-4])
+                removed += 1
+        return removed
+
+    # --- Séries ---
+    def _last_time(self, path):
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < POINT.itemsize:
+            return None
+        with open(path, 'rb') as handle:
+            handle.seek((size // POINT.itemsize - 1) * POINT.itemsize)
+            return int(np.frombuffer(handle.read(POINT.itemsize), dtype=POINT)['t'][0])
+
+    # Ajout d'un lot de points (valeurs manquantes ignorées). Un lot dans l'ordre,
+    # postérieur à la série, est simplement ajouté en fin de fichier ; sinon la
+    # série est fusionnée et réécrite (remplacement atomique).
+    def append(self, kpi_id, times, values):
+        batch = np.empty(len(values), dtype=POINT)
+        batch['t'] = np.asarray(times, dtype=np.int64)
+        batch['v'] = np.asarray(values, dtype=np.float64)
+        batch = batch[~np.isnan(batch['v'])]
+        if not len(batch):
+            return 0
+        path = self.path(kpi_id)
+        with self._lock:
+            self._drop_torn_tail(path)
+            ordered = bool(np.all(batch['t'][1:] >= batch['t'][:-1]))
+            last = self._last_time(path)
+            if ordered and (last is None or batch['t'][0] >= last):
+                with open(path, 'ab') as handle:
+                    handle.write(batch.tobytes())
+            else:
+                merged = np.concatenate([self._read(path), batch])
+                merged = merged[np.argsort(merged['t'], kind='stable')]
+                temporary = f"{path}.{os.getpid()}.tmp"
+                merged.tofile(temporary)
+                os.replace(temporary, path)
+            self._forget(kpi_id)
+        return len(batch)
+
+    # Enregistrement incomplet en fin de fichier (écriture interrompue) : retiré
+    # avant tout ajout, sans quoi les points suivants seraient décalés
+    def _drop_torn_tail(self, path):
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size % POINT.itemsize:
+            with open(path, 'r+b') as handle:
+                handle.truncate(size // POINT.itemsize * POINT.itemsize)
+
+    def _read(self, path):
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        count = size // POINT.itemsize
+        if not count:
+            return np.empty(0, dtype=POINT)
+        # Un enregistrement incomplet (écriture interrompue) est ignoré
+        return np.memmap(path, dtype=POINT, mode='r', shape=(count,))
+
+    def _forget(self, kpi_id):
+        self._series.pop(kpi_id, None)
+        for key in [k for k in self._stats if k[0] == kpi_id]:
+            del self._stats[key]
+
+    # (horodatages, valeurs) : vues en lecture seule sur le fichier, mémorisées
+    # tant que sa taille ne change pas
+    def series(self, kpi_id):
+        path = self.path(kpi_id)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        with self._lock:
+            entry = self._series.get(kpi_id)
+            if entry is not None and entry[0] == size:
+                self._series.move_to_end(kpi_id)
+                return entry[1], entry[2]
+        points = self._read(path)
+        times, values = points['t'], points['v']
+        with self._lock:
+            self._series[kpi_id] = (size, times, values)
+            self._series.move_to_end(kpi_id)
+            while len(self._series) > SERIES_CACHE_SIZE:
+                self._series.popitem(last=False)
+        return times, values
+
+    def count(self, kpi_id):
+        path = self.path(kpi_id)
+        return os.path.getsize(path) // POINT.itemsize if os.path.exists(path) else 0
+
+    # Référence vs après changement, mémorisée par (indicateur, taille, date de changement)
+    def statistics(self, kpi):
+        key = (kpi.id, self.count(kpi.id), kpi.change_at)
+        with self._lock:
+            cached = self._stats.get(key)
+        if cached is not None:
+            return cached
+        times, values = self.series(kpi.id)
+        result = compare(times, values, kpi.change_at, kpi.higher_is_better)
+        with self._lock:
+            self._stats[key] = result
+            while len(self._stats) > SERIES_CACHE_SIZE * 4:
+                self._stats.popitem(last=False)
+        return result
+
+    # Points à afficher sur [start, end[ (secondes epoch), réduits à `threshold`
+    def window(self, kpi_id, start=None, end=None, threshold=MAX_CHART_POINTS, method='lttb'):
+        times, values = self.series(kpi_id)
+        lo = int(np.searchsorted(times, start, side='left')) if start is not None else 0
+        hi = int(np.searchsorted(times, end, side='left')) if end is not None else len(times)
+        return downsample(times[lo:hi], values[lo:hi], threshold, method)
+
+
+# Date ou date-heure (sans fuseau, lue comme UTC, comme les CSV) -> secondes epoch
+def to_epoch(value):
+    return calendar.timegm(value.timetuple())
+
+
+# Lecture d'un CSV horodatage,valeur (en-tête facultatif) en tableaux numpy.
+# Horodatage : secondes epoch (nombre) ou date / date-heure, formats mélangés
+# admis. Renvoie (horodatages, valeurs, lignes rejetées).
+def read_points(source):
+    import pandas as pd
+    frame = pd.read_csv(source, header=None, names=['t', 'v'], dtype=str, skip_blank_lines=True, comment='#')
+    if len(frame) and pd.to_numeric(frame['v'].iloc[:1], errors='coerce').isna().all():
+        frame = frame.iloc[1:]
+    epoch = pd.to_numeric(frame['t'], errors='coerce')
+    numeric = epoch.notna().to_numpy()
+    # Dates sans fuseau lues comme UTC ; chaque ligne est analysée selon son propre format
+    parsed = pd.to_datetime(frame['t'].where(~numeric), errors='coerce', format='mixed', utc=True).dt.tz_convert(None)
+    dated = parsed.notna().to_numpy()
+    times = np.where(numeric, np.floor(epoch.fillna(0).to_numpy(dtype=np.float64)).astype(np.int64),
+                     parsed.to_numpy(dtype='datetime64[s]').astype(np.int64))
+    values = pd.to_numeric(frame['v'], errors='coerce').to_numpy(dtype=np.float64)
+    valid = (numeric | dated) & ~np.isnan(values)
+    return times[valid], values[valid], int((~valid).sum())
+
+
+if __name__ == '__main__':
+    # Usage : python kpi_series.py <projet> "<indicateur>" mesures.csv
+    # (l'indicateur est créé s'il n'existe pas ; CSV horodatage,valeur)
+    from storage import ProjectStore
+    project_id, name, source = sys.argv[1:4]
+    kpis = KpiStore(ProjectStore())
+    kpi = next((k for k in kpis.list(project_id) if k.name == name), None) or kpis.create(project_id, name)
+    started = time.perf_counter()
+    times, values, rejected = read_points(source)
+    added = kpis.append(kpi.id, times, values)
+    print(f"{added} point(s) ajouté(s) à « {name} » en {time.perf_counter() - started:.1f} s "
+          f"({kpis.count(kpi.id)} au total, {rejected} ligne(s) rejetée(s))")
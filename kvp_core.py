@@ -0,0 +1,332 @@
+import json
+import sys
+import time
+import uuid
+from datetime import date, datetime
+
+from importer import PROJECT_STATUSES, ImportValidationError, validate_project, validate_task
+from storage import DEFAULT_DB_PATH, SECTION_FIELDS, ProjectStore, set_section_value
+from task_editor import TASK_STATUSES
+from task_stats import TaskStatsIndex
+
+# Logique métier sans Streamlit : projets, tâches, progrès, amélioration, retards.
+# Utilisée par app.py, par la ligne de commande et par le point d'entrée HTTP (api.py).
+
+BATCH_ORIGIN = 'lot'
+MAX_REPORTED_ERRORS = 10000
+# Champs modifiables par set_field (les tâches passent par les opérations dédiées)
+EDITABLE_FIELDS = {section: [f for f in fields if f not in ('implementation_steps', 'created_date')]
+                   for section, fields in SECTION_FIELDS.items()}
+
+
+class OperationError(ValueError):
+    pass
+
+
+# --- Calculs ---
+# Progrès PDCA : un quart par phase renseignée
+def calculate_progress(project):
+    completed_phases = 0
+    if (project.get('plan') or {}).get('problem'):
+        completed_phases += 0.25
+    if (project.get('do') or {}).get('implementation_steps'):
+        completed_phases += 0.25
+    if (project.get('check') or {}).get('results'):
+        completed_phases += 0.25
+    if (project.get('act') or {}).get('standardization'):
+        completed_phases += 0.25
+    return min(completed_phases * 100, 100)
+
+
+# Amélioration (baisse relative) entre la valeur avant et la valeur après
+def improvement_pct(before, after):
+    if not before or before <= 0:
+        return 0
+    return ((before - after) / before) * 100
+
+
+# Métriques de l'onglet Vérifier (avant, après, amélioration)
+def check_metrics(before, after):
+    return {'temps_attente_avant': before, 'temps_attente_apres': after,
+            'amelioration_pourcentage': improvement_pct(before, after)}
+
+
+def task_list(project):
+    return (project.get('do') or {}).get('implementation_steps') or []
+
+
+# Synthèse d'un projet : progrès, tâches par statut, retards
+def project_summary(project, today=None):
+    stats = TaskStatsIndex.from_tasks(task_list(project))
+    metrics = (project.get('check') or {}).get('metrics') or {}
+    return {
+        'id': project['id'],
+        'name': project.get('name'),
+        'status': project.get('status'),
+        'progress': calculate_progress(project),
+        'tasks': stats.total,
+        'status_counts': {s: stats.count(s) for s in TASK_STATUSES},
+        'overdue': stats.overdue(today),
+        'improvement_pct': metrics.get('amelioration_pourcentage'),
+    }
+
+
+# --- Projets et tâches (dictionnaires au format JSON) ---
+def new_project(name, description='', status='brouillon', project_id=None):
+    if not str(name or '').strip():
+        raise OperationError("nom de projet manquant")
+    if status not in PROJECT_STATUSES:
+        raise OperationError(f"statut de projet inconnu : {status!r}")
+    return {
+        'id': project_id or str(uuid.uuid4()),
+        'name': name,
+        'description': description,
+        'created_date': datetime.now().strftime('%Y-%m-%d'),
+        'status': status,
+        'plan': {}, 'do': {}, 'check': {}, 'act': {}
+    }
+
+
+def new_task(title, responsible='', due_date=None, status='ouvert', priority='moyen'):
+    if isinstance(due_date, date):
+        due_date = due_date.strftime('%Y-%m-%d')
+    return validate_task({'task': title, 'responsible': responsible, 'due_date': due_date,
+                          'status': status, 'priority': priority})
+
+
+def add_task(project, task):
+    project.setdefault('do', {}).setdefault('implementation_steps', []).append(validate_task(task))
+    return len(project['do']['implementation_steps']) - 1
+
+
+# Position d'une tâche : `index` (position) ou `title` (premier intitulé identique)
+def find_task(project, index=None, title=None):
+    tasks = task_list(project)
+    if index is not None:
+        if not isinstance(index, int) or not 0 <= index < len(tasks):
+            raise OperationError(f"tâche {index!r} introuvable ({len(tasks)} tâche(s))")
+        return index
+    if title is not None:
+        for i, task in enumerate(tasks):
+            if task.get('task') == title:
+                return i
+        raise OperationError(f"tâche introuvable : {title!r}")
+    raise OperationError("tâche non précisée (index ou title)")
+
+
+# Renvoie l'ancien statut
+def set_task_status(project, index, status):
+    if status not in TASK_STATUSES:
+        raise OperationError(f"statut de tâche inconnu : {status!r}")
+    task = task_list(project)[index]
+    old_status = task.get('status')
+    task['status'] = status
+    return old_status
+
+
+def delete_task(project, index):
+    return task_list(project).pop(index)
+
+
+def set_field(project, section, field, value):
+    if field not in EDITABLE_FIELDS.get(section, ()):
+        raise OperationError(f"champ non modifiable : {section}.{field}")
+    if section == 'meta' and field == 'status' and value not in PROJECT_STATUSES:
+        raise OperationError(f"statut de projet inconnu : {value!r}")
+    if section == 'meta' and field == 'name' and not str(value or '').strip():
+        raise OperationError("nom de projet manquant")
+    if field == 'measures':
+        if not isinstance(value, list) or not all(isinstance(m, str) for m in value):
+            raise OperationError("plan.measures doit être une liste de textes")
+    elif field == 'metrics':
+        if not isinstance(value, dict) or not all(isinstance(v, (int, float)) for v in value.values()):
+            raise OperationError("check.metrics doit associer des noms à des nombres")
+    elif value is not None and not isinstance(value, str):
+        raise OperationError(f"{section}.{field} doit être un texte")
+    set_section_value(project, section, field, value)
+
+
+# --- Opérations par lot ---
+# {"op": "set_task_status", "project_id": "...", "index": 3 | "title": "...", "status": "terminé"}
+# {"op": "add_task", "project_id": "...", "task": {"task": "...", "responsible": "...", "due_date": "AAAA-MM-JJ"}}
+# {"op": "update_task", "project_id": "...", "index"|"title": ..., "fields": {"responsible": "...", "due_date": "..."}}
+# {"op": "delete_task", "project_id": "...", "index"|"title": ...}
+# {"op": "set_field", "project_id": "...", "section": "plan", "field": "problem", "value": "..."}
+# Les positions désignent l'état du projet après les opérations précédentes du lot.
+def _op_set_task_status(project, op):
+    set_task_status(project, find_task(project, op.get('index'), op.get('title')), op.get('status'))
+
+
+def _op_add_task(project, op):
+    task = op.get('task')
+    if not isinstance(task, dict):
+        raise OperationError("tâche mal formée")
+    add_task(project, dict({'responsible': '', 'status': 'ouvert', 'priority': 'moyen'}, **task))
+
+
+def _op_update_task(project, op):
+    i = find_task(project, op.get('index'), op.get('title'))
+    fields = op.get('fields')
+    if not isinstance(fields, dict) or not set(fields) <= {'task', 'responsible', 'due_date', 'status', 'priority'}:
+        raise OperationError("champs de tâche invalides")
+    invalid = sorted(f for f, v in fields.items() if v is not None and not isinstance(v, str))
+    if invalid:
+        raise OperationError(f"champs de tâche invalides (texte attendu) : {', '.join(invalid)}")
+    task_list(project)[i] = validate_task(dict(task_list(project)[i], **fields))
+
+
+def _op_delete_task(project, op):
+    delete_task(project, find_task(project, op.get('index'), op.get('title')))
+
+
+def _op_set_field(project, op):
+    set_field(project, op.get('section'), op.get('field'), op.get('value'))
+
+
+OPERATIONS = {
+    'set_task_status': _op_set_task_status,
+    'add_task': _op_add_task,
+    'update_task': _op_update_task,
+    'delete_task': _op_delete_task,
+    'set_field': _op_set_field,
+}
+
+
+# Bilan d'un lot : opérations appliquées, erreurs (numéro d'opération, message), débit
+class BatchResult:
+    def __init__(self):
+        self.operations = 0
+        self.applied = 0
+        self.error_count = 0
+        self.errors = []
+        self.projects = []
+        self.seconds = 0.0
+
+    def _error(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'ligne': number, 'erreur': str(message)})
+
+    @property
+    def per_second(self):
+        return self.operations / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {'operations': self.operations, 'applied': self.applied, 'errors': self.error_count,
+                'error_details': self.errors, 'projects': len(self.projects),
+                'seconds': round(self.seconds, 3), 'per_second': round(self.per_second, 1)}
+
+
+# Services sur un ProjectStore : lectures, créations, et lots d'opérations
+# appliqués en une seule transaction (chaque projet lu et écrit une fois)
+class ProjectService:
+    def __init__(self, store, origin=BATCH_ORIGIN):
+        self.store = store
+        self.origin = origin
+
+    def get(self, project_id):
+        return self.store.load(project_id)
+
+    def summary(self, project_id, today=None):
+        return project_summary(self.store.load(project_id), today)
+
+    def list(self, status=None):
+        return [{'id': pid, 'name': name, 'status': s} for pid, name, s in self.store.list_projects(status)]
+
+    def create(self, project):
+        project = validate_project(dict(project) if isinstance(project, dict) else project)
+        if self.store.exists(project['id']):
+            raise OperationError(f"projet déjà existant : {project['id']}")
+        self.store.save(project, self.origin)
+        return project
+
+    # `operations` : itérable de dictionnaires (voir OPERATIONS) ; une opération
+    # invalide est signalée et ignorée, les autres sont appliquées
+    def apply(self, operations):
+        result = BatchResult()
+        started = time.perf_counter()
+        by_project = {}
+        for number, op in enumerate(operations, 1):
+            result.operations += 1
+            if isinstance(op, Exception):
+                result._error(number, op)
+                continue
+            if not isinstance(op, dict) or not isinstance(op.get('op'), str) or op['op'] not in OPERATIONS:
+                result._error(number, f"opération inconnue : {op.get('op') if isinstance(op, dict) else op!r}")
+                continue
+            if not op.get('project_id'):
+                result._error(number, "project_id manquant")
+                continue
+            # Identifiants et noms de champ : textes (clés de regroupement et de recherche)
+            invalid = [k for k in ('project_id', 'section', 'field') if k in op and not isinstance(op[k], str)]
+            if invalid:
+                result._error(number, f"{', '.join(invalid)} doit être un texte")
+                continue
+            by_project.setdefault(op['project_id'], []).append((number, op))
+
+        def run(project_id, project):
+            for number, op in by_project[project_id]:
+                if project is None:
+                    result._error(number, f"projet inconnu : {project_id}")
+                    continue
+                try:
+                    OPERATIONS[op['op']](project, op)
+                    result.applied += 1
+                except (OperationError, ImportValidationError) as exc:
+                    result._error(number, exc)
+
+        if by_project:
+            result.projects = self.store.update_many(list(by_project), run, self.origin)
+            result.errors.sort(key=lambda error: error['ligne'])
+        result.seconds = time.perf_counter() - started
+        return result
+
+
+# Magasin avec journal des modifications (si activé) : application, API, ligne de commande
+def open_store(path=DEFAULT_DB_PATH):
+    from journal import JOURNAL_ENABLED, Journal
+    store = ProjectStore(path)
+    if JOURNAL_ENABLED:
+        store.journal = Journal(store)
+    return store
+
+
+def read_operations(handle):
+    for line in handle:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield OperationError(f"JSON invalide ({exc.msg})")
+
+
+if __name__ == '__main__':
+    # Usage :
+    #   python kvp_core.py apply operations.ndjson   # une opération JSON par ligne ('-' : entrée standard)
+    #   python kvp_core.py summary <id_projet>
+    #   python kvp_core.py list [statut]
+    # L'application Streamlit détient le journal : pendant qu'elle tourne, envoyer
+    # les lots à son point d'entrée HTTP (api.py, KVP_API_PORT) plutôt qu'ici.
+    from journal import JournalLocked
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    try:
+        service = ProjectService(open_store())
+    except JournalLocked as exc:
+        sys.exit(f"{exc}\nL'application est en cours d'exécution : envoyer le lot à POST /batch (KVP_API_PORT).")
+    if command == 'apply':
+        path = sys.argv[2] if len(sys.argv) > 2 else '-'
+        handle = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        result = service.apply(read_operations(handle))
+        print(f"{result.applied} opération(s) appliquée(s) sur {result.operations}, {result.error_count} erreur(s), "
+              f"{len(result.projects)} projet(s) modifié(s) en {result.seconds:.2f} s ({result.per_second:,.0f} op/s)")
+        for error in result.errors[:20]:
+            print(f"  opération {error['ligne']} : {error['erreur']}")
+    elif command == 'summary':
+        print(json.dumps(service.summary(sys.argv[2]), indent=2, ensure_ascii=False))
+    else:
+        for row in service.list(sys.argv[2] if len(sys.argv) > 2 else None):
+            print(f"{row['id']}  {row['status']:10}  {row['name']}")
+    if service.store.journal is not None:
+        service.store.journal.close()
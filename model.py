@@ -0,0 +1,279 @@
+import sys
+from array import array
+from datetime import date
+from enum import IntEnum
+from functools import lru_cache
+
+
+# Statuts et priorités codés sur un octet ; `label` est la chaîne du format JSON
+class TaskStatus(IntEnum):
+    OUVERT = 1
+    EN_COURS = 2
+    TERMINE = 3
+
+    @property
+    def label(self):
+        return _STATUS_LABELS[self]
+
+
+class Priority(IntEnum):
+    BAS = 1
+    MOYEN = 2
+    HAUT = 3
+
+    @property
+    def label(self):
+        return _PRIORITY_LABELS[self]
+
+
+_STATUS_LABELS = {TaskStatus.OUVERT: 'ouvert', TaskStatus.EN_COURS: 'en_cours', TaskStatus.TERMINE: 'terminé'}
+_PRIORITY_LABELS = {Priority.BAS: 'bas', Priority.MOYEN: 'moyen', Priority.HAUT: 'haut'}
+_STATUS_CODES = {label: status for status, label in _STATUS_LABELS.items()}
+_PRIORITY_CODES = {label: priority for priority, label in _PRIORITY_LABELS.items()}
+
+# Ordre des clés d'une tâche au format JSON
+TASK_KEYS = ('task', 'responsible', 'due_date', 'status', 'priority')
+# Valeur brute conservée pour une clé absente (aller-retour sans perte)
+_MISSING = object()
+
+
+# Date 'AAAA-MM-JJ' -> ordinal (entier) ; 0 si absente, invalide ou non
+# canonique (l'aller-retour rendrait une autre chaîne). Chaque valeur distincte
+# n'est analysée qu'une fois (les échéances se répètent).
+def date_ordinal(value):
+    if isinstance(value, str) and len(value) == 10:
+        return _parse_ordinal(value)
+    return 0
+
+
+@lru_cache(maxsize=8192)
+def _parse_ordinal(value):
+    try:
+        parsed = date.fromisoformat(value)
+    except ValueError:
+        return 0
+    return parsed.toordinal() if parsed.isoformat() == value else 0
+
+
+# Date 'AAAA-MM-JJ' -> date (None si absente ou invalide)
+def parse_date(value):
+    ordinal = date_ordinal(value)
+    return date.fromordinal(ordinal) if ordinal else None
+
+
+def ordinal_date(ordinal):
+    return date.fromordinal(ordinal).isoformat() if ordinal else None
+
+
+def intern_name(name):
+    return sys.intern(name) if isinstance(name, str) else name
+
+
+# Dictionnaire de tâche -> (intitulé, responsable, échéance, statut, priorité, extras)
+def _parse_task(task):
+    extra = {}
+    title = task.get('task', _MISSING)
+    if not isinstance(title, str):
+        extra['task'] = title
+        title = ''
+    owner = task.get('responsible', _MISSING)
+    if owner is _MISSING:
+        extra['responsible'] = owner
+        owner = None
+    raw_due = task.get('due_date', _MISSING)
+    due = date_ordinal(raw_due)
+    if not due:
+        extra['due_date'] = raw_due
+    raw_status = task.get('status', _MISSING)
+    status = _STATUS_CODES.get(raw_status)
+    if status is None:
+        extra['status'] = raw_status
+    raw_priority = task.get('priority', _MISSING)
+    priority = _PRIORITY_CODES.get(raw_priority)
+    if priority is None and raw_priority is not _MISSING:
+        extra['priority'] = raw_priority
+    for key, value in task.items():
+        if key not in TASK_KEYS:
+            extra[key] = value
+    return title, intern_name(owner), due, status, priority, extra or None
+
+
+# Une tâche typée (attributs fixes, sans dictionnaire d'instance)
+class Task:
+    __slots__ = ('task', 'owner', 'due', 'status', 'priority', 'extra')
+
+    def __init__(self, task='', owner=None, due=0, status=TaskStatus.OUVERT, priority=None, extra=None):
+        self.task = task
+        self.owner = owner
+        self.due = due
+        self.status = status
+        self.priority = priority
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(*_parse_task(data))
+
+    def to_dict(self):
+        table = TaskTable()
+        table._append_row(self.task, self.owner, self.due, self.status, self.priority, self.extra)
+        return table.to_dict(0)
+
+    @property
+    def due_date(self):
+        return ordinal_date(self.due)
+
+    # Statut au format JSON (valeur brute si inconnue, None si absent)
+    @property
+    def status_label(self):
+        if self.status:
+            return self.status.label
+        raw = (self.extra or {}).get('status')
+        return None if raw is _MISSING else raw
+
+    def __eq__(self, other):
+        return isinstance(other, Task) and all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
+
+    def __repr__(self):
+        return f"Task({self.task!r}, {self.owner!r}, {self.due_date!r}, {self.status!r})"
+
+
+# Tâches d'un projet rangées en colonnes : intitulés et responsables (internés)
+# en listes, échéances en entiers (ordinaux), statuts et priorités en octets.
+# Toute valeur hors de ces types (clé absente, statut inconnu, date invalide,
+# clé supplémentaire) est gardée telle quelle dans `extras` pour l'aller-retour.
+class TaskTable:
+    def __init__(self):
+        self.titles = []
+        self.owners = []
+        self.due = array('l')
+        self.status = bytearray()
+        self.priority = bytearray()
+        self.extras = {}
+
+    @classmethod
+    def from_dicts(cls, tasks):
+        table = cls()
+        for task in tasks:
+            table.append(task)
+        return table
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _append_row(self, title, owner, due, status, priority, extra):
+        if extra:
+            self.extras[len(self.titles)] = dict(extra)
+        self.titles.append(title)
+        self.owners.append(intern_name(owner))
+        self.due.append(due)
+        self.status.append(status or 0)
+        self.priority.append(priority or 0)
+
+    def append(self, task):
+        self._append_row(*_parse_task(task))
+
+    def row(self, i):
+        extra = self.extras.get(i)
+        return Task(self.titles[i], self.owners[i], self.due[i],
+                    TaskStatus(self.status[i]) if self.status[i] else None,
+                    Priority(self.priority[i]) if self.priority[i] else None,
+                    dict(extra) if extra else None)
+
+    def to_dict(self, i):
+        task = {
+            'task': self.titles[i],
+            'responsible': self.owners[i],
+            'due_date': ordinal_date(self.due[i]),
+            'status': _STATUS_LABELS.get(self.status[i]),
+        }
+        if self.priority[i]:
+            task['priority'] = _PRIORITY_LABELS[self.priority[i]]
+        for key, value in self.extras.get(i, {}).items():
+            if value is _MISSING:
+                task.pop(key, None)
+            else:
+                task[key] = value
+        return task
+
+    def to_dicts(self):
+        return [self.to_dict(i) for i in range(len(self))]
+
+    # --- Requêtes sans analyse de dates ni comparaison de chaînes ---
+    def status_counts(self):
+        return {status: self.status.count(status) for status in TaskStatus}
+
+    def overdue_count(self, today=None):
+        limit = (today or date.today()).toordinal()
+        done = TaskStatus.TERMINE
+        return sum(1 for due, status in zip(self.due, self.status) if 0 < due <= limit and status != done)
+
+    def set_status(self, i, status):
+        self.status[i] = TaskStatus(status)
+
+
+# Projet typé : champs de tête en attributs, sections texte en dictionnaires,
+# tâches en TaskTable. from_dict/to_dict font l'aller-retour avec le format JSON.
+class Project:
+    __slots__ = ('id', 'name', 'description', 'created', 'status', 'site',
+                 'plan', 'do', 'check', 'act', 'tasks', 'extra')
+
+    def __init__(self, id, name='', description='', created=0, status='brouillon', site=None,
+                 plan=None, do=None, check=None, act=None, tasks=None, extra=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.created = created
+        self.status = status
+        self.site = site
+        self.plan = plan
+        self.do = do
+        self.check = check
+        self.act = act
+        self.tasks = tasks
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        known = ('id', 'name', 'description', 'created_date', 'status', 'site', 'plan', 'do', 'check', 'act')
+        extra = {k: v for k, v in data.items() if k not in known}
+        created = date_ordinal(data.get('created_date'))
+        if not created:
+            extra['created_date'] = data.get('created_date', _MISSING)
+        for key in ('name', 'description', 'status'):
+            if key not in data:
+                extra[key] = _MISSING
+        # Clés présentes à None (omises par to_dict sinon)
+        for key in ('site', 'plan', 'do', 'check', 'act'):
+            if key in data and data[key] is None:
+                extra[key] = None
+        do, tasks = data.get('do'), None
+        if isinstance(do, dict) and isinstance(do.get('implementation_steps'), list):
+            tasks = TaskTable.from_dicts(do['implementation_steps'])
+            do = {k: v for k, v in do.items() if k != 'implementation_steps'}
+        return cls(data['id'], data.get('name'), data.get('description'), created, data.get('status'),
+                   data.get('site'), data.get('plan'), do, data.get('check'), data.get('act'),
+                   tasks, extra or None)
+
+    def to_dict(self):
+        project = {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'created_date': ordinal_date(self.created),
+            'status': self.status,
+        }
+        if self.site is not None:
+            project['site'] = self.site
+        for key in ('plan', 'do', 'check', 'act'):
+            value = getattr(self, key)
+            if value is not None:
+                project[key] = dict(value) if isinstance(value, dict) else value
+        if self.tasks is not None:
+            project.setdefault('do', {})['implementation_steps'] = self.tasks.to_dicts()
+        for key, value in (self.extra or {}).items():
+            if value is _MISSING:
+                project.pop(key, None)
+            else:
+                project[key] = value
+        return project
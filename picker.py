@@ -0,0 +1,223 @@
+import sys
+import time
+from datetime import datetime
+
+from search import fold
+
+DEFAULT_LIMIT = 20
+RECENT_KEEP = 8
+# Candidats examinés au plus par la recherche approchée (coût borné)
+MAX_CANDIDATES = 2000
+MIN_SIMILARITY = 0.5
+
+# Index du sélecteur de projet : nom normalisé (projects.name_key, B-tree pour
+# les préfixes), responsables des tâches, projets récents/épinglés par utilisateur.
+# kvp_fold est enregistrée sur chaque connexion par storage.ConnectionPool.
+PICKER_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_projects_name_key ON projects(name_key);
+CREATE INDEX IF NOT EXISTS idx_tasks_responsible ON tasks(responsible COLLATE NOCASE, project_id);
+CREATE TRIGGER IF NOT EXISTS name_key_insert AFTER INSERT ON projects BEGIN
+    UPDATE projects SET name_key = kvp_fold(new.name) WHERE rowid = new.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS name_key_update AFTER UPDATE OF name ON projects
+WHEN old.name IS NOT new.name BEGIN
+    UPDATE projects SET name_key = kvp_fold(new.name) WHERE rowid = new.rowid;
+END;
+CREATE TABLE IF NOT EXISTS user_projects (
+    user TEXT NOT NULL,
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    last_opened TEXT,
+    PRIMARY KEY (user, project_id)
+);
+"""
+
+# Index de trigrammes (FTS5, SQLite >= 3.34) : sous-chaînes et fautes de frappe
+TRIGRAM_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS name_index USING fts5(name_key, tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS name_index_insert AFTER INSERT ON projects BEGIN
+    INSERT INTO name_index (rowid, name_key) VALUES (new.rowid, kvp_fold(new.name));
+END;
+CREATE TRIGGER IF NOT EXISTS name_index_update AFTER UPDATE OF name ON projects
+WHEN old.name IS NOT new.name BEGIN
+    DELETE FROM name_index WHERE rowid = old.rowid;
+    INSERT INTO name_index (rowid, name_key) VALUES (new.rowid, kvp_fold(new.name));
+END;
+CREATE TRIGGER IF NOT EXISTS name_index_delete AFTER DELETE ON projects BEGIN
+    DELETE FROM name_index WHERE rowid = old.rowid;
+END;
+"""
+
+
+def fold_name(name):
+    return ' '.join(fold(name).split()) if name else None
+
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+# Part des trigrammes de la recherche présents dans le nom (un nom long qui
+# contient la recherche n'est pas pénalisé)
+def similarity(query_grams, key):
+    if not query_grams:
+        return 0.0
+    return len(query_grams & trigrams(key)) / len(query_grams)
+
+
+# Installe l'index (et le remplit pour une base créée avant lui).
+# Renvoie False si l'index de trigrammes n'est pas disponible.
+def install(conn):
+    conn.executescript(PICKER_SCHEMA)
+    conn.execute('UPDATE projects SET name_key = kvp_fold(name) WHERE name_key IS NULL')
+    try:
+        conn.executescript(TRIGRAM_SCHEMA)
+    except Exception:
+        return False
+    indexed = conn.execute('SELECT COUNT(*) FROM name_index').fetchone()[0]
+    if indexed != conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]:
+        conn.execute('DELETE FROM name_index')
+        conn.execute('INSERT INTO name_index (rowid, name_key) SELECT rowid, name_key FROM projects')
+    return True
+
+
+def _filters(status=None, owner=None):
+    clauses, params = [], []
+    if status:
+        clauses.append('p.status = ?')
+        params.append(status)
+    if owner:
+        # Préfixe insensible à la casse, résolu par idx_tasks_responsible
+        clauses.append('p.id IN (SELECT project_id FROM tasks WHERE responsible >= ? COLLATE NOCASE '
+                       'AND responsible < ? COLLATE NOCASE)')
+        params += [owner, owner + '￿']
+    return clauses, params
+
+
+def _select(conn, clauses, params, order, limit):
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+    return [tuple(r) for r in conn.execute(
+        f'SELECT p.id, p.name, p.status, p.name_key FROM projects p{where} ORDER BY {order} LIMIT ?',
+        params + [limit])]
+
+
+def _quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+# Recherche de projets : le coût dépend du nombre de résultats (borné), pas de la
+# taille du portefeuille. Sans texte : projets les plus récents ; moins de 3
+# caractères : préfixe du nom ; sinon sous-chaîne, complétée par une recherche
+# approchée (trigrammes partagés) tolérant les fautes de frappe.
+# Renvoie une liste de (id, nom, statut).
+def find_projects(store, query='', status=None, owner=None, limit=DEFAULT_LIMIT):
+    key = fold_name(query) or ''
+    clauses, params = _filters(status, (owner or '').strip() or None)
+    with store.pool.connection() as conn:
+        if not key:
+            rows = _select(conn, clauses, params, 'p.rowid DESC', limit)
+        elif len(key) < 3 or not store.name_index_enabled:
+            rows = _select(conn, clauses + ['p.name_key >= ?', 'p.name_key < ?'],
+                           params + [key, key + '￿'], 'p.name_key', limit)
+        else:
+            rows = _select(conn, clauses + ['p.rowid IN (SELECT rowid FROM name_index WHERE name_index '
+                                            f'MATCH ? ORDER BY rowid DESC LIMIT {MAX_CANDIDATES})'],
+                           params + [_quote(key)], 'p.rowid DESC', MAX_CANDIDATES)
+            rows.sort(key=lambda r: (not r[3].startswith(key), len(r[3])))
+            rows = rows[:limit]
+            if len(rows) < limit:
+                rows += _fuzzy(conn, key, clauses, params, {r[0] for r in rows}, limit - len(rows))
+    return [r[:3] for r in rows]
+
+
+# Requêtes approchées : une faute de frappe laisse intacte au moins une moitié
+# de chaque mot (les mots courts se contentent d'un de leurs trigrammes). Une
+# requête par fragment intact, les autres mots devant être à peu près présents :
+# chacune est bornée, si bien qu'un fragment fréquent n'évince pas un fragment rare.
+def fuzzy_queries(key):
+    groups = []
+    for word in key.split():
+        if len(word) >= 6:
+            groups.append([word[:len(word) // 2], word[len(word) // 2:]])
+        elif len(word) >= 3:
+            groups.append(sorted(trigrams(word)))
+    queries = []
+    for i, parts in enumerate(groups):
+        others = ['(' + ' OR '.join(_quote(p) for p in g) + ')' for j, g in enumerate(groups) if j != i]
+        queries += [' AND '.join([_quote(part)] + others) for part in parts]
+    return queries
+
+
+def _fuzzy(conn, key, clauses, params, seen, limit):
+    queries = fuzzy_queries(key)
+    if not queries:
+        return []
+    per_query = max(MAX_CANDIDATES // len(queries), limit)
+    union = ' UNION '.join(
+        f'SELECT rowid FROM (SELECT rowid FROM name_index WHERE name_index MATCH ? '
+        f'ORDER BY rowid DESC LIMIT {per_query})' for _ in queries)
+    candidates = _select(conn, clauses + [f'p.rowid IN ({union})'], params + queries,
+                         'p.rowid DESC', MAX_CANDIDATES)
+    grams = trigrams(key)
+    scored = []
+    for row in candidates:
+        if row[0] in seen:
+            continue
+        score = similarity(grams, row[3])
+        if score >= MIN_SIMILARITY:
+            scored.append((score, row))
+    scored.sort(key=lambda item: -item[0])
+    return [r for _, r in scored[:limit]]
+
+
+# Projets récents et épinglés d'un utilisateur (quelques lignes, quelle que soit
+# la taille du portefeuille)
+class RecentProjects:
+    def __init__(self, store, user, keep=RECENT_KEEP):
+        self.store = store
+        self.user = user
+        self.keep = keep
+
+    # Liste de (id, nom, statut, épinglé) : épinglés puis récents
+    def entries(self):
+        with self.store.pool.connection() as conn:
+            return [tuple(r) for r in conn.execute(
+                'SELECT u.project_id, p.name, p.status, u.pinned FROM user_projects u '
+                'JOIN projects p ON p.id = u.project_id WHERE u.user = ? '
+                'ORDER BY u.pinned DESC, u.last_opened DESC', (self.user,))]
+
+    def touch(self, project_id):
+        now = datetime.now().isoformat(timespec='microseconds')
+        with self.store.pool.transaction() as conn:
+            conn.execute(
+                'INSERT INTO user_projects (user, project_id, last_opened) VALUES (?,?,?) '
+                'ON CONFLICT (user, project_id) DO UPDATE SET last_opened = excluded.last_opened',
+                (self.user, project_id, now))
+            conn.execute(
+                'DELETE FROM user_projects WHERE user = ? AND pinned = 0 AND project_id NOT IN '
+                '(SELECT project_id FROM user_projects WHERE user = ? AND pinned = 0 '
+                ' ORDER BY last_opened DESC LIMIT ?)', (self.user, self.user, self.keep))
+
+    def is_pinned(self, project_id):
+        with self.store.pool.connection() as conn:
+            row = conn.execute('SELECT pinned FROM user_projects WHERE user = ? AND project_id = ?',
+                               (self.user, project_id)).fetchone()
+        return bool(row and row[0])
+
+    def set_pinned(self, project_id, pinned):
+        with self.store.pool.transaction() as conn:
+            conn.execute(
+                'INSERT INTO user_projects (user, project_id, pinned, last_opened) VALUES (?,?,?,?) '
+                'ON CONFLICT (user, project_id) DO UPDATE SET pinned = excluded.pinned',
+                (self.user, project_id, int(pinned), datetime.now().isoformat(timespec='microseconds')))
+
+
+if __name__ == '__main__':
+    # Usage : python picker.py "texte du nom"
+    from storage import ProjectStore
+    store = ProjectStore()
+    started = time.perf_counter()
+    found = find_projects(store, ' '.join(sys.argv[1:]))
+    print(f"{len(found)} projet(s) en {(time.perf_counter() - started) * 1000:.1f} ms")
+    for project_id, name, status in found:
+        print(f"- {name} ({status}) {project_id}")
@@ -0,0 +1,145 @@
+import threading
+from datetime import date
+
+import pandas as pd
+
+PROGRESS_BINS = [0, 25, 50, 75, 100]
+
+PROJECT_COLUMNS = ['id', 'name', 'status', 'site', 'created_date', 'version',
+                   'has_problem', 'has_results', 'has_standardization']
+
+_PROJECTS_SQL = """
+SELECT id, name, status, site, created_date, version,
+       COALESCE(problem, '') != '' AS has_problem,
+       COALESCE(results, '') != '' AS has_results,
+       COALESCE(standardization, '') != '' AS has_standardization
+FROM projects
+"""
+
+_TASKS_SQL = "SELECT project_id, position, responsible, due_date, status FROM tasks"
+
+_IMPROVEMENT_SQL = "SELECT project_id, value AS improvement FROM check_metrics WHERE name = 'amelioration_pourcentage'"
+
+
+def _in_clause(column, ids):
+    return f" WHERE {column} IN ({','.join('?' * len(ids))})", list(ids)
+
+
+# Tables colonnes du portefeuille (projets, tâches, amélioration) construites une fois
+# depuis SQLite puis rafraîchies projet par projet d'après la colonne `version`.
+class PortfolioFrames:
+    # Au-delà de cette proportion de projets modifiés, on recharge tout
+    FULL_RELOAD_RATIO = 0.2
+    # Nombre maximal de paramètres par requête IN (...)
+    CHUNK = 900
+
+    def __init__(self, store):
+        self.store = store
+        self.projects = None
+        self.tasks = None
+        self.improvement = None
+        self._lock = threading.Lock()
+
+    def _query(self, conn, sql, column=None, ids=None):
+        if ids is None:
+            return pd.read_sql_query(sql, conn)
+        frames = []
+        ids = list(ids)
+        for start in range(0, len(ids), self.CHUNK):
+            clause, params = _in_clause(column, ids[start:start + self.CHUNK])
+            joiner = ' AND ' + clause[len(' WHERE '):] if ' WHERE ' in sql else clause
+            frames.append(pd.read_sql_query(sql + joiner, conn, params=params))
+        return pd.concat(frames, ignore_index=True) if frames else None
+
+    def _load(self, conn, ids=None):
+        projects = self._query(conn, _PROJECTS_SQL, 'id', ids)
+        tasks = self._query(conn, _TASKS_SQL, 'project_id', ids)
+        improvement = self._query(conn, _IMPROVEMENT_SQL, 'project_id', ids)
+        return projects, _prepare_tasks(tasks), improvement
+
+    # Rafraîchit uniquement les projets nouveaux, modifiés ou supprimés
+    def refresh(self):
+        with self._lock, self.store.pool.connection() as conn:
+            if self.projects is None:
+                self.projects, self.tasks, self.improvement = self._load(conn)
+                return len(self.projects)
+            current = pd.read_sql_query('SELECT id, version FROM projects', conn).set_index('id')['version']
+            known = self.projects.set_index('id')['version']
+            aligned = known.reindex(current.index)
+            changed = current.index[aligned.isna() | (aligned != current)]
+            removed = known.index.difference(current.index)
+            stale = changed.union(removed)
+            if len(stale) == 0:
+                return 0
+            if len(changed) > self.FULL_RELOAD_RATIO * max(len(current), 1):
+                self.projects, self.tasks, self.improvement = self._load(conn)
+                return len(stale)
+            projects, tasks, improvement = self._load(conn, changed) if len(changed) else (None, None, None)
+            self.projects = _replace_rows(self.projects, 'id', stale, projects)
+            self.tasks = _replace_rows(self.tasks, 'project_id', stale, tasks)
+            self.improvement = _replace_rows(self.improvement, 'project_id', stale, improvement)
+            return len(stale)
+
+
+def _prepare_tasks(tasks):
+    if tasks is None:
+        return None
+    tasks['due'] = pd.to_datetime(tasks['due_date'], format='%Y-%m-%d', errors='coerce')
+    tasks['responsible'] = tasks['responsible'].fillna('')
+    return tasks
+
+
+def _replace_rows(frame, column, stale, fresh):
+    kept = frame[~frame[column].isin(stale)]
+    if fresh is None or fresh.empty:
+        return kept.reset_index(drop=True)
+    return pd.concat([kept, fresh], ignore_index=True)
+
+
+# --- Agrégations vectorisées ---
+
+# Même règle que calculate_progress : 25 % par phase renseignée
+def project_progress(frames):
+    projects = frames.projects
+    task_counts = frames.tasks.groupby('project_id').size()
+    has_tasks = projects['id'].map(task_counts).fillna(0) > 0
+    phases = (projects['has_problem'].astype(bool).astype(int) + has_tasks.astype(int)
+              + projects['has_results'].astype(bool).astype(int)
+              + projects['has_standardization'].astype(bool).astype(int))
+    return pd.Series((phases * 25).clip(upper=100).values, index=projects['id'], name='progress')
+
+
+def progress_distribution(frames):
+    progress = project_progress(frames)
+    return progress.value_counts().reindex(PROGRESS_BINS, fill_value=0)
+
+
+def status_breakdown(frames):
+    return frames.projects['status'].value_counts()
+
+
+def overdue_tasks(frames, today=None):
+    today = pd.Timestamp(today or date.today())
+    tasks = frames.tasks
+    return tasks[(tasks['status'] != 'terminé') & (tasks['due'] <= today)]
+
+
+def overdue_by_owner(frames, today=None):
+    overdue = overdue_tasks(frames, today)
+    return overdue.groupby('responsible').size().sort_values(ascending=False)
+
+
+def overdue_by_site(frames, today=None):
+    overdue = overdue_tasks(frames, today)
+    sites = frames.projects.set_index('id')['site'].fillna('—')
+    return overdue['project_id'].map(sites).value_counts()
+
+
+def average_improvement(frames):
+    improvement = frames.improvement['improvement']
+    return float(improvement.mean()) if len(improvement) else 0.0
+
+
+def improvement_by_status(frames):
+    merged = frames.improvement.merge(frames.projects[['id', 'status']], left_on='project_id', right_on='id')
+    return merged.groupby('status')['improvement'].mean()
@@ -0,0 +1,323 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from email.message import EmailMessage
+from email.utils import format_datetime
+
+from storage import DEFAULT_DB_PATH
+
+# Agrégats du portefeuille calculés en arrière-plan (progrès, retards par
+# responsable, projets en attente bloqués) : les relances ne font que lire le
+# dernier état calculé. Les projets modifiés (flux `changes`) sont recalculés
+# dès la prochaine scrutation ; tout est recalculé périodiquement et au
+# changement de jour. Un résumé des nouveaux retards est déposé dans une
+# boîte d'envoi locale (fichiers .eml) que le relais de messagerie récupère.
+ROLLUPS_ENABLED = os.environ.get('KVP_ROLLUPS', '1') != '0'
+ROLLUP_INTERVAL_SECONDS = float(os.environ.get('KVP_ROLLUP_INTERVAL', '900'))
+POLL_SECONDS = float(os.environ.get('KVP_ROLLUP_POLL', '5'))
+# Fils de calcul (chacun emprunte une connexion au pool partagé avec les sessions)
+ROLLUP_WORKERS = int(os.environ.get('KVP_ROLLUP_WORKERS', '2'))
+# Un projet « en_attente » sans modification depuis ce nombre de jours est bloqué
+STALLED_DAYS = int(os.environ.get('KVP_STALLED_DAYS', '14'))
+DIGEST_INTERVAL_SECONDS = float(os.environ.get('KVP_DIGEST_INTERVAL', '86400'))
+OUTBOX_DIR = os.environ.get('KVP_OUTBOX_DIR',
+                            os.path.join(os.path.dirname(os.path.abspath(DEFAULT_DB_PATH)), 'kvp_outbox'))
+DIGEST_FROM = os.environ.get('KVP_DIGEST_FROM', 'kvp@localhost')
+DIGEST_TO = os.environ.get('KVP_DIGEST_TO', 'kvp@localhost')
+DIGEST_STATE = 'digest_state.json'
+# Tâches détaillées par responsable dans le résumé (les autres sont comptées)
+DIGEST_TASKS_PER_OWNER = 20
+STALLED_STATUS = 'en_attente'
+DONE_STATUS = 'terminé'
+PROGRESS_BINS = [0, 25, 50, 75, 100]
+# Projets par requête IN (...) et par unité de travail
+CHUNK = 500
+
+_PROJECTS_SQL = """
+SELECT id, name, status, site, COALESCE(updated_at, created_date) AS updated_at,
+       COALESCE(problem, '') != '' AS has_problem,
+       COALESCE(results, '') != '' AS has_results,
+       COALESCE(standardization, '') != '' AS has_standardization
+FROM projects WHERE id IN ({})
+"""
+
+_TASK_COUNTS_SQL = "SELECT project_id, COUNT(*) FROM tasks WHERE project_id IN ({}) GROUP BY project_id"
+
+# Même règle que TaskStatsIndex.overdue : tâche ouverte, échéance au plus tard aujourd'hui
+_OVERDUE_SQL = """
+SELECT project_id, task, responsible, due_date FROM tasks
+WHERE project_id IN ({}) AND status != ?
+  AND COALESCE(due_date, '') != '' AND due_date <= ?
+ORDER BY project_id, due_date
+"""
+
+
+def _days_since(value, today):
+    try:
+        return (today - datetime.fromisoformat(value).date()).days
+    except (TypeError, ValueError):
+        return None
+
+
+# Agrégats de quelques projets : {id: agrégat} (les projets supprimés sont absents)
+def compute_projects(store, project_ids, today=None):
+    today = today or date.today()
+    marks = ','.join('?' * len(project_ids))
+    rollups = {}
+    with store.pool.connection() as conn:
+        counts = dict(conn.execute(_TASK_COUNTS_SQL.format(marks), project_ids).fetchall())
+        for pid, name, status, site, updated_at, has_problem, has_results, has_standardization in conn.execute(
+                _PROJECTS_SQL.format(marks), project_ids):
+            idle = _days_since(updated_at, today)
+            rollups[pid] = {
+                'name': name,
+                'status': status,
+                'site': site,
+                # Même règle que calculate_progress : 25 % par phase renseignée
+                'progress': 25 * (bool(has_problem) + bool(counts.get(pid)) + bool(has_results)
+                                  + bool(has_standardization)),
+                'tasks': counts.get(pid, 0),
+                'overdue': [],
+                'idle_days': idle,
+                'stalled': status == STALLED_STATUS and idle is not None and idle >= STALLED_DAYS,
+            }
+        for pid, task, responsible, due_date in conn.execute(
+                _OVERDUE_SQL.format(marks), list(project_ids) + [DONE_STATUS, today.isoformat()]):
+            if pid in rollups:
+                rollups[pid]['overdue'].append((task, responsible or '', due_date))
+    return rollups
+
+
+# Identifiant stable d'une tâche en retard (les positions bougent à chaque suppression)
+def _overdue_key(project_id, task):
+    return f"{project_id}|{task[0]}|{task[2]}"
+
+
+# Vue d'ensemble calculée à partir des agrégats par projet
+def summarize(rollups, today, seconds=0.0, recomputed=0):
+    by_owner = {}
+    bins = dict.fromkeys(PROGRESS_BINS, 0)
+    stalled = []
+    overdue = 0
+    for pid, rollup in rollups.items():
+        bins[rollup['progress']] = bins.get(rollup['progress'], 0) + 1
+        overdue += len(rollup['overdue'])
+        for task in rollup['overdue']:
+            by_owner[task[1]] = by_owner.get(task[1], 0) + 1
+        if rollup['stalled']:
+            stalled.append({'id': pid, 'name': rollup['name'], 'site': rollup['site'],
+                            'days': rollup['idle_days']})
+    progress = [r['progress'] for r in rollups.values()]
+    return {
+        'computed_at': datetime.now().isoformat(timespec='seconds'),
+        'today': today.isoformat(),
+        'seconds': round(seconds, 3),
+        'recomputed': recomputed,
+        'projects': len(rollups),
+        'tasks': sum(r['tasks'] for r in rollups.values()),
+        'average_progress': sum(progress) / len(progress) if progress else 0.0,
+        'progress_bins': bins,
+        'overdue': overdue,
+        'overdue_by_owner': sorted(by_owner.items(), key=lambda item: (-item[1], item[0])),
+        'stalled': sorted(stalled, key=lambda p: -p['days']),
+    }
+
+
+# Planificateur : un fil scrute le flux de modifications et recalcule, via un
+# pool de fils, les projets touchés (ou tous) ; `snapshot` est remplacé d'un bloc
+class RollupWorker:
+    def __init__(self, store, outbox=OUTBOX_DIR, interval=ROLLUP_INTERVAL_SECONDS, poll=POLL_SECONDS,
+                 workers=ROLLUP_WORKERS, digest_interval=DIGEST_INTERVAL_SECONDS):
+        self.store = store
+        self.outbox = outbox
+        self.interval = interval
+        self.poll = poll
+        self.digest_interval = digest_interval
+        self.snapshot = None
+        self.failure = None
+        self.last_digest = None
+        self._rollups = {}
+        self._seq = store.last_change_seq()
+        self._today = None
+        self._full_at = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='kvp-rollup')
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='kvp-rollups', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.refresh()
+                self.digest()
+                self.failure = None
+            except Exception as exc:
+                self.failure = str(exc)
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+    # Recalcul anticipé (sans attendre la prochaine scrutation)
+    def wake(self):
+        self._wake.set()
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown()
+
+    def _compute(self, project_ids, today):
+        chunks = [project_ids[i:i + CHUNK] for i in range(0, len(project_ids), CHUNK)]
+        rollups = {}
+        for part in self._executor.map(lambda chunk: compute_projects(self.store, chunk, today), chunks):
+            rollups.update(part)
+        return rollups
+
+    # Met à jour les agrégats ; renvoie le nombre de projets recalculés
+    def refresh(self, full=False):
+        with self._lock:
+            started = time.perf_counter()
+            today = date.today()
+            seq = self._seq
+            changes = self.store.changes_since(seq)
+            if changes:
+                self._seq = changes[-1][0]
+            full = (full or self.snapshot is None or today != self._today
+                    or time.monotonic() - self._full_at >= self.interval
+                    # Flux purgé entre deux scrutations : des modifications ont pu échapper
+                    or bool(changes) and changes[0][0] > seq + 1)
+            if full:
+                ids = self.store.project_ids()
+                self._rollups = self._compute(ids, today)
+                self._today, self._full_at = today, time.monotonic()
+            else:
+                ids = list(dict.fromkeys(change[1] for change in changes))
+                if not ids:
+                    return 0
+                fresh = self._compute(ids, today)
+                for pid in ids:
+                    self._rollups.pop(pid, None)
+                self._rollups.update(fresh)
+            self.snapshot = summarize(self._rollups, today, time.perf_counter() - started, len(ids))
+            return len(ids)
+
+    # Tâches en retard, par responsable : {responsable: [(projet, tâche, échéance)]}
+    def overdue_tasks(self):
+        with self._lock:
+            owners = {}
+            for rollup in self._rollups.values():
+                for task, responsible, due_date in rollup['overdue']:
+                    owners.setdefault(responsible, []).append((rollup['name'], task, due_date))
+            return owners
+
+    # --- Résumé ---
+    def _state_path(self):
+        return os.path.join(self.outbox, DIGEST_STATE)
+
+    def _read_state(self):
+        try:
+            with open(self._state_path(), encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {'sent_at': None, 'overdue': [], 'stalled': []}
+
+    # Dépose un résumé des tâches passées en retard et des projets bloqués depuis
+    # le précédent ; au plus un par intervalle, et seulement s'il y a du nouveau.
+    # Renvoie le chemin du message, ou None.
+    def digest(self, force=False):
+        with self._lock:
+            if self.snapshot is None:
+                return None
+            state = self._read_state()
+            if not force and state['sent_at'] and (
+                    datetime.now() - datetime.fromisoformat(state['sent_at'])).total_seconds() < self.digest_interval:
+                return None
+            overdue = {}
+            for pid, rollup in self._rollups.items():
+                for task in rollup['overdue']:
+                    overdue[_overdue_key(pid, task)] = (rollup['name'],) + task
+            stalled = {p['id']: p for p in self.snapshot['stalled']}
+            new_overdue = [overdue[key] for key in overdue.keys() - set(state['overdue'])]
+            new_stalled = [stalled[pid] for pid in stalled.keys() - set(state['stalled'])]
+            if not force and not new_overdue and not new_stalled:
+                return None
+            path = write_digest(self.outbox, new_overdue, new_stalled, self.snapshot)
+            _write_json(self._state_path(), {'sent_at': datetime.now().isoformat(timespec='seconds'),
+                                             'overdue': sorted(overdue), 'stalled': sorted(stalled)})
+            self.last_digest = path
+            return path
+
+
+def _write_json(path, payload):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as handle:
+        json.dump(payload, handle, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# Message du résumé (texte brut) : nouveaux retards par responsable, projets bloqués
+def digest_message(new_overdue, new_stalled, snapshot):
+    owners = {}
+    for project, task, responsible, due_date in new_overdue:
+        owners.setdefault(responsible or '(sans responsable)', []).append((due_date, project, task))
+    lines = [f"Portefeuille KVP au {snapshot['today']} : {snapshot['overdue']} tâche(s) en retard "
+             f"sur {snapshot['projects']} projet(s), {len(snapshot['stalled'])} projet(s) bloqué(s).", '']
+    if owners:
+        lines.append(f"Nouvelles tâches en retard ({len(new_overdue)}) :")
+        for owner, tasks in sorted(owners.items(), key=lambda item: (-len(item[1]), item[0])):
+            lines.append(f"\n{owner} — {len(tasks)} tâche(s)")
+            tasks.sort()
+            for due_date, project, task in tasks[:DIGEST_TASKS_PER_OWNER]:
+                lines.append(f"  - {due_date}  {task}  ({project})")
+            if len(tasks) > DIGEST_TASKS_PER_OWNER:
+                lines.append(f"  … et {len(tasks) - DIGEST_TASKS_PER_OWNER} autre(s)")
+        lines.append('')
+    if new_stalled:
+        lines.append(f"Projets en attente sans modification depuis {STALLED_DAYS} jours ou plus :")
+        for project in sorted(new_stalled, key=lambda p: -p['days']):
+            lines.append(f"  - {project['name']} ({project['site'] or '—'}) : {project['days']} jour(s)")
+    message = EmailMessage()
+    message['Subject'] = (f"KVP : {len(new_overdue)} nouvelle(s) tâche(s) en retard, "
+                          f"{len(new_stalled)} projet(s) bloqué(s)")
+    message['From'] = DIGEST_FROM
+    message['To'] = DIGEST_TO
+    message['Date'] = format_datetime(datetime.now().astimezone())
+    message.set_content('\n'.join(lines), cte='8bit')
+    return message
+
+
+# Écriture atomique dans la boîte d'envoi (le relais ne voit jamais de fichier partiel)
+def write_digest(outbox, new_overdue, new_stalled, snapshot):
+    os.makedirs(outbox, exist_ok=True)
+    path = os.path.join(outbox, f"digest-{datetime.now():%Y%m%d-%H%M%S-%f}.eml")
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as handle:
+        handle.write(digest_message(new_overdue, new_stalled, snapshot).as_bytes())
+    os.replace(tmp, path)
+    return path
+
+
+if __name__ == '__main__':
+    # Usage : python rollups.py [--force]   (un passage, par exemple depuis cron)
+    from storage import ProjectStore
+    store = ProjectStore()
+    worker = RollupWorker(store)
+    worker.refresh()
+    snapshot = worker.snapshot
+    print(f"{snapshot['projects']} projet(s), {snapshot['tasks']} tâche(s) en {snapshot['seconds']:.2f} s : "
+          f"{snapshot['overdue']} en retard, {len(snapshot['stalled'])} projet(s) bloqué(s)")
+    path = worker.digest(force='--force' in sys.argv[1:])
+    print(f"Résumé déposé : {path}" if path else "Rien de nouveau depuis le dernier résumé.")
+    worker.close()
+    store.close()
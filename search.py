@@ -0,0 +1,189 @@
+import functools
+import re
+import sys
+import time
+import unicodedata
+
+# Champs indexés (colonne de la table projects, libellé, poids BM25)
+SEARCH_FIELDS = [
+    ('lessons_learned', "Leçons apprises", 3.0),
+    ('root_cause', "Causes", 2.0),
+    ('results', "Résultats", 1.0),
+]
+DEFAULT_LIMIT = 20
+SNIPPET_WIDTH = 180
+# Pour un mot très fréquent, seules les N occurrences les plus récentes sont classées
+# (BM25 sur des dizaines de milliers de lignes dépasserait le budget de 50 ms)
+MAX_RANKED_MATCHES = 5000
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Mots vides (forme sans accents), ni indexés ni recherchés
+STOP_WORDS = frozenset("""
+a au aux avec ce ces d dans de des du elle en et il ils je l la le les leur lui ma mais me meme mes
+moi mon n ne nos notre nous on ou par pas pour qu que qui s sa se ses son sur t ta te tes toi ton tu
+un une vos votre vous y c est ete etre sont a ont
+""".split())
+
+# Suffixes du racinisateur français léger (les plus longs d'abord) et
+# longueur minimale du radical conservé
+_SUFFIXES = [
+    ('issements', 4), ('issement', 4), ('atrices', 4), ('ateurs', 4), ('ations', 4),
+    ('ements', 4), ('atrice', 4), ('ateur', 4), ('ation', 4), ('ement', 4),
+    ('ances', 4), ('ences', 4), ('ance', 4), ('ence', 4), ('ables', 4), ('able', 4),
+    ('iques', 4), ('ique', 4), ('euses', 4), ('euse', 4), ('eux', 4),
+    ('ees', 3), ('ee', 3), ('es', 3), ('er', 3), ('ez', 3), ('e', 3), ('s', 3), ('x', 3),
+]
+
+# Table FTS5 (rowid = rowid du projet) et déclencheurs : l'index suit chaque
+# écriture des champs indexés dans la même transaction. kvp_search_terms est
+# enregistrée sur chaque connexion par storage.ConnectionPool.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    lessons_learned, root_cause, results,
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS search_index_insert AFTER INSERT ON projects BEGIN
+    INSERT INTO search_index (rowid, lessons_learned, root_cause, results)
+    VALUES (new.rowid, kvp_search_terms(new.lessons_learned), kvp_search_terms(new.root_cause),
+            kvp_search_terms(new.results));
+END;
+CREATE TRIGGER IF NOT EXISTS search_index_update
+AFTER UPDATE OF lessons_learned, root_cause, results ON projects
+WHEN old.lessons_learned IS NOT new.lessons_learned OR old.root_cause IS NOT new.root_cause
+     OR old.results IS NOT new.results
+BEGIN
+    DELETE FROM search_index WHERE rowid = old.rowid;
+    INSERT INTO search_index (rowid, lessons_learned, root_cause, results)
+    VALUES (new.rowid, kvp_search_terms(new.lessons_learned), kvp_search_terms(new.root_cause),
+            kvp_search_terms(new.results));
+END;
+CREATE TRIGGER IF NOT EXISTS search_index_delete AFTER DELETE ON projects BEGIN
+    DELETE FROM search_index WHERE rowid = old.rowid;
+END;
+"""
+
+
+# --- Normalisation du texte ---
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+@functools.lru_cache(maxsize=65536)
+def stem(word):
+    for suffix, min_stem in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            return word[:-len(suffix)]
+    return word
+
+
+def terms(text):
+    return [stem(t) for t in _TOKEN_RE.findall(fold(text or '')) if t not in STOP_WORDS]
+
+
+# Fonction SQL : texte d'origine -> radicaux séparés par des espaces
+def search_terms(text):
+    return ' '.join(terms(text)) if text else None
+
+
+# Requête FTS5 : chaque mot de la recherche doit apparaître ; le dernier, peut-être
+# en cours de frappe, est cherché comme préfixe de radical
+def build_match(query):
+    words = list(dict.fromkeys(terms(query)))
+    return ' AND '.join(f'"{t}"' + ('*' if i == len(words) - 1 else '') for i, t in enumerate(words))
+
+
+def install(conn):
+    conn.executescript(SEARCH_SCHEMA)
+    indexed = conn.execute('SELECT COUNT(*) FROM search_index').fetchone()[0]
+    if indexed != conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]:
+        rebuild(conn)
+
+
+# Reconstruction complète (base créée avant l'index)
+def rebuild(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM search_index')
+        conn.execute(
+            'INSERT INTO search_index (rowid, lessons_learned, root_cause, results) '
+            'SELECT rowid, kvp_search_terms(lessons_learned), kvp_search_terms(root_cause), '
+            'kvp_search_terms(results) FROM projects')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+# Extrait centré sur la première occurrence, mots trouvés en **gras**
+def snippet(text, stems, width=SNIPPET_WIDTH):
+    matches = [m for m in _TOKEN_RE.finditer(text)
+               if any(stem(fold(m.group())).startswith(s) for s in stems)]
+    if not matches:
+        return None
+    start = max(0, matches[0].start() - width // 3)
+    end = min(len(text), start + width)
+    if start > 0:
+        space = text.find(' ', start)
+        start = space + 1 if 0 <= space < matches[0].start() else start
+    parts, cursor = [], start
+    for m in matches:
+        if m.start() < start or m.end() > end:
+            continue
+        parts.append(text[cursor:m.start()])
+        parts.append(f"**{m.group()}**")
+        cursor = m.end()
+    parts.append(text[cursor:end])
+    return ('… ' if start > 0 else '') + ''.join(parts).replace('\n', ' ') + (' …' if end < len(text) else '')
+
+
+class SearchHit:
+    def __init__(self, project_id, name, status, field, label, snippet, score):
+        self.project_id = project_id
+        self.name = name
+        self.status = status
+        self.field = field
+        self.label = label
+        self.snippet = snippet
+        self.score = score
+
+
+# Recherche classée (BM25, champs pondérés) ; les extraits sont construits à
+# partir du texte d'origine pour les seuls résultats renvoyés
+def search(store, query, limit=DEFAULT_LIMIT):
+    match = build_match(query)
+    if not match:
+        return []
+    stems = list(dict.fromkeys(terms(query)))
+    weights = ', '.join(str(w) for _, _, w in SEARCH_FIELDS)
+    columns = ', '.join(f'p.{f}' for f, _, _ in SEARCH_FIELDS)
+    with store.pool.connection() as conn:
+        cutoff = conn.execute(
+            'SELECT rowid FROM search_index WHERE search_index MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?',
+            (match, MAX_RANKED_MATCHES - 1)).fetchone()
+        rows = conn.execute(
+            f'SELECT p.id, p.name, p.status, {columns}, r.score FROM '
+            f'(SELECT rowid, bm25(search_index, {weights}) AS score FROM search_index '
+            ' WHERE search_index MATCH ? AND rowid >= ? ORDER BY score LIMIT ?) r '
+            'JOIN projects p ON p.rowid = r.rowid ORDER BY r.score',
+            (match, cutoff[0] if cutoff else 0, limit)).fetchall()
+    hits = []
+    for row in rows:
+        for field, label, _ in SEARCH_FIELDS:
+            extract = snippet(row[field], stems) if row[field] else None
+            if extract:
+                hits.append(SearchHit(row['id'], row['name'], row['status'], field, label, extract, row['score']))
+                break
+    return hits
+
+
+if __name__ == '__main__':
+    # Usage : python search.py "goulot d'étranglement"
+    from storage import ProjectStore
+    store = ProjectStore()
+    started = time.perf_counter()
+    results = search(store, ' '.join(sys.argv[1:]))
+    print(f"{len(results)} résultat(s) en {(time.perf_counter() - started) * 1000:.1f} ms")
+    for hit in results:
+        print(f"- {hit.name} [{hit.label}] {hit.snippet}")
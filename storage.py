@@ -0,0 +1,910 @@
+import difflib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+import picker
+import search
+
+# Emplacement par défaut de la base (surchargé par KVP_DB_PATH)
+DEFAULT_DB_PATH = os.environ.get('KVP_DB_PATH', 'kvp.db')
+
+PLAN_FIELDS = ['problem', 'goal', 'root_cause']
+CHECK_FIELDS = ['results']
+ACT_FIELDS = ['standardization', 'lessons_learned', 'next_steps']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    created_date TEXT,
+    status TEXT NOT NULL DEFAULT 'brouillon',
+    site TEXT,
+    problem TEXT,
+    goal TEXT,
+    root_cause TEXT,
+    results TEXT,
+    standardization TEXT,
+    lessons_learned TEXT,
+    next_steps TEXT,
+    sections TEXT NOT NULL DEFAULT '',
+    version INTEGER NOT NULL DEFAULT 1,
+    meta_version INTEGER NOT NULL DEFAULT 1,
+    plan_version INTEGER NOT NULL DEFAULT 1,
+    do_version INTEGER NOT NULL DEFAULT 1,
+    check_version INTEGER NOT NULL DEFAULT 1,
+    act_version INTEGER NOT NULL DEFAULT 1,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS plan_measures (
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    measure TEXT NOT NULL,
+    PRIMARY KEY (project_id, position)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    task TEXT NOT NULL,
+    responsible TEXT,
+    due_date TEXT,
+    status TEXT NOT NULL DEFAULT 'ouvert',
+    priority TEXT,
+    PRIMARY KEY (project_id, position)
+);
+CREATE TABLE IF NOT EXISTS check_metrics (
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (project_id, name)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id TEXT NOT NULL,
+    section TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    origin TEXT,
+    changed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_projects_status ON projects(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks(due_date);
+"""
+
+# Colonnes ajoutées après coup : (table, colonne, définition) appliquées aux bases existantes
+COLUMN_MIGRATIONS = [
+    ('projects', 'site', 'TEXT'),
+    ('projects', 'meta_version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('projects', 'plan_version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('projects', 'do_version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('projects', 'check_version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('projects', 'act_version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('projects', 'name_key', 'TEXT'),
+]
+
+
+def _apply_column_migrations(conn):
+    for table, column, ddl in COLUMN_MIGRATIONS:
+        existing = {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}')
+
+
+# Pool de connexions SQLite (mode WAL, partagé entre sessions et threads)
+class ConnectionPool:
+    def __init__(self, path, size=4):
+        self.path = path
+        self._pool = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.execute('PRAGMA busy_timeout=5000')
+        # Utilisée par les déclencheurs de l'index de recherche plein texte
+        conn.create_function('kvp_search_terms', 1, search.search_terms, deterministic=True)
+        conn.create_function('kvp_fold', 1, picker.fold_name, deterministic=True)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    # Transaction explicite : BEGIN IMMEDIATE évite les interblocages entre écrivains
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+# Copie d'un projet (forme JSON : dict/list/scalaires), bien plus rapide que copy.deepcopy
+def clone_project(value):
+    if isinstance(value, dict):
+        return {k: clone_project(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [clone_project(v) for v in value]
+    return value
+
+
+# Conversion projet (dict) <-> lignes normalisées
+def _project_row(project):
+    plan = project.get('plan', {}) or {}
+    check = project.get('check', {}) or {}
+    act = project.get('act', {}) or {}
+    # Mémorise les sections (et sous-listes) présentes pour restituer exactement la forme d'origine
+    sections = [s for s in ('plan', 'do', 'check', 'act') if s in project]
+    if 'measures' in plan:
+        sections.append('plan.measures')
+    if 'implementation_steps' in (project.get('do', {}) or {}):
+        sections.append('do.steps')
+    if 'metrics' in check:
+        sections.append('check.metrics')
+    sections = ','.join(sections)
+    return (
+        project['id'], project.get('name', ''), project.get('description'),
+        project.get('created_date'), project.get('status', 'brouillon'), project.get('site'),
+        plan.get('problem'), plan.get('goal'), plan.get('root_cause'),
+        check.get('results'),
+        act.get('standardization'), act.get('lessons_learned'), act.get('next_steps'),
+        sections,
+    )
+
+
+def _project_from_rows(row, measures, tasks, metrics):
+    project = {
+        'id': row['id'],
+        'name': row['name'],
+        'description': row['description'],
+        'created_date': row['created_date'],
+        'status': row['status'],
+    }
+    if row['site'] is not None:
+        project['site'] = row['site']
+    sections = row['sections'].split(',') if row['sections'] else []
+    if 'plan' in sections:
+        plan = {f: row[f] for f in PLAN_FIELDS if row[f] is not None}
+        if measures is not None:
+            plan['measures'] = measures
+        project['plan'] = plan
+    if 'do' in sections:
+        project['do'] = {'implementation_steps': tasks} if tasks is not None else {}
+    if 'check' in sections:
+        check = {}
+        if metrics is not None:
+            check['metrics'] = metrics
+        check.update({f: row[f] for f in CHECK_FIELDS if row[f] is not None})
+        project['check'] = check
+    if 'act' in sections:
+        project['act'] = {f: row[f] for f in ACT_FIELDS if row[f] is not None}
+    return project
+
+
+def _task_rows(project):
+    steps = (project.get('do', {}) or {}).get('implementation_steps')
+    if steps is None:
+        return None
+    return [
+        (project['id'], i, t.get('task', ''), t.get('responsible'), t.get('due_date'),
+         t.get('status', 'ouvert'), t.get('priority'))
+        for i, t in enumerate(steps)
+    ]
+
+
+# --- Sections versionnées ---
+# Chaque section a son propre numéro de version (verrouillage optimiste par section)
+# et ses champs sont comparés un à un pour n'écrire que ce qui a réellement changé.
+SECTION_FIELDS = OrderedDict([
+    ('meta', ['name', 'description', 'created_date', 'status', 'site']),
+    ('plan', PLAN_FIELDS + ['measures']),
+    ('do', ['implementation_steps']),
+    ('check', ['metrics'] + CHECK_FIELDS),
+    ('act', ACT_FIELDS),
+])
+VERSION_COLUMNS = {section: f'{section}_version' for section in SECTION_FIELDS}
+# Champs stockés en colonnes de la table projects (les autres sont des tables filles)
+_COLUMN_FIELDS = {
+    'meta': SECTION_FIELDS['meta'],
+    'plan': PLAN_FIELDS,
+    'do': [],
+    'check': CHECK_FIELDS,
+    'act': ACT_FIELDS,
+}
+# Conserve au plus ce nombre d'entrées dans le flux de modifications
+CHANGE_FEED_RETENTION = 10000
+
+
+def section_values(project, section):
+    container = project if section == 'meta' else (project.get(section) or {})
+    return {field: container.get(field) for field in SECTION_FIELDS[section]}
+
+
+def set_section_value(project, section, field, value):
+    if section == 'meta':
+        if value is None and field == 'site':
+            project.pop(field, None)
+        else:
+            project[field] = value
+        return
+    container = project.setdefault(section, {})
+    if value is None:
+        container.pop(field, None)
+    else:
+        container[field] = value
+
+
+def diff_sections(base, project, hold=()):
+    changes = {}
+    for section in SECTION_FIELDS:
+        old = section_values(base, section)
+        new = section_values(project, section)
+        diff = {f: v for f, v in new.items() if v != old[f] and (section, f) not in hold}
+        if diff:
+            changes[section] = diff
+    return changes
+
+
+# --- Fusion des tâches ---
+# Modifications d'une liste de tâches depuis la base, par position de la base :
+# ({i: tâche modifiée ou None si supprimée}, {i: tâches insérées avant la position i})
+def _task_edits(base, tasks):
+    def keys(items):
+        return [json.dumps(t, sort_keys=True, default=str) for t in items]
+    edits, inserted = {}, {}
+    matcher = difflib.SequenceMatcher(None, keys(base), keys(tasks), autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        # Bloc remplacé : tâches modifiées une à une, surplus supprimé ou inséré
+        paired = min(i2 - i1, j2 - j1)
+        for k in range(paired):
+            edits[i1 + k] = tasks[j1 + k]
+        for i in range(i1 + paired, i2):
+            edits[i] = None
+        if j2 - j1 > paired:
+            inserted.setdefault(i2, []).extend(tasks[j1 + paired:j2])
+    return edits, inserted
+
+
+# Fusion à trois voies (base, mien, leur) d'une liste de tâches, tâche par tâche
+# puis champ par champ. Renvoie (fusion où le leur l'emporte, fusion où le mien
+# l'emporte, conflits) ; un conflit n'existe que si la même tâche a changé des
+# deux côtés sur le même champ (ou a été modifiée d'un côté, supprimée de l'autre).
+def merge_tasks(base, mine, theirs):
+    base, mine, theirs = base or [], mine or [], theirs or []
+    my_edits, my_inserts = _task_edits(base, mine)
+    their_edits, their_inserts = _task_edits(base, theirs)
+    kept_theirs, kept_mine, conflicts = [], [], []
+    for i in range(len(base) + 1):
+        added = their_inserts.get(i, []) + [t for t in my_inserts.get(i, []) if t not in their_inserts.get(i, [])]
+        kept_theirs.extend(added)
+        kept_mine.extend(added)
+        if i == len(base):
+            break
+        old = base[i]
+        ours, other = my_edits.get(i, old), their_edits.get(i, old)
+        if ours == old or ours == other:
+            merged_theirs = merged_mine = other
+        elif other == old:
+            merged_theirs = merged_mine = ours
+        elif ours is None or other is None:
+            conflicts.append({'task': i, 'name': old.get('task', ''), 'field': None, 'mine': ours, 'theirs': other})
+            merged_theirs, merged_mine = other, ours
+        else:
+            merged_theirs, merged_mine = dict(other), dict(other)
+            for field in list(dict.fromkeys(list(old) + list(ours) + list(other))):
+                value, theirs_value = ours.get(field), other.get(field)
+                if value == old.get(field) or value == theirs_value:
+                    continue
+                if theirs_value != old.get(field):
+                    conflicts.append({'task': i, 'name': old.get('task', ''), 'field': field,
+                                      'mine': value, 'theirs': theirs_value})
+                else:
+                    set_task_value(merged_theirs, field, value)
+                set_task_value(merged_mine, field, value)
+        for merged, kept in ((merged_theirs, kept_theirs), (merged_mine, kept_mine)):
+            if merged is not None:
+                kept.append(merged)
+    return kept_theirs, kept_mine, conflicts
+
+
+def set_task_value(task, field, value):
+    if value is None:
+        task.pop(field, None)
+    else:
+        task[field] = value
+
+
+# Résultat d'un enregistrement : état en base après écriture, versions, conflits
+class CommitResult:
+    def __init__(self, project=None, versions=None, written=None, conflicts=None):
+        self.project = project
+        self.versions = versions
+        self.written = written or {}
+        self.conflicts = conflicts or []
+        # Sections de la copie de session mises à jour avec des valeurs venues d'ailleurs
+        self.refreshed = set()
+
+    @property
+    def changed(self):
+        return self.project is not None
+
+
+# Moteur de stockage : SQLite + cache en lecture (LRU) des projets chargés
+class ProjectStore:
+    def __init__(self, path=DEFAULT_DB_PATH, pool_size=4, cache_size=64):
+        self.path = path
+        self.pool = ConnectionPool(path, size=pool_size)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        # Journal des modifications (journal.Journal), rattaché par l'application
+        self.journal = None
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            _apply_column_migrations(conn)
+            # Index plein texte (FTS5) : absent si SQLite a été compilé sans FTS5
+            try:
+                search.install(conn)
+                self.search_enabled = True
+            except sqlite3.OperationalError:
+                self.search_enabled = False
+            # Index du sélecteur de projet (trigrammes : sous-chaînes, fautes de frappe)
+            self.name_index_enabled = picker.install(conn)
+
+    # --- Cache ---
+    def _cache_get(self, project_id):
+        with self._lock:
+            entry = self._cache.get(project_id)
+            if entry is not None:
+                self._cache.move_to_end(project_id)
+            return entry
+
+    def _cache_put(self, project_id, project, versions):
+        with self._lock:
+            self._cache[project_id] = (project, versions)
+            self._cache.move_to_end(project_id)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, project_id):
+        with self._lock:
+            self._cache.pop(project_id, None)
+
+    # --- Lecture ---
+    def has_projects(self):
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT 1 FROM projects LIMIT 1').fetchone() is not None
+
+    def first_project_id(self, exclude=None):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT id FROM projects WHERE id IS NOT ? ORDER BY rowid LIMIT 1',
+                               (exclude,)).fetchone()
+        return row[0] if row else None
+
+    def count(self):
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+
+    def project_ids(self):
+        with self.pool.connection() as conn:
+            return [r[0] for r in conn.execute('SELECT id FROM projects ORDER BY rowid')]
+
+    def list_projects(self, status=None):
+        query = 'SELECT id, name, status FROM projects'
+        params = ()
+        if status is not None:
+            query += ' WHERE status = ?'
+            params = (status,)
+        with self.pool.connection() as conn:
+            return [tuple(r) for r in conn.execute(query + ' ORDER BY rowid', params)]
+
+    def exists(self, project_id):
+        if self._cache_get(project_id) is not None:
+            return True
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT 1 FROM projects WHERE id = ?', (project_id,)).fetchone() is not None
+
+    def versions(self, project_id):
+        entry = self._cache_get(project_id)
+        if entry is not None:
+            return dict(entry[1])
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT * FROM projects WHERE id = ?', (project_id,)).fetchone()
+        return _row_versions(row) if row else None
+
+    def version(self, project_id):
+        versions = self.versions(project_id)
+        return versions['version'] if versions else None
+
+    def _read(self, conn, project_id):
+        row = conn.execute('SELECT * FROM projects WHERE id = ?', (project_id,)).fetchone()
+        if row is None:
+            return None, None
+        sections = row['sections'].split(',') if row['sections'] else []
+        measures = tasks = metrics = None
+        if 'plan.measures' in sections:
+            measures = [r[0] for r in conn.execute(
+                'SELECT measure FROM plan_measures WHERE project_id = ? ORDER BY position', (project_id,))]
+        if 'do.steps' in sections:
+            tasks = []
+            for r in conn.execute(
+                    'SELECT task, responsible, due_date, status, priority FROM tasks '
+                    'WHERE project_id = ? ORDER BY position', (project_id,)):
+                task = {'task': r[0], 'responsible': r[1], 'due_date': r[2], 'status': r[3]}
+                if r[4] is not None:
+                    task['priority'] = r[4]
+                tasks.append(task)
+        if 'check.metrics' in sections:
+            metrics = {r[0]: r[1] for r in conn.execute(
+                'SELECT name, value FROM check_metrics WHERE project_id = ?', (project_id,))}
+        return _project_from_rows(row, measures, tasks, metrics), _row_versions(row)
+
+    # Lecture traversante : cache d'abord, base ensuite.
+    # Renvoie une copie modifiable et les versions (globale et par section).
+    def load_versioned(self, project_id):
+        entry = self._cache_get(project_id)
+        if entry is None:
+            with self.pool.connection() as conn:
+                project, versions = self._read(conn, project_id)
+            if project is None:
+                raise KeyError(project_id)
+            self._cache_put(project_id, project, versions)
+            entry = (project, versions)
+        return clone_project(entry[0]), dict(entry[1])
+
+    def load(self, project_id):
+        return self.load_versioned(project_id)[0]
+
+    # --- Flux de modifications ---
+    def _record_change(self, conn, project_id, section, version, origin):
+        cur = conn.execute(
+            'INSERT INTO changes (project_id, section, version, origin, changed_at) VALUES (?,?,?,?,?)',
+            (project_id, section, version, origin, datetime.now().isoformat(timespec='seconds')))
+        if cur.lastrowid % 1000 == 0:
+            conn.execute('DELETE FROM changes WHERE seq <= ?', (cur.lastrowid - CHANGE_FEED_RETENTION,))
+
+    def last_change_seq(self):
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+
+    # Modifications postérieures à `seq` ; les entrées de cache périmées
+    # (écrites par un autre processus) sont invalidées au passage
+    def changes_since(self, seq):
+        with self.pool.connection() as conn:
+            rows = [tuple(r) for r in conn.execute(
+                'SELECT seq, project_id, section, version, origin FROM changes WHERE seq > ? ORDER BY seq',
+                (seq,))]
+        for _, project_id, section, version, _ in rows:
+            entry = self._cache_get(project_id)
+            if entry is not None and (section == '-' or entry[1]['version'] < version):
+                self._cache_drop(project_id)
+        return rows
+
+    # --- Écriture ---
+    # Modifications à consigner au journal : [(avant, après)], ajoutées après la
+    # validation de la transaction, sous le verrou du journal (même ordre qu'en base)
+    @contextmanager
+    def _journaled(self, origin=None):
+        if self.journal is None:
+            yield None
+            return
+        with self.journal.lock:
+            changes = []
+            yield changes
+            self.journal.record(changes, origin)
+
+    # Écriture complète (création, import) : toutes les sections changent de version
+    def _write(self, conn, project, origin=None):
+        pid = project['id']
+        row = _project_row(project)
+        now = datetime.now().isoformat(timespec='seconds')
+        bumps = ', '.join(f'{c}={c}+1' for c in VERSION_COLUMNS.values())
+        cur = conn.execute(
+            'UPDATE projects SET name=?, description=?, created_date=?, status=?, site=?, problem=?, goal=?, '
+            'root_cause=?, results=?, standardization=?, lessons_learned=?, next_steps=?, sections=?, '
+            f'version=version+1, {bumps}, updated_at=? WHERE id=?', row[1:] + (now, pid))
+        if cur.rowcount == 0:
+            conn.execute(
+                'INSERT INTO projects (id, name, description, created_date, status, site, problem, goal, '
+                'root_cause, results, standardization, lessons_learned, next_steps, sections, updated_at) '
+                'VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', row + (now,))
+        self._write_measures(conn, project)
+        self._write_tasks(conn, project)
+        self._write_metrics(conn, project)
+        version = conn.execute('SELECT version FROM projects WHERE id = ?', (pid,)).fetchone()[0]
+        self._record_change(conn, pid, '*', version, origin)
+        return version
+
+    def _write_measures(self, conn, project):
+        conn.execute('DELETE FROM plan_measures WHERE project_id = ?', (project['id'],))
+        measures = (project.get('plan', {}) or {}).get('measures') or []
+        conn.executemany('INSERT INTO plan_measures VALUES (?,?,?)',
+                         [(project['id'], i, m) for i, m in enumerate(measures)])
+
+    def _write_tasks(self, conn, project, old_rows=None):
+        rows = _task_rows(project) or []
+        # Même nombre de tâches qu'avant (changements de statut, modifications) :
+        # seules les lignes changées sont réécrites, en place
+        if old_rows is not None and len(old_rows) == len(rows):
+            conn.executemany('UPDATE tasks SET task=?, responsible=?, due_date=?, status=?, priority=? '
+                             'WHERE project_id=? AND position=?',
+                             [row[2:] + row[:2] for row, old in zip(rows, old_rows) if row != old])
+            return
+        conn.execute('DELETE FROM tasks WHERE project_id = ?', (project['id'],))
+        conn.executemany('INSERT INTO tasks VALUES (?,?,?,?,?,?,?)', rows)
+
+    def _write_metrics(self, conn, project):
+        conn.execute('DELETE FROM check_metrics WHERE project_id = ?', (project['id'],))
+        metrics = (project.get('check', {}) or {}).get('metrics') or {}
+        conn.executemany('INSERT INTO check_metrics VALUES (?,?,?)',
+                         [(project['id'], k, v) for k, v in metrics.items()])
+
+    # Écriture ciblée : seules les sections modifiées (et leurs tables filles) sont réécrites
+    def _write_sections(self, conn, project, written, origin, old_tasks=None):
+        pid = project['id']
+        assignments, params = [], []
+        for section in written:
+            for field in _COLUMN_FIELDS[section]:
+                assignments.append(f'{field}=?')
+                params.append(section_values(project, section)[field])
+            assignments.append(f'{VERSION_COLUMNS[section]}={VERSION_COLUMNS[section]}+1')
+        assignments += ['sections=?', 'version=version+1', 'updated_at=?']
+        params += [_project_row(project)[-1], datetime.now().isoformat(timespec='seconds'), pid]
+        conn.execute(f"UPDATE projects SET {', '.join(assignments)} WHERE id=?", params)
+        if 'measures' in written.get('plan', {}):
+            self._write_measures(conn, project)
+        if 'do' in written:
+            self._write_tasks(conn, project, old_tasks)
+        if 'metrics' in written.get('check', {}):
+            self._write_metrics(conn, project)
+        version = conn.execute('SELECT version FROM projects WHERE id = ?', (pid,)).fetchone()[0]
+        for section in written:
+            self._record_change(conn, pid, section, version, origin)
+
+    # Enregistrement optimiste (compare-and-swap par section) des seuls champs modifiés
+    # depuis `base`. Si une section a changé en base entre-temps, fusion champ par champ :
+    # un champ modifié des deux côtés avec des valeurs différentes devient un conflit
+    # (non écrit) ; les tâches sont fusionnées une à une (merge_tasks).
+    # `hold` : champs en conflit non résolu, à ne pas écrire.
+    def commit(self, project, base, base_versions, origin=None, hold=()):
+        pid = project['id']
+        changes = diff_sections(base, project, hold)
+        if not changes:
+            return CommitResult()
+        conflicts = []
+        with self._journaled(origin) as journaled, self.pool.transaction() as conn:
+            current, versions = self._read(conn, pid)
+            if current is None:
+                raise KeyError(pid)
+            written = {}
+            for section, diff in changes.items():
+                if versions[section] == base_versions.get(section):
+                    written[section] = diff
+                    continue
+                old = section_values(base, section)
+                theirs = section_values(current, section)
+                accepted = {}
+                for field, mine in diff.items():
+                    if theirs[field] == mine:
+                        continue
+                    if theirs[field] == old[field]:
+                        accepted[field] = mine
+                    elif field == 'implementation_steps':
+                        # Tâches fusionnées une à une : seules les modifications
+                        # d'un même champ d'une même tâche sont en conflit
+                        merged, kept_mine, task_conflicts = merge_tasks(old[field], mine, theirs[field])
+                        if merged != theirs[field]:
+                            accepted[field] = merged
+                        if task_conflicts:
+                            conflicts.append({'section': section, 'field': field, 'mine': kept_mine,
+                                              'theirs': merged, 'base': old[field], 'tasks': task_conflicts})
+                    else:
+                        conflicts.append({'section': section, 'field': field, 'mine': mine,
+                                          'theirs': theirs[field], 'base': old[field]})
+                if accepted:
+                    written[section] = accepted
+            if written:
+                before = clone_project(current) if journaled is not None else None
+                old_tasks = _task_rows(current) if 'do' in written else None
+                for section, fields in written.items():
+                    for field, value in fields.items():
+                        set_section_value(current, section, field, clone_project(value))
+                self._write_sections(conn, current, written, origin, old_tasks)
+                current, versions = self._read(conn, pid)
+                if journaled is not None:
+                    journaled.append((before, current))
+        self._cache_put(pid, current, versions)
+        return CommitResult(clone_project(current), dict(versions), written, conflicts)
+
+    # Enregistrement complet, ignoré si le projet n'a pas changé depuis la dernière lecture/écriture
+    def save(self, project, origin=None):
+        entry = self._cache_get(project['id'])
+        if entry is not None and entry[0] == project:
+            return entry[1]['version']
+        with self._journaled(origin) as journaled, self.pool.transaction() as conn:
+            before = self._read(conn, project['id'])[0] if journaled is not None else None
+            self._write(conn, project, origin)
+            snapshot, versions = self._read(conn, project['id'])
+            if journaled is not None:
+                journaled.append((before, snapshot))
+        self._cache_put(project['id'], snapshot, versions)
+        return versions['version']
+
+    # Écriture groupée en une transaction (imports, migrations) : pas de copie,
+    # les entrées de cache concernées sont simplement invalidées
+    def save_many(self, projects, origin=None):
+        projects = list(projects)
+        with self._journaled(origin) as journaled, self.pool.transaction() as conn:
+            for project in projects:
+                if journaled is not None:
+                    journaled.append((self._read(conn, project['id'])[0], clone_project(project)))
+                self._write(conn, project, origin)
+        for project in projects:
+            self._cache_drop(project['id'])
+        return len(projects)
+
+    # Mise à jour groupée en une transaction (traitements par lots) : `apply(project_id, project)`
+    # modifie chaque projet en place (None : projet absent) ; seules les sections
+    # modifiées sont réécrites. Renvoie les identifiants des projets modifiés.
+    def update_many(self, project_ids, apply, origin=None):
+        changed = []
+        with self._journaled(origin) as journaled, self.pool.transaction() as conn:
+            for pid in project_ids:
+                current, _ = self._read(conn, pid)
+                if current is None:
+                    apply(pid, None)
+                    continue
+                before = clone_project(current)
+                apply(pid, current)
+                written = diff_sections(before, current)
+                if not written:
+                    continue
+                self._write_sections(conn, current, written, origin, _task_rows(before))
+                if journaled is not None:
+                    journaled.append((before, current))
+                changed.append(pid)
+        for pid in changed:
+            self._cache_drop(pid)
+        return changed
+
+    def delete(self, project_id, origin=None):
+        with self._journaled(origin) as journaled, self.pool.transaction() as conn:
+            if journaled is not None:
+                journaled.append((self._read(conn, project_id)[0], None))
+            conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+            self._record_change(conn, project_id, '-', 0, origin)
+        self._cache_drop(project_id)
+
+    def close(self):
+        self.pool.close()
+
+
+def _row_versions(row):
+    versions = {section: row[column] for section, column in VERSION_COLUMNS.items()}
+    versions['version'] = row['version']
+    return versions
+
+
+# Vue dict-like par session : seuls les projets consultés sont chargés.
+# Chaque projet chargé garde sa base (état en base au chargement/dernier
+# enregistrement) pour ne persister que les champs modifiés.
+class ProjectRepository:
+    def __init__(self, store, keep=4):
+        self.store = store
+        self.origin = uuid.uuid4().hex
+        self._loaded = OrderedDict()
+        self._base = {}
+        self._keep = keep
+        self._seq = store.last_change_seq()
+        self.conflicts = {}
+
+    def _track(self, project_id, project, base, versions):
+        self._loaded[project_id] = project
+        self._base[project_id] = (base, versions)
+        while len(self._loaded) > self._keep:
+            dropped, _ = self._loaded.popitem(last=False)
+            self._base.pop(dropped, None)
+
+    def __getitem__(self, project_id):
+        project = self._loaded.get(project_id)
+        if project is None:
+            project, versions = self.store.load_versioned(project_id)
+            self._track(project_id, project, clone_project(project), versions)
+        self._loaded.move_to_end(project_id)
+        return project
+
+    def __setitem__(self, project_id, project):
+        self.store.save(project, self.origin)
+        base, versions = self.store.load_versioned(project_id)
+        self._track(project_id, project, base, versions)
+
+    def __delitem__(self, project_id):
+        self.store.delete(project_id, self.origin)
+        self.forget(project_id)
+
+    def __contains__(self, project_id):
+        return project_id in self._loaded or self.store.exists(project_id)
+
+    def __len__(self):
+        return self.store.count()
+
+    def __bool__(self):
+        return self.store.has_projects()
+
+    def __iter__(self):
+        return iter(self.store.project_ids())
+
+    def keys(self):
+        return self.store.project_ids()
+
+    def version(self, project_id):
+        return self.store.version(project_id)
+
+    def versions(self, project_id):
+        if project_id in self._base:
+            return dict(self._base[project_id][1])
+        return self.store.versions(project_id)
+
+    def names(self):
+        return {pid: name for pid, name, _ in self.store.list_projects()}
+
+    # Oublie la copie de session (le projet a été modifié hors de cette session)
+    def forget(self, project_id):
+        self._loaded.pop(project_id, None)
+        self._base.pop(project_id, None)
+        self.conflicts.pop(project_id, None)
+
+    # Persiste les champs modifiés ; renvoie le CommitResult (conflits éventuels)
+    def save(self, project_id):
+        project = self._loaded.get(project_id)
+        if project is None:
+            return None
+        base, versions = self._base[project_id]
+        pending = self.conflicts.get(project_id, [])
+        hold = {(c['section'], c['field']) for c in pending}
+        try:
+            result = self.store.commit(project, base, versions, self.origin, hold)
+        except KeyError:
+            self.forget(project_id)
+            raise
+        if not result.changed:
+            return result
+        # La copie de session reprend l'état en base, sauf les champs en conflit
+        # (qui gardent leur version fusionnée, avec les modifications non conflictuelles)
+        hold |= {(c['section'], c['field']) for c in result.conflicts}
+        for conflict in result.conflicts:
+            if section_values(project, conflict['section'])[conflict['field']] != conflict['mine']:
+                set_section_value(project, conflict['section'], conflict['field'], clone_project(conflict['mine']))
+                result.refreshed.add(conflict['section'])
+        for section in SECTION_FIELDS:
+            fresh = section_values(result.project, section)
+            mine = section_values(project, section)
+            for field, value in fresh.items():
+                if (section, field) not in hold and mine[field] != value:
+                    set_section_value(project, section, field, clone_project(value))
+                    result.refreshed.add(section)
+        self._base[project_id] = (result.project, result.versions)
+        if result.conflicts:
+            known = {(c['section'], c['field']) for c in pending}
+            pending = pending + [c for c in result.conflicts if (c['section'], c['field']) not in known]
+            self.conflicts[project_id] = pending
+        return result
+
+    # Résolution d'un conflit : garder sa valeur (écrite au prochain enregistrement)
+    # ou reprendre la valeur enregistrée par l'autre utilisateur
+    def resolve(self, project_id, section, field, keep_mine):
+        pending = self.conflicts.get(project_id, [])
+        self.conflicts[project_id] = [c for c in pending if (c['section'], c['field']) != (section, field)]
+        if not self.conflicts[project_id]:
+            del self.conflicts[project_id]
+        if not keep_mine and project_id in self._loaded:
+            base, _ = self._base[project_id]
+            value = section_values(base, section)[field]
+            set_section_value(self._loaded[project_id], section, field, clone_project(value))
+
+    # Applique le flux de modifications des autres sessions : seules les sections
+    # modifiées ailleurs (et sans modification locale en cours) sont rechargées.
+    # `pending` : {project_id: sections} dont une saisie n'est pas encore reportée.
+    # Renvoie {project_id: {sections rafraîchies}} ; les projets supprimés sont oubliés.
+    def refresh(self, pending=None):
+        changes = self.store.changes_since(self._seq)
+        if not changes:
+            return {}
+        self._seq = changes[-1][0]
+        touched = {}
+        for _, project_id, section, _, origin in changes:
+            if origin != self.origin and project_id in self._loaded:
+                touched.setdefault(project_id, set()).add(section)
+        refreshed = {}
+        for project_id, sections in touched.items():
+            if '-' in sections:
+                self.forget(project_id)
+                refreshed[project_id] = {'-'}
+                continue
+            try:
+                fresh, fresh_versions = self.store.load_versioned(project_id)
+            except KeyError:
+                self.forget(project_id)
+                refreshed[project_id] = {'-'}
+                continue
+            project = self._loaded[project_id]
+            base, versions = self._base[project_id]
+            for section in SECTION_FIELDS:
+                if fresh_versions[section] == versions[section]:
+                    continue
+                if section in (pending or {}).get(project_id, ()):
+                    continue
+                if section_values(project, section) != section_values(base, section):
+                    continue  # modification locale en cours : fusion au prochain enregistrement
+                for field, value in section_values(fresh, section).items():
+                    set_section_value(project, section, field, clone_project(value))
+                    set_section_value(base, section, field, clone_project(value))
+                versions[section] = fresh_versions[section]
+                refreshed.setdefault(project_id, set()).add(section)
+            versions['version'] = max(versions['version'], fresh_versions['version'])
+        return refreshed
+
+
+# Migration unique depuis la forme dict/JSON (session_state, export de la barre latérale)
+def _iter_legacy_projects(data):
+    if isinstance(data, (str, bytes)):
+        data = json.loads(data)
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_legacy_projects(item)
+    elif isinstance(data, dict):
+        if 'id' in data and 'name' in data:
+            yield data
+        else:
+            # Forme {project_id: projet} de st.session_state.projects
+            for project in data.values():
+                yield from _iter_legacy_projects(project)
+
+
+def migrate_legacy(store, data, batch_size=500):
+    batch = []
+    count = 0
+    for project in _iter_legacy_projects(data):
+        batch.append(project)
+        if len(batch) >= batch_size:
+            count += store.save_many(batch)
+            batch = []
+    if batch:
+        count += store.save_many(batch)
+    return count
+
+
+if __name__ == '__main__':
+    # Usage : python storage.py export1.json [export2.json ...]
+    target = ProjectStore()
+    total = 0
+    for path in sys.argv[1:]:
+        with open(path, encoding='utf-8') as f:
+            total += migrate_legacy(target, json.load(f))
+    print(f"{total} projet(s) migré(s) vers {target.path}")
@@ -0,0 +1,117 @@
+from datetime import date
+
+from model import parse_date
+
+TASK_STATUSES = ['ouvert', 'en_cours', 'terminé']
+TASK_STATUS_LABELS = {'ouvert': 'Ouvert', 'en_cours': 'En Cours', 'terminé': 'Terminé'}
+
+# Colonnes de la grille -> clés des tâches
+GRID_COLUMNS = {'Tâche': 'task', 'Responsable': 'responsible', 'Échéance': 'due_date', 'Statut': 'status'}
+
+
+# Filtrage côté serveur : renvoie les positions des tâches retenues.
+# Les dates 'AAAA-MM-JJ' se comparent directement en chaînes, sans strptime.
+def filter_task_indices(tasks, statuses=None, owners=None, due_from=None, due_to=None):
+    statuses = set(statuses) if statuses else None
+    owners = set(owners) if owners else None
+    due_from = due_from.isoformat() if isinstance(due_from, date) else due_from
+    due_to = due_to.isoformat() if isinstance(due_to, date) else due_to
+    indices = []
+    for i, task in enumerate(tasks):
+        if statuses is not None and task.get('status') not in statuses:
+            continue
+        if owners is not None and task.get('responsible') not in owners:
+            continue
+        due = task.get('due_date') or ''
+        if due_from and due < due_from:
+            continue
+        if due_to and due > due_to:
+            continue
+        indices.append(i)
+    return indices
+
+
+# Découpe une page ; la page demandée est ramenée dans les bornes
+def paginate(indices, page, page_size):
+    page_count = max(1, -(-len(indices) // page_size))
+    page = min(max(1, page), page_count)
+    start = (page - 1) * page_size
+    return indices[start:start + page_size], page, page_count
+
+
+def task_owners(tasks):
+    return sorted({t.get('responsible') for t in tasks if t.get('responsible')})
+
+
+# Lignes de la page au format de la grille (seule la page est matérialisée)
+def page_rows(tasks, page_indices):
+    rows = []
+    for i in page_indices:
+        task = tasks[i]
+        rows.append({
+            'Sélection': False,
+            'Tâche': task.get('task', ''),
+            'Responsable': task.get('responsible', ''),
+            'Échéance': parse_date(task.get('due_date')),
+            'Statut': task.get('status', 'ouvert'),
+        })
+    return rows
+
+
+# Applique le diff renvoyé par st.data_editor ({ligne: {colonne: valeur}})
+# et renvoie (positions modifiées, positions sélectionnées).
+# `stats` (TaskStatsIndex optionnel) est tenu à jour au fil des modifications.
+def apply_grid_edits(tasks, page_indices, edited_rows, stats=None):
+    changed = []
+    selected = []
+    for row, changes in edited_rows.items():
+        row = int(row)
+        if row >= len(page_indices):
+            continue
+        index = page_indices[row]
+        task = tasks[index]
+        if changes.get('Sélection'):
+            selected.append(index)
+        before = dict(task)
+        updated = False
+        for column, value in changes.items():
+            key = GRID_COLUMNS.get(column)
+            if key is None:
+                continue
+            if key == 'due_date' and value is not None:
+                value = value.isoformat() if isinstance(value, date) else str(value)[:10]
+            if key == 'status' and value not in TASK_STATUSES:
+                continue
+            if task.get(key) != value:
+                task[key] = value
+                updated = True
+        if updated:
+            changed.append(index)
+            if stats is not None:
+                stats.replace(before, task)
+    return changed, selected
+
+
+def bulk_set_status(tasks, indices, status, stats=None):
+    if status not in TASK_STATUSES:
+        raise ValueError(f"Statut de tâche inconnu : {status}")
+    changed = []
+    for i in indices:
+        if tasks[i].get('status') != status:
+            old_status = tasks[i].get('status')
+            tasks[i]['status'] = status
+            changed.append(i)
+            if stats is not None:
+                stats.change_status(tasks[i], old_status)
+    return changed
+
+
+# Suppression groupée en une passe (les positions restantes sont recompactées)
+def bulk_delete(tasks, indices, stats=None):
+    doomed = set(indices)
+    removed = [t for i, t in enumerate(tasks) if i in doomed]
+    tasks[:] = [t for i, t in enumerate(tasks) if i not in doomed]
+    if stats is not None:
+        for task in removed:
+            stats.remove(task)
+    return removed
@@ -0,0 +1,194 @@
+import random
+import sys
+from collections import Counter
+from datetime import date, timedelta
+
+from model import Task, TaskStatus, ordinal_date
+
+MAX_ORDINAL = date.max.toordinal()
+
+
+# Nombre de tâches par échéance (ordinal) et arbre de Fenwick creux (dictionnaire)
+# sur les ordinaux : ajout, retrait et nombre d'échéances <= d en O(log N),
+# N = ordinal maximal (22 niveaux), sans liste triée à décaler
+class DueCounts:
+    def __init__(self):
+        self.counts = Counter()
+        self._tree = {}
+
+    @classmethod
+    def from_ordinals(cls, ordinals):
+        index = cls()
+        for ordinal, count in Counter(ordinals).items():
+            index.add(ordinal, count)
+        return index
+
+    def add(self, ordinal, delta=1):
+        _adjust(self.counts, ordinal, delta)
+        tree = self._tree
+        while ordinal <= MAX_ORDINAL:
+            value = tree.get(ordinal, 0) + delta
+            if value:
+                tree[ordinal] = value
+            else:
+                tree.pop(ordinal, None)
+            ordinal += ordinal & -ordinal
+
+    # Nombre d'échéances au plus tard à `ordinal`
+    def upto(self, ordinal):
+        total, ordinal, tree = 0, min(ordinal, MAX_ORDINAL), self._tree
+        while ordinal > 0:
+            total += tree.get(ordinal, 0)
+            ordinal -= ordinal & -ordinal
+        return total
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+
+# Index statistique d'un projet, maintenu à chaque mutation de tâche. Chaque
+# tâche est lue une fois dans le modèle typé (model.Task : statut en énumération,
+# échéance en ordinal, responsable interné) ; les requêtes ne font ni analyse
+# de date ni comparaison de chaînes. Compteurs par statut et par responsable en
+# O(1), échéances des tâches ouvertes dans un arbre de Fenwick (DueCounts) :
+# mutations et requêtes retard/à venir en O(log N).
+class TaskStatsIndex:
+    def __init__(self):
+        self.total = 0
+        self.status_counts = Counter()
+        self.owner_counts = Counter()
+        self.owner_open_counts = Counter()
+        self.open_due = DueCounts()
+
+    @classmethod
+    def from_tasks(cls, tasks):
+        index = cls()
+        typed = [Task.from_dict(task) for task in tasks]
+        opened = [task for task in typed if task.status != TaskStatus.TERMINE]
+        index.total = len(typed)
+        index.status_counts = Counter(task.status_label for task in typed)
+        index.owner_counts = Counter(task.owner for task in typed)
+        index.owner_open_counts = Counter(task.owner for task in opened)
+        index.open_due = DueCounts.from_ordinals(task.due for task in opened if task.due)
+        return index
+
+    # Compteurs d'une tâche typée (+1 / -1) ; renvoie son échéance si elle est ouverte
+    def _count(self, task, sign):
+        self.total += sign
+        _adjust(self.status_counts, task.status_label, sign)
+        _adjust(self.owner_counts, task.owner, sign)
+        if task.status == TaskStatus.TERMINE:
+            return 0
+        _adjust(self.owner_open_counts, task.owner, sign)
+        return task.due
+
+    # --- Mutations ---
+    def add(self, task):
+        due = self._count(Task.from_dict(task), 1)
+        if due:
+            self.open_due.add(due)
+
+    def remove(self, task):
+        due = self._count(Task.from_dict(task), -1)
+        if due and self.open_due.counts.get(due):
+            self.open_due.add(due, -1)
+
+    # Une tâche modifiée : `before` est une copie de la tâche avant modification
+    def replace(self, before, after):
+        self.remove(before)
+        self.add(after)
+
+    def change_status(self, task, old_status):
+        if old_status != task.get('status'):
+            self.replace(dict(task, status=old_status), task)
+
+    # --- Requêtes ---
+    def count(self, status):
+        return self.status_counts.get(status, 0)
+
+    # Même règle que l'ancien calcul : échéance (à minuit) antérieure à maintenant
+    def overdue(self, today=None):
+        return self.open_due.upto((today or date.today()).toordinal())
+
+    def upcoming(self, days, today=None):
+        today = today or date.today()
+        return (self.open_due.upto((today + timedelta(days=days)).toordinal())
+                - self.open_due.upto(today.toordinal()))
+
+    def labelled_status_counts(self, labels):
+        return {labels.get(s, s): n for s, n in self.status_counts.items() if n > 0}
+
+    def snapshot(self):
+        return {
+            'total': self.total,
+            'status_counts': {k: v for k, v in self.status_counts.items() if v},
+            'owner_counts': {k: v for k, v in self.owner_counts.items() if v},
+            'owner_open_counts': {k: v for k, v in self.owner_open_counts.items() if v},
+            'open_due': dict(sorted(self.open_due.counts.items())),
+        }
+
+
+def _adjust(counter, key, sign):
+    counter[key] += sign
+    if counter[key] <= 0:
+        del counter[key]
+
+
+# Vérificateur de cohérence : reconstruit l'index depuis les tâches brutes
+# et renvoie la liste des écarts (vide si l'index est à jour)
+def check_consistency(index, tasks):
+    expected = TaskStatsIndex.from_tasks(tasks).snapshot()
+    actual = index.snapshot()
+    return [key for key in expected if expected[key] != actual[key]]
+
+
+# Suites aléatoires d'ajouts, changements de statut, modifications et
+# suppressions (comme l'application) : l'index tenu à jour doit rester égal à
+# l'index reconstruit après chaque opération
+def random_check(operations=2000, seed=0):
+    rnd = random.Random(seed)
+    statuses = ['ouvert', 'en_cours', 'terminé', 'inconnu']
+    owners = ['Alice', 'Bob', 'Chloé', '', None]
+    start = date(2026, 1, 1).toordinal()
+
+    def task(i):
+        due = rnd.choice([ordinal_date(start + rnd.randrange(-60, 400)), None, '', '2026-13-01'])
+        return {'task': f"Tâche {i}", 'responsible': rnd.choice(owners), 'due_date': due,
+                'status': rnd.choice(statuses)}
+
+    tasks = [task(i) for i in range(rnd.randrange(50))]
+    index = TaskStatsIndex.from_tasks(tasks)
+    for n in range(operations):
+        action = rnd.random()
+        if action < 0.35 or not tasks:
+            tasks.append(task(n))
+            index.add(tasks[-1])
+        elif action < 0.65:
+            target = rnd.choice(tasks)
+            old_status = target.get('status')
+            target['status'] = rnd.choice(statuses)
+            index.change_status(target, old_status)
+        elif action < 0.8:
+            i = rnd.randrange(len(tasks))
+            before = dict(tasks[i])
+            tasks[i].update(task(n), task=tasks[i]['task'])
+            index.replace(before, tasks[i])
+        else:
+            index.remove(tasks.pop(rnd.randrange(len(tasks))))
+        errors = check_consistency(index, tasks)
+        if errors:
+            raise AssertionError(f"opération {n} (graine {seed}) : écarts {errors}")
+        today = date.fromordinal(start + rnd.randrange(365))
+        expected = sum(1 for t in tasks if t.get('status') != 'terminé' and 0 < Task.from_dict(t).due
+                       <= today.toordinal())
+        if index.overdue(today) != expected:
+            raise AssertionError(f"opération {n} (graine {seed}) : retards {index.overdue(today)} != {expected}")
+    return len(tasks)
+
+
+if __name__ == '__main__':
+    # Usage : python task_stats.py [suites]   (vérification de cohérence de l'index)
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for seed in range(runs):
+        random_check(seed=seed)
+    print(f"{runs} suite(s) aléatoire(s) : index cohérent")
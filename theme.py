@@ -0,0 +1,91 @@
+import re
+
+# Balisage statique de l'application, construit une fois par processus (le
+# module n'est importé qu'une fois, app.py est réexécuté à chaque relance)
+
+_CSS = """
+<style>
+    .pdca-header {
+        background: linear-gradient(90deg, #FF6B6B, #4ECDC4, #45B7D1, #96CEB4);
+        padding: 20px;
+        border-radius: 10px;
+        text-align: center;
+        color: white;
+        font-size: 24px;
+        font-weight: bold;
+        margin-bottom: 20px;
+    }
+
+    .phase-card {
+        padding: 15px;
+        border-radius: 10px;
+        margin: 10px 0;
+        border-left: 5px solid;
+    }
+
+    .plan-card { border-left-color: #FF6B6B; background-color: #FFE5E5; }
+    .do-card { border-left-color: #4ECDC4; background-color: #E5F9F6; }
+    .check-card { border-left-color: #45B7D1; background-color: #E5F3FF; }
+    .act-card { border-left-color: #96CEB4; background-color: #E5F5E5; }
+
+    .task-completed { text-decoration: line-through; opacity: 0.6; }
+    .priority-high { border-left: 3px solid #FF4444; }
+    .priority-medium { border-left: 3px solid #FFA500; }
+    .priority-low { border-left: 3px solid #4CAF50; }
+
+    .metric-card {
+        background: white;
+        padding: 20px;
+        border-radius: 10px;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        text-align: center;
+    }
+
+    .phase-step {
+        background-color: #f0f0f0; color: #666; padding: 10px;
+        border-radius: 5px; text-align: center;
+    }
+    .phase-step-current { color: white; font-weight: bold; }
+</style>
+"""
+
+# CSS compacté (moins d'octets envoyés au navigateur à chaque relance)
+PAGE_CSS = re.sub(r'\s*([{};:,])\s*', r'\1', re.sub(r'\s+', ' ', _CSS)).strip()
+
+HEADER_HTML = '<div class="pdca-header">🔄 Outil KVP Numérique</div>'
+
+PHASES = [('plan', "Planifier", '#FF6B6B'), ('do', "Faire", '#4ECDC4'),
+          ('check', "Vérifier", '#45B7D1'), ('act', "Agir", '#96CEB4')]
+
+PHASE_CARDS = {
+    'plan': '<div class="phase-card plan-card"><h3>📋 Planifier - Planification</h3></div>',
+    'do': '<div class="phase-card do-card"><h3>🔨 Faire - Mise en Œuvre</h3></div>',
+    'check': '<div class="phase-card check-card"><h3>📊 Vérifier - Vérification</h3></div>',
+    'act': '<div class="phase-card act-card"><h3>🎯 Agir - Action</h3></div>',
+}
+
+
+def _phase_step(label, color, current):
+    if current:
+        return f'<div class="phase-step phase-step-current" style="background-color: {color};">{label} ✓</div>'
+    return f'<div class="phase-step">{label}</div>'
+
+
+# Barre de progression PDCA par phase courante : quatre cases déjà rendues
+PHASE_PROGRESS = {current: [_phase_step(label, color, key == current) for key, label, color in PHASES]
+                  for current, _, _ in PHASES}
+
+WELCOME = "👋 Bienvenue ! Créez un nouveau projet ou chargez le projet d'exemple."
+
+TOUR_TITLE = "🎯 Tour de l'Outil : Comment fonctionne l'Outil KVP"
+TOUR = """
+**1. Cycle PDCA :** Travaillez de manière structurée à travers les quatre phases
+- **Planifier :** Définir le problème et planifier les mesures
+- **Faire :** Mettre en œuvre et suivre les mesures
+- **Vérifier :** Examiner et évaluer les résultats
+- **Agir :** Standardiser et définir les prochaines étapes
+
+**2. Suivi des Tâches :** Gérer les tâches avec responsabilités et échéances
+**3. Visualisation :** Tableaux de bord et suivi des progrès
+**4. Travail d'Équipe :** Commentaires et collaboration
+"""
@@ -0,0 +1,316 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+from model import date_ordinal, ordinal_date
+
+# Planning multi-projets (Gantt) agrégé côté serveur. Les tâches n'ont qu'une
+# échéance : une tâche commence à l'échéance de l'étape précédente du même
+# projet (dans l'ordre des échéances), la première à la création du projet.
+# Vue d'ensemble : nombre de tâches actives par groupe (responsable ou projet)
+# et par intervalle d'un jour ou d'une semaine ; tâches individuelles seulement
+# lorsque la fenêtre en contient peu. Les agrégats sont calculés par tuiles
+# d'intervalles alignés et mémorisés : un déplacement de la fenêtre ne calcule
+# que les tuiles nouvellement visibles.
+ACTIVE_STATUSES = ('brouillon', 'en_cours', 'en_attente')
+DONE_STATUS = 'terminé'
+GROUP_BY = {'responsible': 'Responsable', 'project': 'Projet'}
+# Niveaux de détail : largeur d'un intervalle en jours ; 'taches' : une barre par tâche
+LEVELS = {'semaine': 7, 'jour': 1, 'taches': 0}
+MAX_TASK_BARS = 200
+# Fenêtre (en jours) au-delà de laquelle les intervalles font une semaine
+DAY_LEVEL_MAX_DAYS = 120
+# Groupes affichés au plus (les plus actifs de la fenêtre), les autres sont cumulés
+MAX_GROUPS = 40
+TILE_BINS = 64
+TILE_CACHE_SIZE = 128
+NO_OWNER = '(sans responsable)'
+
+_TASKS_SQL = f"""
+SELECT t.project_id, t.task, t.responsible, t.due_date, t.status, p.name, p.created_date
+FROM tasks t JOIN projects p ON p.id = t.project_id
+WHERE p.status IN ({','.join('?' * len(ACTIVE_STATUSES))})
+"""
+# Champs de l'en-tête que l'index reprend (les autres modifications ne le touchent pas)
+_HEADERS_SQL = 'SELECT id, status, name, created_date FROM projects'
+
+
+# Tâches datées des projets actifs, en colonnes (dates en ordinaux).
+# `built` : position du flux à la construction (clé des tuiles) ; `seq` : dernière
+# position lue ; `headers` : {id: (statut, nom, création)} de tous les projets
+class TimelineIndex:
+    def __init__(self, seq, projects, project_ids, owners, titles, project, owner, start, end, done, undated,
+                 headers=None):
+        self.seq = self.built = seq
+        self.headers = headers or {}
+        self.projects = projects
+        self.project_ids = project_ids
+        self.owners = owners
+        self.titles = titles
+        self.project = project
+        self.owner = owner
+        self.start = start
+        self.end = end
+        self.done = done
+        self.undated = undated
+
+    def __len__(self):
+        return len(self.end)
+
+    @property
+    def extent(self):
+        if not len(self):
+            return None
+        return int(self.start.min()), int(self.end.max())
+
+    def groups(self, group_by):
+        if group_by == 'project':
+            return self.project, self.projects
+        return self.owner, self.owners
+
+    def overlapping(self, lo, hi):
+        return (self.start <= hi) & (self.end >= lo)
+
+
+def build_index(store, seq=0):
+    projects, project_codes, owners, owner_codes = [], {}, [], {}
+    project_ids, titles, project, owner, end, done = [], [], [], [], [], []
+    created = []
+    undated = 0
+    with store.pool.connection() as conn:
+        headers = {row[0]: tuple(row[1:]) for row in conn.execute(_HEADERS_SQL)}
+        for pid, title, responsible, due_date, status, name, created_date in conn.execute(
+                _TASKS_SQL, ACTIVE_STATUSES):
+            due = date_ordinal(due_date)
+            if not due:
+                undated += 1
+                continue
+            code = project_codes.get(pid)
+            if code is None:
+                code = project_codes[pid] = len(projects)
+                projects.append(name)
+                project_ids.append(pid)
+                created.append(date_ordinal(created_date))
+            responsible = responsible or NO_OWNER
+            owner_code = owner_codes.get(responsible)
+            if owner_code is None:
+                owner_code = owner_codes[responsible] = len(owners)
+                owners.append(sys.intern(responsible))
+            titles.append(title)
+            project.append(code)
+            owner.append(owner_code)
+            end.append(due)
+            done.append(status == DONE_STATUS)
+    project = np.asarray(project, dtype=np.int32)
+    end = np.asarray(end, dtype=np.int32)
+    # Début : échéance précédente du même projet, sinon création du projet (bornée par l'échéance)
+    order = np.lexsort((end, project))
+    start = np.empty_like(end)
+    previous = np.empty(len(order), dtype=np.int32)
+    if len(order):
+        sorted_project, sorted_end = project[order], end[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_project[1:] != sorted_project[:-1]
+        previous[1:] = sorted_end[:-1]
+        created = np.asarray(created, dtype=np.int32)[sorted_project]
+        previous[first] = np.where(created[first] > 0, created[first], sorted_end[first])
+        start[order] = np.minimum(previous, sorted_end)
+    return TimelineIndex(seq, projects, project_ids, owners, titles, project,
+                         np.asarray(owner, dtype=np.int32), start, end, np.asarray(done, dtype=bool), undated, headers)
+
+
+# Intervalle (largeur `width` jours, semaines du lundi au dimanche) d'un ordinal
+def bin_of(ordinal, width):
+    return (ordinal - 1) // width
+
+
+def bin_start(number, width):
+    return number * width + 1
+
+
+def choose_level(index, lo, hi):
+    if int(index.overlapping(lo, hi).sum()) <= MAX_TASK_BARS:
+        return 'taches'
+    return 'jour' if hi - lo + 1 <= DAY_LEVEL_MAX_DAYS else 'semaine'
+
+
+# Agrégats d'une tuile : pour chaque groupe et intervalle, tâches actives,
+# échéances, et échéances dépassées de tâches non terminées
+def compute_tile(index, group_by, width, tile, today):
+    codes, labels = index.groups(group_by)
+    first_bin = tile * TILE_BINS
+    lo, hi = bin_start(first_bin, width), bin_start(first_bin + TILE_BINS, width) - 1
+    mask = index.overlapping(lo, hi)
+    group = codes[mask]
+    start, end = index.start[mask], index.end[mask]
+    first = np.clip(bin_of(start, width) - first_bin, 0, TILE_BINS - 1)
+    last = np.clip(bin_of(end, width) - first_bin, 0, TILE_BINS - 1)
+    # Tableau de différences : +1 au premier intervalle, -1 après le dernier
+    active = np.zeros((len(labels), TILE_BINS + 1), dtype=np.int32)
+    np.add.at(active, (group, first), 1)
+    np.add.at(active, (group, last + 1), -1)
+    active = np.cumsum(active[:, :-1], axis=1, dtype=np.int32)
+    inside = (end >= lo) & (end <= hi)
+    due = np.zeros((len(labels), TILE_BINS), dtype=np.int32)
+    np.add.at(due, (group[inside], (bin_of(end, width) - first_bin)[inside]), 1)
+    late_mask = inside & ~index.done[mask] & (end <= today)
+    late = np.zeros((len(labels), TILE_BINS), dtype=np.int32)
+    np.add.at(late, (group[late_mask], (bin_of(end, width) - first_bin)[late_mask]), 1)
+    return active, due, late
+
+
+# Planning partagé : index reconstruit quand le flux `changes` touche les tâches
+# ou l'en-tête d'un projet actif, tuiles d'agrégats mémorisées (LRU) par
+# (regroupement, niveau, tuile, jour)
+class Timeline:
+    def __init__(self, store, cache_size=TILE_CACHE_SIZE):
+        self.store = store
+        self.index = None
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = 0.0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        seq = self.store.last_change_seq()
+        with self._lock:
+            index = self.index
+            if index is None or index.seq != seq and self._stale(index, self.store.changes_since(index.seq)):
+                started = time.perf_counter()
+                self.index = build_index(self.store, seq)
+                self.build_seconds = time.perf_counter() - started
+                self._tiles.clear()
+            else:
+                # Modifications sans effet sur le planning (leçons, indicateurs...) :
+                # index et tuiles conservés
+                index.seq = max(index.seq, seq)
+            return self.index
+
+    # Vrai si les modifications lues depuis la construction changent l'index :
+    # tâches modifiées, projet actif supprimé, ou statut, nom ou date de création
+    # d'un projet qui est ou devient actif ; les autres en-têtes sont mis à jour
+    def _stale(self, index, changes):
+        # Flux purgé depuis la dernière lecture : des modifications ont pu échapper
+        if changes and changes[0][0] > index.seq + 1:
+            return True
+        headers = {}
+        for _, project_id, section, _, _ in changes:
+            if section == 'do':
+                return True
+            if section == '-':
+                if index.headers.get(project_id, ('',))[0] in ACTIVE_STATUSES:
+                    return True
+                index.headers.pop(project_id, None)
+            elif section == 'meta':
+                headers[project_id] = None
+        if headers:
+            marks = ','.join('?' * len(headers))
+            with self.store.pool.connection() as conn:
+                for row in conn.execute(f'{_HEADERS_SQL} WHERE id IN ({marks})', list(headers)):
+                    headers[row[0]] = tuple(row[1:])
+            for project_id, fresh in headers.items():
+                known = index.headers.get(project_id)
+                if fresh != known and any(h is not None and h[0] in ACTIVE_STATUSES for h in (fresh, known)):
+                    return True
+                if fresh is None:
+                    index.headers.pop(project_id, None)
+                else:
+                    index.headers[project_id] = fresh
+        return False
+
+    def _tile(self, index, group_by, width, tile, today):
+        key = (index.built, group_by, width, tile, today)
+        with self._lock:
+            cached = self._tiles.get(key)
+            if cached is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return cached
+        cached = compute_tile(index, group_by, width, tile, today)
+        with self._lock:
+            self.misses += 1
+            self._tiles[key] = cached
+            while len(self._tiles) > self.cache_size:
+                self._tiles.popitem(last=False)
+        return cached
+
+    # Vue de la fenêtre [lo, hi] (ordinaux) au niveau de détail adapté :
+    #   niveau 'taches' : {'tasks': [{task, project, group, start, end, done, late}]}
+    #   sinon : {'bins': [dates], 'groups': [libellés], 'active'/'due'/'late': [[...]]}
+    def view(self, group_by, lo, hi, today=None, level=None):
+        index = self.index if self.index is not None else self.refresh()
+        today = (today or date.today()).toordinal()
+        level = level or choose_level(index, lo, hi)
+        if level == 'taches':
+            return self._task_view(index, group_by, lo, hi, today)
+        width = LEVELS[level]
+        first_bin, last_bin = bin_of(lo, width), bin_of(hi, width)
+        tiles = range(first_bin // TILE_BINS, last_bin // TILE_BINS + 1)
+        parts = [self._tile(index, group_by, width, tile, today) for tile in tiles]
+        offset = first_bin - tiles[0] * TILE_BINS
+        window = slice(offset, offset + last_bin - first_bin + 1)
+        active, due, late = (np.concatenate([part[i] for part in parts], axis=1)[:, window] for i in range(3))
+        totals = active.sum(axis=1)
+        ranked = np.argsort(-totals, kind='stable')
+        ranked = ranked[totals[ranked] > 0]
+        shown, rest = ranked[:MAX_GROUPS], ranked[MAX_GROUPS:]
+        labels = index.groups(group_by)[1]
+        groups = [labels[g] for g in shown]
+        rows = [matrix[shown] for matrix in (active, due, late)]
+        if len(rest):
+            groups.append(f"Autres ({len(rest)})")
+            rows = [np.vstack([row, matrix[rest].sum(axis=0, keepdims=True)])
+                    for row, matrix in zip(rows, (active, due, late))]
+        return {
+            'level': level,
+            'width': width,
+            'bins': [ordinal_date(bin_start(b, width)) for b in range(first_bin, last_bin + 1)],
+            'groups': groups,
+            'active': rows[0].tolist(),
+            'due': rows[1].tolist(),
+            'late': rows[2].tolist(),
+            'tasks': int(index.overlapping(lo, hi).sum()),
+        }
+
+    def _task_view(self, index, group_by, lo, hi, today):
+        codes, labels = index.groups(group_by)
+        selected = np.flatnonzero(index.overlapping(lo, hi))
+        selected = selected[np.lexsort((index.start[selected], codes[selected]))][:MAX_TASK_BARS]
+        tasks = [{
+            'task': index.titles[i],
+            'project': index.projects[index.project[i]],
+            'project_id': index.project_ids[index.project[i]],
+            'group': labels[codes[i]],
+            'start': ordinal_date(int(index.start[i])),
+            # Fin exclusive : la barre couvre le jour d'échéance
+            'end': ordinal_date(int(index.end[i]) + 1),
+            'due': ordinal_date(int(index.end[i])),
+            'done': bool(index.done[i]),
+            'late': not index.done[i] and int(index.end[i]) <= today,
+        } for i in selected]
+        return {'level': 'taches', 'tasks': tasks, 'groups': list(dict.fromkeys(t['group'] for t in tasks))}
+
+
+if __name__ == '__main__':
+    # Usage : python timeline.py [responsible|project]   (vue d'ensemble, en texte)
+    from storage import ProjectStore
+    timeline = Timeline(ProjectStore())
+    index = timeline.refresh()
+    if not len(index):
+        sys.exit("Aucune tâche datée dans les projets actifs.")
+    lo, hi = index.extent
+    view = timeline.view(sys.argv[1] if len(sys.argv) > 1 else 'responsible', lo, hi)
+    print(f"{len(index)} tâche(s) datée(s) ({index.undated} sans échéance), du {ordinal_date(lo)} au "
+          f"{ordinal_date(hi)}, index construit en {timeline.build_seconds:.2f} s ; niveau : {view['level']}")
+    if view['level'] == 'taches':
+        for task in view['tasks']:
+            print(f"  {task['start']} → {task['end']}  {task['group']:24}  {task['task']}")
+    else:
+        for group, active in zip(view['groups'], view['active']):
+            print(f"  {group:30} pic {max(active):4} tâche(s) actives")